@@ -2,65 +2,45 @@ from flask import Flask, request, jsonify
 import sqlite3
 import json
 import re
-from difflib import SequenceMatcher
 from typing import List, Dict, Any
 import math
+from geocoding import fold_text
+from place_index import get_place_index, score
+from ride_search import detect_backend, ride_text_condition
 
 class AdvancedSearchAPI:
     def __init__(self, database_path='spolujizda.db'):
         self.database_path = database_path
+        self._text_backend = None
+        
+    def text_backend(self, conn) -> str:
+        """FTS5 pokud je v databázi rides_fts, jinak LIKE"""
+        if self._text_backend is None:
+            self._text_backend = detect_backend('sqlite', lambda sql: conn.execute(sql).fetchone())
+        return self._text_backend
         
     def fuzzy_match(self, query: str, text: str, threshold: float = 0.6) -> bool:
         """Fuzzy matching algoritmus inspirovaný Waze"""
-        similarity = SequenceMatcher(None, query.lower(), text.lower()).ratio()
-        
-        # Bonus za začátek slova
-        if text.lower().startswith(query.lower()):
-            similarity += 0.2
-            
-        # Bonus za obsahování
-        if query.lower() in text.lower():
-            similarity += 0.1
-            
-        return similarity >= threshold
+        return score(fold_text(query), fold_text(text)) >= threshold
     
     def calculate_confidence(self, query: str, text: str) -> float:
         """Výpočet confidence skóre"""
-        similarity = SequenceMatcher(None, query.lower(), text.lower()).ratio()
-        
-        # Bonusy
-        starts_with_bonus = 0.2 if text.lower().startswith(query.lower()) else 0
-        contains_bonus = 0.1 if query.lower() in text.lower() else 0
-        
-        return min(1.0, similarity + starts_with_bonus + contains_bonus)
+        return min(1.0, score(fold_text(query), fold_text(text)))
     
     def search_places(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
         """Vyhledávání míst s fuzzy matching"""
-        czech_cities = [
-            'Praha', 'Brno', 'Ostrava', 'Plzeň', 'Liberec', 'Olomouc', 'Ústí nad Labem',
-            'České Budějovice', 'Hradec Králové', 'Pardubice', 'Zlín', 'Havířov',
-            'Kladno', 'Most', 'Opava', 'Frýdek-Místek', 'Karviná', 'Jihlava',
-            'Děčín', 'Teplice', 'Chomutov', 'Jablonec nad Nisou', 'Mladá Boleslav',
-            'Prostějov', 'Přerov', 'Česká Lípa', 'Třebíč', 'Uherské Hradiště',
-            'Kolín', 'Písek', 'Trutnov', 'Vsetín', 'Valašské Meziříčí'
-        ]
-        
+        # Trie + trigramový index se načte jednou, skóre se počítá jen pro užší výběr
         results = []
-        for city in czech_cities:
-            if self.fuzzy_match(query, city):
-                confidence = self.calculate_confidence(query, city)
-                results.append({
-                    'id': city.lower().replace(' ', '_'),
-                    'text': city,
-                    'type': 'place',
-                    'icon': '🏙️',
-                    'confidence': confidence,
-                    'subtitle': f'Město v České republice'
-                })
-        
-        # Seřazení podle confidence
-        results.sort(key=lambda x: x['confidence'], reverse=True)
-        return results[:limit]
+        for city, confidence in get_place_index().search(query, limit):
+            results.append({
+                'id': city.lower().replace(' ', '_'),
+                'text': city,
+                'type': 'place',
+                'icon': '🏙️',
+                'confidence': confidence,
+                'subtitle': f'Město v České republice'
+            })
+        return results
     
     def search_rides_text(self, query: str, user_lat: float = None, user_lng: float = None, limit: int = 10) -> List[Dict[str, Any]]:
         """Textové vyhledávání jízd"""
@@ -68,15 +48,22 @@ class AdvancedSearchAPI:
             conn = sqlite3.connect(self.database_path)
             c = conn.cursor()
             
-            # Vyhledávání v from_location a to_location
-            c.execute('''
-                SELECT r.*, u.name, u.rating 
+            # Vyhledávání v from_location a to_location přes fulltextový index (bez diakritiky)
+            params = []
+            condition = ride_text_condition(self.text_backend(conn), {None: query}, params, placeholder=lambda name: '?')
+            if condition is None:
+                conn.close()
+                return []
+            c.execute(f'''
+                SELECT r.id, r.user_id, r.from_location, r.to_location, r.departure_time,
+                       r.available_seats, r.price_per_person, r.route_waypoints, r.created_at,
+                       u.name, u.rating
                 FROM rides r 
                 LEFT JOIN users u ON r.user_id = u.id
-                WHERE r.from_location LIKE ? OR r.to_location LIKE ?
+                WHERE {condition}
                 ORDER BY r.created_at DESC
                 LIMIT ?
-            ''', (f'%{query}%', f'%{query}%', limit * 2))
+            ''', params + [limit * 2])
             
             rides = c.fetchall()
             conn.close()
@@ -96,7 +83,7 @@ class AdvancedSearchAPI:
                     results.append({
                         'id': f'ride_{ride[0]}',
                         'text': f'{ride[2]} → {ride[3]}',
-                        'subtitle': f'{ride[4]} • {ride[10] or "Neznámý řidič"} • {ride[6]} Kč',
+                        'subtitle': f'{ride[4]} • {ride[9] or "Neznámý řidič"} • {ride[6]} Kč',
                         'type': 'ride',
                         'icon': '🚗',
                         'confidence': confidence,
@@ -107,8 +94,8 @@ class AdvancedSearchAPI:
                             'departure_time': ride[4],
                             'available_seats': ride[5],
                             'price_per_person': ride[6],
-                            'driver_name': ride[10] or 'Neznámý řidič',
-                            'driver_rating': ride[11] or 5.0
+                            'driver_name': ride[9] or 'Neznámý řidič',
+                            'driver_rating': ride[10] or 5.0
                         }
                     })
             
@@ -209,6 +196,7 @@ class AdvancedSearchAPI:
 # Flask API endpointy
 def create_search_routes(app: Flask):
     search_api = AdvancedSearchAPI()
+    get_place_index()
     
     @app.route('/api/search/places', methods=['GET'])
     def search_places():
@@ -0,0 +1,140 @@
+"""
+Load test for chat_gateway.py: thousands of idle SSE connections on one core.
+
+Starts the gateway as a separate process on a throwaway SQLite database,
+opens --connections SSE streams spread over rides (--per-room clients per
+ride), then reports:
+
+- how long it took to connect everyone
+- gateway RSS and CPU use while all connections sit idle
+- fan-out latency: messages are inserted straight into the `messages` table
+  (like send_chat_message does) and timed until every client in the room
+  has received them; this includes the gateway's poll interval
+
+Usage:
+    python benchmark_chat_gateway.py [--connections 5000] [--per-room 4] [--messages 200]
+"""
+
+import argparse
+import asyncio
+import datetime
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SCHEMA = """
+CREATE TABLE users (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL);
+CREATE TABLE messages (id INTEGER PRIMARY KEY, ride_id INTEGER NOT NULL, sender_id INTEGER NOT NULL,
+                       message TEXT NOT NULL, created_at DATETIME);
+CREATE INDEX ix_messages_ride_id ON messages (ride_id, id);
+"""
+
+
+def process_stats(pid):
+    with open(f'/proc/{pid}/status') as status:
+        rss_kb = next(int(line.split()[1]) for line in status if line.startswith('VmRSS:'))
+    with open(f'/proc/{pid}/stat') as stat:
+        fields = stat.read().rsplit(')', 1)[1].split()
+    cpu_seconds = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    return rss_kb / 1024, cpu_seconds
+
+
+async def open_stream(port, ride_id, user_id, received):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f'GET /rides/{ride_id}/events?user_id={user_id} HTTP/1.1\r\nHost: bench\r\n\r\n'.encode())
+    await reader.readuntil(b'\r\n\r\n')
+
+    async def consume():
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            if line.startswith(b'data: {"id":'):
+                message_id = int(line[len(b'data: {"id": '):line.index(b',')])
+                received.setdefault(message_id, []).append(time.perf_counter())
+    return writer, asyncio.ensure_future(consume())
+
+
+async def run(args, db_path, port, gateway):
+    rng = random.Random(args.seed)
+    rooms = max(1, args.connections // args.per_room)
+    received = {}
+
+    started = time.perf_counter()
+    streams = []
+    for index in range(args.connections):
+        streams.append(await open_stream(port, index % rooms + 1, index + 1, received))
+    connect_seconds = time.perf_counter() - started
+    print(f"{args.connections} connections in {rooms} rooms opened in {connect_seconds:.2f}s")
+
+    await asyncio.sleep(1)
+    rss_before, cpu_before = process_stats(gateway.pid)
+    await asyncio.sleep(args.idle_seconds)
+    rss_after, cpu_after = process_stats(gateway.pid)
+    print(f"idle: gateway RSS {rss_after:.1f} MB ({rss_after * 1024 / args.connections:.1f} KB/connection), "
+          f"CPU {100 * (cpu_after - cpu_before) / args.idle_seconds:.1f}% over {args.idle_seconds}s")
+
+    conn = sqlite3.connect(db_path)
+    sent = {}
+    for _ in range(args.messages):
+        ride_id = rng.randint(1, rooms)
+        cursor = conn.execute("INSERT INTO messages (ride_id, sender_id, message, created_at) VALUES (?, 1, 'ahoj', ?)",
+                              (ride_id, datetime.datetime.now()))
+        conn.commit()
+        sent[cursor.lastrowid] = time.perf_counter()
+        await asyncio.sleep(args.interval)
+    conn.close()
+
+    room_size = args.connections // rooms
+    deadline = time.perf_counter() + 10
+    while time.perf_counter() < deadline and any(len(received.get(mid, ())) < room_size for mid in sent):
+        await asyncio.sleep(0.1)
+    latencies = sorted(max(received[mid]) - sent[mid] for mid in sent if len(received.get(mid, ())) >= room_size)
+    print(f"fan-out: {len(latencies)}/{len(sent)} messages reached all {room_size} room members; "
+          f"median {statistics.median(latencies) * 1000:.0f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.0f} ms")
+
+    for writer, task in streams:
+        task.cancel()
+        writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the chat gateway with many idle SSE connections.")
+    parser.add_argument('--connections', type=int, default=5000)
+    parser.add_argument('--per-room', type=int, default=4)
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--interval', type=float, default=0.01)
+    parser.add_argument('--idle-seconds', type=float, default=5)
+    parser.add_argument('--poll-interval', type=float, default=0.25)
+    parser.add_argument('--port', type=int, default=8799)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'gateway.db')
+        conn = sqlite3.connect(db_path)
+        conn.executescript(SCHEMA)
+        conn.execute("INSERT INTO users (id, name) VALUES (1, 'Řidič')")
+        conn.commit()
+        conn.close()
+
+        gateway = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chat_gateway.py'),
+                                    '--host', '127.0.0.1', '--port', str(args.port), '--database-url', f'sqlite:///{db_path}',
+                                    '--poll-interval', str(args.poll_interval)],
+                                   stdout=subprocess.PIPE, text=True)
+        try:
+            gateway.stdout.readline()
+            asyncio.run(run(args, db_path, args.port, gateway))
+        finally:
+            gateway.terminate()
+            gateway.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Location upload cost: one POST /api/users/location per GPS fix vs
+POST /api/users/location/batch every --batch-seconds.
+
+Simulates --users clients driving for --minutes with one fix per second and
+sends their fixes through the Flask test client both ways. Reports requests,
+request body bytes and server time per simulated minute.
+
+Usage:
+    python benchmark_location_ingest.py [--users 50] [--minutes 2] [--batch-seconds 20]
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmp.name, 'bench.db')
+os.environ['LIVE_LOCATIONS_PATH'] = os.path.join(_tmp.name, 'live.db')
+
+import main_app  # noqa: E402  (environment must be set first)
+from main_app import app  # noqa: E402
+from location_ingest import Fix, encode_fixes  # noqa: E402
+
+
+def tracks(users, seconds, seed):
+    rng = random.Random(seed)
+    result = {}
+    for user_id in range(1, users + 1):
+        lat, lng = 50.0 + rng.random(), 14.0 + rng.random()
+        fixes = []
+        for second in range(seconds):
+            lat += rng.uniform(-1, 1) * 2e-4
+            lng += rng.uniform(-1, 1) * 3e-4
+            fixes.append(Fix(lat, lng, 1_760_000_000_000 + second * 1000, rng.uniform(3, 15), rng.uniform(0, 30),
+                             rng.uniform(0, 360)))
+        result[user_id] = fixes
+    return result
+
+
+def run_single(client, all_tracks):
+    requests = size = 0
+    started = time.perf_counter()
+    for user_id, fixes in all_tracks.items():
+        for fix in fixes:
+            body = json.dumps({'user_id': user_id, 'latitude': fix.lat, 'longitude': fix.lng})
+            client.post('/api/users/location', data=body, content_type='application/json')
+            requests += 1
+            size += len(body)
+    return requests, size, time.perf_counter() - started
+
+
+def run_batched(client, all_tracks, batch_seconds):
+    requests = size = 0
+    started = time.perf_counter()
+    for user_id, fixes in all_tracks.items():
+        for start in range(0, len(fixes), batch_seconds):
+            body = json.dumps({'user_id': user_id, 'fixes': encode_fixes(fixes[start:start + batch_seconds])},
+                              separators=(',', ':'))
+            client.post('/api/users/location/batch', data=body, content_type='application/json')
+            requests += 1
+            size += len(body)
+    main_app.location_writer.flush()
+    return requests, size, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-fix vs batched location uploads.")
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--minutes', type=float, default=2)
+    parser.add_argument('--batch-seconds', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    all_tracks = tracks(args.users, int(args.minutes * 60), args.seed)
+    client = app.test_client()
+    print(f"{args.users} users x {int(args.minutes * 60)} fixes, batches of {args.batch_seconds} s")
+    for name, (requests, size, elapsed) in (('per fix', run_single(client, all_tracks)),
+                                            ('batched', run_batched(client, all_tracks, args.batch_seconds))):
+        per_minute = args.users * args.minutes
+        print(f"{name:>8}: {requests / per_minute:6.1f} requests/user/min  {size / per_minute / 1024:6.1f} KiB/user/min"
+              f"  server {elapsed * 1000 / per_minute:6.2f} ms/user/min")
+    main_app.location_writer.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Login throughput against the number of request workers.
+
+Each request worker is a thread posting /api/users/login through the Flask
+test client for a fixed time while a probe thread measures the latency of a
+cheap endpoint (/api/status), which stands in for search traffic sharing the
+server. Two configurations are compared:
+
+  inline   one hashing thread per request worker, i.e. the previous behaviour
+           of calling bcrypt on the request thread
+  pool     the bounded PasswordHasher pool (BCRYPT_THREADS, default cores - 1)
+
+Usage:
+    python benchmark_login.py [--workers 1,2,4,8,16] [--rounds 12] [--seconds 5]
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+import bcrypt
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmp.name, 'login.db')
+
+import main_app  # noqa: E402  (DATABASE_URL must be set first)
+from main_app import app, db  # noqa: E402
+from password_hashing import PasswordHasher, default_threads  # noqa: E402
+
+USERS = 50
+PASSWORD = 'heslo123'
+
+
+def setup(rounds):
+    stored = bcrypt.hashpw(PASSWORD.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+    with app.app_context(), db.engine.begin() as connection:
+        connection.exec_driver_sql("CREATE TABLE users (id INTEGER PRIMARY KEY, name VARCHAR(100), phone VARCHAR(20),"
+                                   " email VARCHAR(120), rating FLOAT, password_hash VARCHAR(128))")
+        for user_id in range(1, USERS + 1):
+            connection.exec_driver_sql("INSERT INTO users (id, name, phone, rating, password_hash) VALUES (?, ?, ?, 5.0, ?)",
+                                       (user_id, f'Uživatel {user_id}', f'+420{user_id:09d}', stored))
+
+
+def run(workers, hasher, seconds):
+    main_app.password_hasher = hasher
+    deadline = time.perf_counter() + seconds
+    counts = {'ok': 0, 'busy': 0, 'error': 0}
+    probes = []
+    lock = threading.Lock()
+
+    def worker(worker_id):
+        client = app.test_client()
+        user_id = worker_id % USERS + 1
+        while time.perf_counter() < deadline:
+            status = client.post('/api/users/login', json={'phone': f'+420{user_id:09d}', 'password': PASSWORD}).status_code
+            outcome = 'ok' if status == 200 else 'busy' if status == 503 else 'error'
+            with lock:
+                counts[outcome] += 1
+
+    def probe():
+        client = app.test_client()
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            client.get('/api/status')
+            probes.append(time.perf_counter() - started)
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(workers)] + [threading.Thread(target=probe)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    hasher.shutdown()
+
+    probes.sort()
+    p95 = probes[int(len(probes) * 0.95)] if probes else 0
+    return counts['ok'] / elapsed, counts['busy'], counts['error'], statistics.median(probes) * 1000, p95 * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Login throughput vs request workers.")
+    parser.add_argument('--workers', default='1,2,4,8,16')
+    parser.add_argument('--rounds', type=int, default=12)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    setup(args.rounds)
+    print(f"cost {args.rounds}, {os.cpu_count()} cores, pool of {default_threads()} hashing threads")
+    print(f"{'workers':>7} {'mode':>6} {'logins/s':>9} {'503s':>5} {'errors':>6} {'probe p50 ms':>12} {'probe p95 ms':>12}")
+    for workers in (int(w) for w in args.workers.split(',')):
+        for mode, hasher in (('inline', PasswordHasher(rounds=args.rounds, threads=workers, max_pending=0)),
+                             ('pool', PasswordHasher(rounds=args.rounds))):
+            rate, busy, errors, p50, p95 = run(workers, hasher, args.seconds)
+            print(f"{workers:>7} {mode:>6} {rate:>9.1f} {busy:>5} {errors:>6} {p50:>12.1f} {p95:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
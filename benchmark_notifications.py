@@ -0,0 +1,149 @@
+"""
+Benchmark: notification reads from notification_inbox vs the UNION query.
+
+Builds a throwaway SQLite database with N active rides (driver + up to three
+confirmed passengers each) and an hour of chat traffic, writes the inbox the
+way send_chat_message does (one row per recipient), then times per-user
+notification reads:
+
+- union:  the previous get_user_notifications query (rides UNION reservations,
+          5-minute window over messages), with the c3a9f4e7d1b2 indexes
+- inbox:  the same 5-minute window read from the inbox
+- cursor: the inbox read from a cursor (GET /api/notifications/inbox)
+
+Usage:
+    python benchmark_notifications.py [--rides 10000] [--reads 2000]
+"""
+
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+SCHEMA = """
+CREATE TABLE users (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL);
+CREATE TABLE rides (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, departure_time VARCHAR NOT NULL);
+CREATE TABLE reservations (id INTEGER PRIMARY KEY, ride_id INTEGER NOT NULL, passenger_id INTEGER NOT NULL,
+                           seats_reserved INTEGER, status VARCHAR);
+CREATE TABLE messages (id INTEGER PRIMARY KEY, ride_id INTEGER NOT NULL, sender_id INTEGER NOT NULL,
+                       message TEXT NOT NULL, created_at DATETIME);
+CREATE TABLE notification_inbox (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, ride_id INTEGER NOT NULL,
+                                 message_id INTEGER, sender_id INTEGER, sender_name VARCHAR(100),
+                                 message TEXT NOT NULL, created_at DATETIME NOT NULL);
+CREATE INDEX ix_reservations_passenger_status_ride ON reservations (passenger_id, status, ride_id);
+CREATE INDEX ix_reservations_ride_status ON reservations (ride_id, status);
+CREATE INDEX ix_messages_ride_created ON messages (ride_id, created_at);
+CREATE INDEX ix_messages_created ON messages (created_at);
+CREATE INDEX ix_rides_user_departure ON rides (user_id, departure_time);
+CREATE INDEX ix_notification_inbox_user_id ON notification_inbox (user_id, id);
+CREATE INDEX ix_notification_inbox_user_created ON notification_inbox (user_id, created_at);
+CREATE INDEX ix_notification_inbox_created_at ON notification_inbox (created_at);
+"""
+
+UNION_QUERY = """
+    SELECT DISTINCT m.ride_id, m.message, m.created_at, u.name as sender_name
+    FROM messages m
+    JOIN users u ON m.sender_id = u.id
+    WHERE m.created_at > ?
+      AND m.sender_id != ?
+      AND m.ride_id IN (
+        SELECT r.id FROM rides r WHERE r.user_id = ?
+        UNION
+        SELECT res.ride_id FROM reservations res WHERE res.passenger_id = ?
+      )
+    ORDER BY m.created_at DESC
+    LIMIT 10
+"""
+
+INBOX_RECENT_QUERY = """
+    SELECT id, ride_id, message, created_at, sender_name FROM notification_inbox
+    WHERE user_id = ? AND created_at > ? ORDER BY created_at DESC LIMIT 10
+"""
+
+INBOX_CURSOR_QUERY = """
+    SELECT id, ride_id, message, created_at, sender_name FROM notification_inbox
+    WHERE user_id = ? AND id > ? ORDER BY id ASC LIMIT 100
+"""
+
+
+def populate(conn, rides, messages_per_ride, rng):
+    users = rides * 2
+    now = datetime.datetime.now()
+    conn.executemany("INSERT INTO users (id, name) VALUES (?, ?)", ((i, f"user{i}") for i in range(1, users + 1)))
+
+    participants = {}
+    reservations = []
+    for ride_id in range(1, rides + 1):
+        driver = rng.randint(1, users)
+        passengers = rng.sample(range(1, users + 1), rng.randint(0, 3))
+        participants[ride_id] = [driver] + [p for p in passengers if p != driver]
+        reservations.extend((ride_id, p, 1, 'confirmed') for p in passengers)
+    conn.executemany("INSERT INTO rides (id, user_id, departure_time) VALUES (?, ?, ?)",
+                     ((ride_id, members[0], "2026-11-01 08:00") for ride_id, members in participants.items()))
+    conn.executemany("INSERT INTO reservations (ride_id, passenger_id, seats_reserved, status) VALUES (?, ?, ?, ?)",
+                     reservations)
+
+    # An hour of traffic, inserted in time order like the live app
+    chat = []
+    for ride_id, members in participants.items():
+        for _ in range(messages_per_ride):
+            chat.append((now - datetime.timedelta(seconds=rng.uniform(0, 3600)), ride_id, rng.choice(members)))
+    chat.sort()
+    message_rows = []
+    inbox_rows = []
+    for message_id, (created_at, ride_id, sender_id) in enumerate(chat, start=1):
+        text = f"zprava {message_id}"
+        message_rows.append((message_id, ride_id, sender_id, text, created_at))
+        inbox_rows.extend((uid, ride_id, message_id, sender_id, f"user{sender_id}", text, created_at)
+                          for uid in participants[ride_id] if uid != sender_id)
+    conn.executemany("INSERT INTO messages (id, ride_id, sender_id, message, created_at) VALUES (?, ?, ?, ?, ?)",
+                     message_rows)
+    conn.executemany("INSERT INTO notification_inbox (user_id, ride_id, message_id, sender_id, sender_name, message, created_at)"
+                     " VALUES (?, ?, ?, ?, ?, ?, ?)", inbox_rows)
+    conn.commit()
+    conn.execute("ANALYZE")
+    return [uid for members in participants.values() for uid in members], len(message_rows), len(inbox_rows)
+
+
+def time_reads(label, reads, run):
+    started = time.perf_counter()
+    rows = 0
+    for args in reads:
+        rows += len(run(args))
+    elapsed = time.perf_counter() - started
+    print(f"{label:>7}: {elapsed / len(reads) * 1e6:8.1f} us/read  ({rows} rows)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark notification inbox reads against the UNION query.")
+    parser.add_argument('--rides', type=int, default=10_000)
+    parser.add_argument('--messages-per-ride', type=int, default=10)
+    parser.add_argument('--reads', type=int, default=2_000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "bench.db"))
+        conn.executescript(SCHEMA)
+        started = time.perf_counter()
+        active_users, messages, inbox = populate(conn, args.rides, args.messages_per_ride, rng)
+        print(f"{args.rides} rides, {messages} messages, {inbox} inbox rows "
+              f"(built in {time.perf_counter() - started:.1f}s)")
+
+        since = datetime.datetime.now() - datetime.timedelta(minutes=5)
+        users = [rng.choice(active_users) for _ in range(args.reads)]
+        cursors = {uid: conn.execute("SELECT COALESCE(MAX(id), 0) - 5 FROM notification_inbox WHERE user_id = ?",
+                                     (uid,)).fetchone()[0] for uid in set(users)}
+
+        time_reads("union", users, lambda uid: conn.execute(UNION_QUERY, (since, uid, uid, uid)).fetchall())
+        time_reads("inbox", users, lambda uid: conn.execute(INBOX_RECENT_QUERY, (uid, since)).fetchall())
+        time_reads("cursor", users, lambda uid: conn.execute(INBOX_CURSOR_QUERY, (uid, cursors[uid])).fetchall())
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
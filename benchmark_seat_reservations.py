@@ -0,0 +1,151 @@
+"""
+Stress benchmark: concurrent seat bookings, old read-check-write sequence vs
+seat_inventory's conditional UPDATE.
+
+Many threads book one seat at a time on a few popular rides until they are
+full. For each strategy it reports bookings per second, how many requests
+failed with lock errors, and whether any ride was oversold (more seats
+booked than it had). The "naive" strategy is the previous create_reservation:
+SELECT available_seats, INSERT reservation, UPDATE rides, no retry.
+
+Usage:
+    python benchmark_seat_reservations.py [--threads 16] [--rides 5] [--seats 50] [--database-url URL]
+
+Without --database-url a throwaway SQLite file is used. On PostgreSQL the
+naive strategy also oversells under READ COMMITTED.
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import DBAPIError
+
+from seat_inventory import SeatsUnavailable, reserve_seats, run_with_retry
+
+SCHEMA = [
+    "DROP TABLE IF EXISTS bench_reservations",
+    "DROP TABLE IF EXISTS bench_rides",
+    "CREATE TABLE bench_rides (id INTEGER PRIMARY KEY, available_seats INTEGER NOT NULL)",
+    "CREATE TABLE bench_reservations (id SERIAL PRIMARY KEY, ride_id INTEGER, passenger_id INTEGER,"
+    " seats_reserved INTEGER, status VARCHAR(20))",
+]
+
+
+class Full(Exception):
+    pass
+
+
+def naive_book(engine, ride_id, passenger_id):
+    with engine.begin() as connection:
+        seats = connection.execute(text("SELECT available_seats FROM bench_rides WHERE id = :ride_id"),
+                                   {'ride_id': ride_id}).scalar()
+        if seats is None or seats < 1:
+            raise Full()
+        connection.execute(text("INSERT INTO bench_reservations (ride_id, passenger_id, seats_reserved, status)"
+                                " VALUES (:ride_id, :passenger_id, 1, 'confirmed')"),
+                           {'ride_id': ride_id, 'passenger_id': passenger_id})
+        connection.execute(text("UPDATE bench_rides SET available_seats = available_seats - 1 WHERE id = :ride_id"),
+                           {'ride_id': ride_id})
+
+
+class _Renamed:
+    """Runs seat_inventory's statements against the bench_* tables."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, statement, params):
+        sql = str(statement).replace('UPDATE rides', 'UPDATE bench_rides').replace('INTO reservations', 'INTO bench_reservations')
+        return self.connection.execute(text(sql), params)
+
+
+def atomic_book(engine, ride_id, passenger_id):
+    def transaction():
+        with engine.begin() as connection:
+            reserve_seats(_Renamed(connection), ride_id, passenger_id, 1)
+    try:
+        run_with_retry(transaction, attempts=20)
+    except SeatsUnavailable:
+        raise Full()
+
+
+def run(engine, strategy, threads, rides, seats, seed):
+    with engine.begin() as connection:
+        for sql in SCHEMA:
+            if engine.dialect.name == 'sqlite':
+                sql = sql.replace('SERIAL', 'INTEGER')
+            connection.execute(text(sql))
+        for ride_id in range(1, rides + 1):
+            connection.execute(text("INSERT INTO bench_rides (id, available_seats) VALUES (:id, :seats)"),
+                               {'id': ride_id, 'seats': seats})
+
+    counters = {'booked': 0, 'lock_errors': 0, 'full': 0}
+    lock = threading.Lock()
+    open_rides = set(range(1, rides + 1))
+
+    def worker(worker_id):
+        rng = random.Random(seed + worker_id)
+        passenger_id = worker_id * 1_000_000
+        while True:
+            with lock:
+                if not open_rides:
+                    return
+                ride_id = rng.choice(sorted(open_rides))
+            passenger_id += 1
+            try:
+                strategy(engine, ride_id, passenger_id)
+                outcome = 'booked'
+            except Full:
+                outcome = 'full'
+                with lock:
+                    open_rides.discard(ride_id)
+            except DBAPIError:
+                outcome = 'lock_errors'
+            with lock:
+                counters[outcome] += 1
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with engine.begin() as connection:
+        booked = dict(connection.execute(text("SELECT ride_id, COUNT(*) FROM bench_reservations GROUP BY ride_id")).fetchall())
+        remaining = dict(connection.execute(text("SELECT id, available_seats FROM bench_rides")).fetchall())
+    oversold = sum(max(0, booked.get(ride_id, 0) - seats) for ride_id in remaining)
+    negative = sum(1 for seats_left in remaining.values() if seats_left < 0)
+    print(f"{strategy.__name__:>11}: {counters['booked'] / elapsed:8.0f} bookings/s  "
+          f"booked {counters['booked']}/{rides * seats}  lock errors {counters['lock_errors']}  "
+          f"oversold seats {oversold}  rides below zero {negative}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent seat booking stress test.")
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--rides', type=int, default=5)
+    parser.add_argument('--seats', type=int, default=50)
+    parser.add_argument('--database-url')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.database_url or 'sqlite:///' + os.path.join(tmp, 'seats.db')
+        if url.startswith('postgres://'):
+            url = url.replace('postgres://', 'postgresql+psycopg2://', 1)
+        engine = create_engine(url, pool_size=args.threads) if not url.startswith('sqlite') else create_engine(url)
+        print(f"{engine.dialect.name}, {args.threads} threads, {args.rides} rides x {args.seats} seats")
+        for strategy in (naive_book, atomic_book):
+            run(engine, strategy, args.threads, args.rides, args.seats, args.seed)
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,394 @@
+"""
+Real-time chat gateway: per-ride rooms over Server-Sent Events.
+
+Runs as its own process on a single asyncio event loop, next to main_app.py:
+
+    python chat_gateway.py --port 8765 [--database-url sqlite:///spolujizda.db]
+
+It is fed by the normal message insert path: send_chat_message writes the
+`messages` row as before and the gateway tails the table by id (one indexed
+query per poll interval for all rides), then fans each new message out to the
+ride's room. A client that reconnects with Last-Event-ID gets the messages it
+missed from the database before joining the live stream.
+
+Ids are assigned at INSERT but rows become visible at COMMIT, so a message can
+appear after one with a higher id. The tail therefore does not stop at the
+highest id seen: it re-reads every message first seen within the last
+`settle_seconds` and skips the ids it already delivered. Only a transaction
+that commits more than `settle_seconds` after a higher id was delivered can
+still be missed. Events then arrive in commit order rather than id order, and
+a Last-Event-ID resume sends whatever the gateway delivered after that event.
+
+Endpoints:
+    GET /rides/<ride_id>/events?user_id=N   SSE: `message` and `presence` events
+    GET /rides/<ride_id>/presence           JSON list of connected user ids
+    GET /health                             connection/room counters
+
+Backpressure: every connection has a bounded queue. Broadcast never waits on
+a client; a client whose queue is full is disconnected and catches up via
+Last-Event-ID when it reconnects, so one slow phone cannot stall a room.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+# (id, ride_id, sender_id, sender_name, message, created_at)
+MessageRow = Tuple[int, int, int, str, str, object]
+
+MAX_REQUEST_BYTES = 8192
+HISTORY_LIMIT = 200
+DEFAULT_SETTLE_SECONDS = 10.0
+
+
+class MessageSource:
+    """Reads messages with a SQLAlchemy engine; called from the loop's thread pool."""
+
+    def __init__(self, database_url: str):
+        from sqlalchemy import create_engine
+        if database_url.startswith('postgres://'):
+            database_url = database_url.replace('postgres://', 'postgresql+psycopg2://', 1)
+        self.engine = create_engine(database_url)
+
+    def latest_id(self) -> int:
+        from sqlalchemy import text
+        with self.engine.connect() as connection:
+            return connection.execute(text('SELECT COALESCE(MAX(id), 0) FROM messages')).scalar()
+
+    def messages_after(self, after_id: int, limit: int, ride_id: Optional[int] = None) -> List[MessageRow]:
+        from sqlalchemy import text
+        ride_filter = 'AND m.ride_id = :ride_id' if ride_id is not None else ''
+        with self.engine.connect() as connection:
+            return [tuple(row) for row in connection.execute(text(f"""
+                SELECT m.id, m.ride_id, m.sender_id, u.name, m.message, m.created_at
+                FROM messages m JOIN users u ON m.sender_id = u.id
+                WHERE m.id > :after_id AND m.created_at IS NOT NULL {ride_filter}
+                ORDER BY m.id ASC LIMIT :limit
+            """), {'after_id': after_id, 'limit': limit, 'ride_id': ride_id})]
+
+
+def format_event(event: str, data: dict, event_id: Optional[int] = None) -> bytes:
+    head = f'id: {event_id}\n' if event_id is not None else ''
+    return f'{head}event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'.encode('utf-8')
+
+
+def message_event(row: MessageRow) -> bytes:
+    message_id, ride_id, sender_id, sender_name, message, created_at = row
+    if isinstance(created_at, datetime.datetime):
+        created_at = created_at.isoformat()
+    return format_event('message', {'id': message_id, 'ride_id': ride_id, 'sender_id': sender_id,
+                                    'sender_name': sender_name, 'message': message, 'created_at': created_at},
+                        message_id)
+
+
+class Client:
+    __slots__ = ('ride_id', 'user_id', 'queue', 'task')
+
+    def __init__(self, ride_id: int, user_id: Optional[int], queue_size: int):
+        self.ride_id = ride_id
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self.task: Optional[asyncio.Task] = None
+
+
+class Room:
+    __slots__ = ('clients', 'presence')
+
+    def __init__(self):
+        self.clients: Set[Client] = set()
+        self.presence: Counter = Counter()
+
+
+class ChatGateway:
+    def __init__(self, source, poll_interval: float = 1.0, queue_size: int = 64, heartbeat: float = 25.0,
+                 batch_size: int = 500, settle_seconds: float = DEFAULT_SETTLE_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.source = source
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.batch_size = batch_size
+        self.settle_seconds = settle_seconds
+        self._clock = clock
+        self.rooms: Dict[int, Room] = {}
+        self.last_id = 0
+        # Every id above floor_id that was delivered: id -> (delivery order, first seen), in delivery order
+        self.floor_id = 0
+        self._recent: Dict[int, Tuple[int, float]] = {}
+        self._deliveries = 0
+        self.stats = {'connections': 0, 'delivered': 0, 'dropped_slow': 0}
+        self._tail_task: Optional[asyncio.Task] = None
+
+    # --- rooms -------------------------------------------------------------
+
+    def join(self, client: Client) -> None:
+        room = self.rooms.get(client.ride_id)
+        if room is None:
+            room = self.rooms[client.ride_id] = Room()
+        if client.user_id is not None:
+            room.presence[client.user_id] += 1
+            if room.presence[client.user_id] == 1:
+                # The joining client gets the presence list as its first event instead
+                self._broadcast_presence(client.ride_id, room)
+        room.clients.add(client)
+        self.stats['connections'] += 1
+
+    def leave(self, client: Client) -> None:
+        room = self.rooms.get(client.ride_id)
+        if self._remove(client) and client.ride_id in self.rooms:
+            self._broadcast_presence(client.ride_id, room)
+
+    def _remove(self, client: Client) -> bool:
+        """Takes the client out of its room; returns True if its user went offline."""
+        room = self.rooms.get(client.ride_id)
+        if room is None or client not in room.clients:
+            return False
+        room.clients.discard(client)
+        self.stats['connections'] -= 1
+        went_offline = False
+        if client.user_id is not None:
+            room.presence[client.user_id] -= 1
+            if room.presence[client.user_id] <= 0:
+                del room.presence[client.user_id]
+                went_offline = True
+        if not room.clients:
+            del self.rooms[client.ride_id]
+        return went_offline
+
+    def presence(self, ride_id: int) -> List[int]:
+        room = self.rooms.get(ride_id)
+        return sorted(room.presence) if room else []
+
+    def broadcast(self, ride_id: int, payload: bytes) -> int:
+        """Queues an encoded event for every client in the room without waiting; returns deliveries."""
+        room = self.rooms.get(ride_id)
+        if room is None:
+            return 0
+        delivered = 0
+        slow = []
+        for client in room.clients:
+            try:
+                client.queue.put_nowait(payload)
+                delivered += 1
+            except asyncio.QueueFull:
+                slow.append(client)
+        self.stats['delivered'] += delivered
+        # Slow consumers are dropped after the loop, with one presence update for all of them;
+        # they resume from Last-Event-ID on reconnect
+        presence_changed = False
+        for client in slow:
+            self.stats['dropped_slow'] += 1
+            if client.task is not None:
+                client.task.cancel()
+            presence_changed |= self._remove(client)
+        if presence_changed and ride_id in self.rooms:
+            self._broadcast_presence(ride_id, room)
+        return delivered
+
+    def _broadcast_presence(self, ride_id: int, room: Room) -> None:
+        self.broadcast(ride_id, format_event('presence', {'ride_id': ride_id, 'user_ids': sorted(room.presence)}))
+
+    # --- feed --------------------------------------------------------------
+
+    async def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        self.last_id = self.floor_id = await loop.run_in_executor(None, self.source.latest_id)
+        self._tail_task = asyncio.ensure_future(self._tail())
+
+    async def stop(self) -> None:
+        if self._tail_task is not None:
+            self._tail_task.cancel()
+            try:
+                await self._tail_task
+            except asyncio.CancelledError:
+                pass
+
+    async def poll_once(self) -> int:
+        """Delivers the committed messages not delivered yet; returns how many."""
+        loop = asyncio.get_running_loop()
+        now = self._clock()
+        delivered = 0
+        after_id = self.floor_id
+        while True:
+            rows = await loop.run_in_executor(None, self.source.messages_after, after_id, self.batch_size)
+            for row in rows:
+                if row[0] in self._recent:
+                    continue
+                self._deliveries += 1
+                self._recent[row[0]] = (self._deliveries, now)
+                self.last_id = max(self.last_id, row[0])
+                delivered += 1
+                if row[1] in self.rooms:
+                    self.broadcast(row[1], message_event(row))
+            if len(rows) < self.batch_size:
+                break
+            after_id = rows[-1][0]
+        self._settle(now)
+        return delivered
+
+    def _settle(self, now: float) -> None:
+        # Ids delivered longer than settle_seconds ago are final: nothing below them is expected to commit anymore
+        settled = {message_id for message_id, (_, seen_at) in self._recent.items()
+                   if now - seen_at >= self.settle_seconds}
+        if settled:
+            self.floor_id = max(self.floor_id, max(settled))
+            self._recent = {message_id: seen for message_id, seen in self._recent.items()
+                            if message_id > self.floor_id and message_id not in settled}
+
+    def _delivered_before(self, message_id: int, last_event_id: int) -> bool:
+        """Whether a client whose last received event was last_event_id already has message_id."""
+        seen = self._recent.get(message_id)
+        last = self._recent.get(last_event_id)
+        if seen is None:
+            # Settled before the look-back window, or committed but not polled yet
+            return message_id <= last_event_id
+        # In the window delivery order decides; a settled last_event_id came before the whole window
+        return last is not None and seen[0] <= last[0]
+
+    async def _tail(self) -> None:
+        while True:
+            try:
+                await self.poll_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"chat_gateway: poll failed: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    # --- HTTP --------------------------------------------------------------
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            try:
+                head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout=10)
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError):
+                return
+            if len(head) > MAX_REQUEST_BYTES:
+                await self._respond(writer, 431, {'error': 'Request header too large'})
+                return
+            lines = head.decode('latin-1').split('\r\n')
+            parts = lines[0].split(' ')
+            if len(parts) != 3 or parts[0] != 'GET':
+                await self._respond(writer, 405, {'error': 'Method not allowed'})
+                return
+            headers = {}
+            for line in lines[1:]:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            url = urlsplit(parts[1])
+            query = parse_qs(url.query)
+            path = url.path.strip('/').split('/')
+
+            if path == ['health']:
+                await self._respond(writer, 200, dict(self.stats, rooms=len(self.rooms), last_id=self.last_id,
+                                                         floor_id=self.floor_id))
+            elif len(path) == 3 and path[0] == 'rides' and path[1].isdigit() and path[2] == 'presence':
+                await self._respond(writer, 200, {'ride_id': int(path[1]), 'user_ids': self.presence(int(path[1]))})
+            elif len(path) == 3 and path[0] == 'rides' and path[1].isdigit() and path[2] == 'events':
+                user_id = query.get('user_id', [None])[0]
+                last_event_id = headers.get('last-event-id') or query.get('last_event_id', [None])[0]
+                await self._stream(reader, writer, int(path[1]), int(user_id) if user_id and user_id.isdigit() else None,
+                                   int(last_event_id) if last_event_id and last_event_id.isdigit() else None)
+            else:
+                await self._respond(writer, 404, {'error': 'Not found'})
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, body: dict) -> None:
+        payload = json.dumps(body).encode('utf-8')
+        writer.write(f'HTTP/1.1 {status} {"OK" if status == 200 else "Error"}\r\n'
+                     f'Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n'
+                     f'Access-Control-Allow-Origin: *\r\nConnection: close\r\n\r\n'.encode('latin-1') + payload)
+        await writer.drain()
+
+    async def _stream(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, ride_id: int,
+                      user_id: Optional[int], last_event_id: Optional[int]) -> None:
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n'
+                     b'Access-Control-Allow-Origin: *\r\nX-Accel-Buffering: no\r\nConnection: keep-alive\r\n\r\n'
+                     b'retry: 3000\n\n')
+        client = Client(ride_id, user_id, self.queue_size)
+        client.task = asyncio.current_task()
+        # Join before the backfill so nothing published in between is lost; duplicates are skipped by id
+        self.join(client)
+        # An idle stream only writes on heartbeats, so watch the socket to update presence on disconnect
+        watcher = asyncio.ensure_future(self._cancel_on_eof(reader, client.task))
+        try:
+            backfilled: Set[int] = set()
+            if last_event_id is not None:
+                loop = asyncio.get_running_loop()
+                after_id = min(last_event_id, self.floor_id)
+                missed = await loop.run_in_executor(None, self.source.messages_after, after_id, HISTORY_LIMIT, ride_id)
+                for row in missed:
+                    if self._delivered_before(row[0], last_event_id):
+                        continue
+                    writer.write(message_event(row))
+                    backfilled.add(row[0])
+            writer.write(format_event('presence', {'ride_id': ride_id, 'user_ids': self.presence(ride_id)}))
+            await writer.drain()
+            while True:
+                try:
+                    payload = await asyncio.wait_for(client.queue.get(), timeout=self.heartbeat)
+                except asyncio.TimeoutError:
+                    writer.write(b': heartbeat\n\n')
+                else:
+                    if backfilled and payload.startswith(b'id: '):
+                        if int(payload[4:payload.index(b'\n')]) in backfilled:
+                            continue
+                    writer.write(payload)
+                await writer.drain()
+        finally:
+            watcher.cancel()
+            self.leave(client)
+
+    @staticmethod
+    async def _cancel_on_eof(reader: asyncio.StreamReader, task: asyncio.Task) -> None:
+        try:
+            while await reader.read(1024):
+                pass
+        except ConnectionError:
+            pass
+        task.cancel()
+
+
+async def serve(gateway: ChatGateway, host: str, port: int) -> asyncio.AbstractServer:
+    await gateway.start()
+    return await asyncio.start_server(gateway.handle, host, port, backlog=4096, limit=MAX_REQUEST_BYTES)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Real-time chat gateway (SSE, per-ride rooms).")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('CHAT_GATEWAY_PORT', 8765)))
+    parser.add_argument('--database-url', default=os.environ.get('DATABASE_URL') or 'sqlite:///spolujizda.db')
+    parser.add_argument('--poll-interval', type=float, default=1.0)
+    parser.add_argument('--queue-size', type=int, default=64)
+    parser.add_argument('--settle-seconds', type=float, default=DEFAULT_SETTLE_SECONDS,
+                        help="how long to keep re-reading delivered ids for late-committing lower ones")
+    args = parser.parse_args(argv)
+
+    async def run():
+        gateway = ChatGateway(MessageSource(args.database_url), poll_interval=args.poll_interval,
+                              queue_size=args.queue_size, settle_seconds=args.settle_seconds)
+        server = await serve(gateway, args.host, args.port)
+        print(f"Chat gateway listening on {args.host}:{args.port}")
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
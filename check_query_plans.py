@@ -0,0 +1,216 @@
+"""
+Checks that the hot queries in main_app.py are served by indexes.
+
+Runs EXPLAIN on each query in QUERIES against the configured database
+(DATABASE_URL, default sqlite:///spolujizda.db) and exits with status 1 if
+any of them still needs a full table scan. On PostgreSQL sequential scans
+are disabled for the check, so a "Seq Scan" in the plan means no usable
+index exists rather than the planner preferring a scan of a tiny table.
+
+Queries whose tables or columns do not exist in the database (e.g. the
+payments table on a fresh migration-only schema) are reported as skipped,
+and the check exits with status 2 because their plans were not verified.
+With --allow-skip, skips are tolerated as long as at least one query was
+actually checked.
+
+Usage:
+    python check_query_plans.py [--allow-skip] [database_url]
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import json
+import os
+import re
+import sys
+from typing import List, Tuple
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import DBAPIError
+
+NOW = datetime.datetime(2026, 1, 1, 12, 0)
+
+# (name, sql, params) - kept in sync with the queries in main_app.py
+QUERIES: List[Tuple[str, str, dict]] = [
+    ('get_driver_rides', """
+        SELECT r.id, r.departure_time, u.name, u.rating
+        FROM rides r LEFT JOIN users u ON r.user_id = u.id
+        WHERE r.user_id = :user_id ORDER BY r.departure_time ASC
+    """, {'user_id': 1}),
+    ('get_ride_reservations', """
+        SELECT res.seats_reserved, u.name, u.phone
+        FROM reservations res JOIN users u ON res.passenger_id = u.id
+        WHERE res.ride_id = :ride_id AND res.status != 'cancelled'
+    """, {'ride_id': 1}),
+    ('get_ride_messages', """
+        SELECT m.message, m.created_at, m.sender_id, u.name
+        FROM messages m JOIN users u ON m.sender_id = u.id
+        WHERE m.ride_id = :ride_id ORDER BY m.created_at ASC
+    """, {'ride_id': 1}),
+    ('get_user_reservations', """
+        SELECT res.id, r.from_location, r.departure_time, u.name
+        FROM reservations res JOIN rides r ON res.ride_id = r.id JOIN users u ON r.user_id = u.id
+        WHERE res.passenger_id = :user_id AND res.status = 'confirmed'
+        ORDER BY r.departure_time ASC
+    """, {'user_id': 1}),
+    ('reservation_payment', """
+        SELECT status FROM payments
+        WHERE ride_id = :ride_id AND passenger_id = :user_id AND status = 'completed'
+    """, {'ride_id': 1, 'user_id': 1}),
+    ('get_driver_reservations', """
+        SELECT res.id, res.seats_reserved, r.departure_time, u.name
+        FROM reservations res JOIN rides r ON res.ride_id = r.id JOIN users u ON r.user_id = u.id
+        WHERE r.user_id = :driver_id AND res.status = 'confirmed'
+        ORDER BY r.departure_time DESC
+    """, {'driver_id': 1}),
+    ('cancel_ride_reservations', """
+        UPDATE reservations SET status = 'cancelled' WHERE ride_id = :ride_id
+    """, {'ride_id': 1}),
+    ('user_by_name', """
+        SELECT id FROM users WHERE name = :name
+    """, {'name': 'Jan Novák'}),
+    ('user_by_name_normalized', """
+        SELECT id, name FROM users
+        WHERE name_normalized = :name_normalized OR (name_normalized IS NULL AND name = :name)
+    """, {'name_normalized': 'jan novák', 'name': 'Jan Novák'}),
+    ('user_by_phone', """
+        SELECT id, name, rating, password_hash FROM users WHERE phone = :phone
+    """, {'phone': '+420123456789'}),
+    ('get_chat_messages_latest', """
+        SELECT m.id, m.message, m.created_at, m.sender_id, u.name
+        FROM messages m JOIN users u ON m.sender_id = u.id
+        WHERE m.ride_id = :ride_id AND m.created_at IS NOT NULL
+        ORDER BY m.id DESC LIMIT 50
+    """, {'ride_id': 1}),
+    ('get_chat_messages_after', """
+        SELECT m.id, m.message, m.created_at, m.sender_id, u.name
+        FROM messages m JOIN users u ON m.sender_id = u.id
+        WHERE m.ride_id = :ride_id AND m.created_at IS NOT NULL AND m.id > :after_id
+        ORDER BY m.id ASC LIMIT 50
+    """, {'ride_id': 1, 'after_id': 0}),
+    ('get_chat_messages_late', """
+        SELECT m.id, m.message, m.created_at, m.sender_id, u.name
+        FROM messages m JOIN users u ON m.sender_id = u.id
+        WHERE m.ride_id = :ride_id AND m.created_at >= :since AND m.id <= :after_id
+        ORDER BY m.created_at ASC LIMIT 50
+    """, {'ride_id': 1, 'since': NOW, 'after_id': 100}),
+    ('user_ride_ids', """
+        SELECT r.id FROM rides r WHERE r.user_id = :user_id
+        UNION
+        SELECT res.ride_id FROM reservations res WHERE res.passenger_id = :user_id
+    """, {'user_id': 1}),
+    ('recent_notifications', """
+        SELECT DISTINCT m.ride_id, m.message, m.created_at, u.name
+        FROM messages m JOIN users u ON m.sender_id = u.id
+        WHERE m.created_at > :since AND m.sender_id != :user_id
+          AND m.ride_id IN (
+            SELECT r.id FROM rides r WHERE r.user_id = :user_id
+            UNION
+            SELECT res.ride_id FROM reservations res WHERE res.passenger_id = :user_id
+          )
+        ORDER BY m.created_at DESC LIMIT 10
+    """, {'user_id': 1, 'since': NOW}),
+    ('latest_messages', """
+        SELECT m.ride_id, m.message, m.created_at FROM messages m
+        ORDER BY m.created_at DESC LIMIT 20
+    """, {}),
+    ('notification_inbox_cursor', """
+        SELECT id, ride_id, message, created_at, sender_name FROM notification_inbox
+        WHERE user_id = :user_id AND id > :after_id ORDER BY id ASC LIMIT 100
+    """, {'user_id': 1, 'after_id': 0}),
+    ('notification_inbox_late', """
+        SELECT id, ride_id, message, created_at, sender_name FROM notification_inbox
+        WHERE user_id = :user_id AND created_at >= :since AND id <= :after_id ORDER BY created_at ASC LIMIT 100
+    """, {'user_id': 1, 'since': NOW, 'after_id': 100}),
+    ('notification_inbox_recent', """
+        SELECT id, ride_id, message, created_at, sender_name FROM notification_inbox
+        WHERE user_id = :user_id AND created_at > :since ORDER BY created_at DESC LIMIT 10
+    """, {'user_id': 1, 'since': NOW}),
+    ('prune_notifications', """
+        DELETE FROM notification_inbox WHERE created_at < :cutoff
+    """, {'cutoff': NOW}),
+    ('push_outbox_due', """
+        SELECT id FROM push_outbox WHERE available_at <= :now ORDER BY available_at, id LIMIT 100
+    """, {'now': NOW}),
+    ('push_subscriptions', """
+        SELECT user_id, endpoint, p256dh, auth FROM push_subscription WHERE user_id IN (1, 2, 3)
+    """, {}),
+    ('rating_aggregate_score', """
+        UPDATE users SET rating = (SELECT (0.0 * 5.0 + a.rating_sum) / (0.0 + a.rating_count)
+                                   FROM rating_aggregates a WHERE a.user_id = users.id)
+        WHERE id = :user_id
+    """, {'user_id': 1}),
+    ('profile', """
+        SELECT u.id, u.name, u.rating, s.rides_as_driver, s.rides_as_passenger, s.total_distance
+        FROM users u LEFT JOIN user_stats s ON s.user_id = u.id WHERE u.id = :user_id
+    """, {'user_id': 1}),
+    ('user_stats_passenger_reservations', """
+        SELECT COUNT(*) FROM reservations WHERE ride_id = :ride_id AND passenger_id = :passenger_id AND status = 'confirmed'
+    """, {'ride_id': 1, 'passenger_id': 1}),
+]
+
+# "SCAN rides" / "SCAN r" with no index; "SCAN r USING INDEX ..." walks an index in order
+_SQLITE_FULL_SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+
+
+def sqlite_full_scans(connection, sql: str, params: dict) -> List[str]:
+    rows = connection.execute(text('EXPLAIN QUERY PLAN ' + sql), params).fetchall()
+    return [row[-1] for row in rows if _SQLITE_FULL_SCAN.match(row[-1])]
+
+
+def postgres_full_scans(connection, sql: str, params: dict) -> List[str]:
+    connection.execute(text('SET LOCAL enable_seqscan = off'))
+    plan = connection.execute(text('EXPLAIN (FORMAT JSON) ' + sql), params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    scans = []
+    stack = [plan[0]['Plan']]
+    while stack:
+        node = stack.pop()
+        if node.get('Node Type') == 'Seq Scan':
+            scans.append(f"Seq Scan on {node.get('Relation Name')}")
+        stack.extend(node.get('Plans', []))
+    return scans
+
+
+def check(database_url: str, allow_skip: bool = False) -> int:
+    engine = create_engine(database_url)
+    explain = postgres_full_scans if engine.dialect.name == 'postgresql' else sqlite_full_scans
+    failures = 0
+    skipped = 0
+    for name, sql, params in QUERIES:
+        with engine.connect() as connection:
+            transaction = connection.begin()
+            try:
+                scans = explain(connection, sql, params)
+            except DBAPIError as e:
+                skipped += 1
+                print(f"SKIP {name}: {str(e.orig).splitlines()[0]}")
+                continue
+            finally:
+                transaction.rollback()
+        if scans:
+            failures += 1
+            print(f"FAIL {name}: {'; '.join(scans)}")
+        else:
+            print(f"ok   {name}")
+    print(f"{len(QUERIES)} queries, {failures} with full scans, {skipped} skipped")
+    if failures:
+        return 1
+    if skipped and (not allow_skip or skipped == len(QUERIES)):
+        return 2
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Checks that the hot queries are served by indexes.')
+    parser.add_argument('database_url', nargs='?')
+    parser.add_argument('--allow-skip', action='store_true',
+                        help='do not fail on queries whose tables are missing, unless all of them are')
+    args = parser.parse_args()
+    url = args.database_url or os.environ.get('DATABASE_URL') or 'sqlite:///spolujizda.db'
+    if url.startswith('postgres://'):
+        url = url.replace('postgres://', 'postgresql+psycopg2://', 1)
+    sys.exit(check(url, args.allow_skip))
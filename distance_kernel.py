@@ -0,0 +1,148 @@
+"""
+Batched haversine distances over ride coordinates.
+
+Coordinates are kept in contiguous float64 arrays (radians, with the cosine
+of the latitude precomputed) so distances from one or many query points to
+every ride are computed in a single vectorized NumPy pass.
+
+Run `python distance_kernel.py` for a micro-benchmark against the scalar
+per-row `calculate_distance` closure previously used by search_rides.
+"""
+
+from __future__ import annotations
+
+from typing import Hashable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_km(lat: float, lng: float, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    """Distances (km) from one point to arrays of points, all in degrees."""
+    lat_rad = np.radians(lat)
+    lats_rad = np.radians(np.asarray(lats, dtype=np.float64))
+    lngs_rad = np.radians(np.asarray(lngs, dtype=np.float64))
+    return _haversine(lat_rad, np.radians(lng), np.cos(lat_rad), lats_rad, lngs_rad, np.cos(lats_rad))
+
+
+def _haversine(lat_rad, lng_rad, cos_lat, lats_rad, lngs_rad, cos_lats) -> np.ndarray:
+    a = np.sin((lats_rad - lat_rad) / 2.0) ** 2 + cos_lat * cos_lats * np.sin((lngs_rad - lng_rad) / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _top_k(distances: np.ndarray, k: Optional[int]) -> np.ndarray:
+    """Indices of the k smallest distances, ordered nearest first."""
+    if k is None or k >= distances.size:
+        return np.argsort(distances, kind="stable")
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    part = np.argpartition(distances, k - 1)[:k]
+    return part[np.argsort(distances[part], kind="stable")]
+
+
+class CoordinateArray:
+    """Immutable batch of (id, lat, lng) points."""
+
+    def __init__(self, ids: Sequence[Hashable], lats: Sequence[float], lngs: Sequence[float]):
+        self.ids = list(ids)
+        lats = np.ascontiguousarray(lats, dtype=np.float64)
+        lngs = np.ascontiguousarray(lngs, dtype=np.float64)
+        if not (len(self.ids) == lats.size == lngs.size):
+            raise ValueError("ids, lats and lngs must have the same length")
+        self.lats = lats
+        self.lngs = lngs
+        self._lats_rad = np.radians(lats)
+        self._lngs_rad = np.radians(lngs)
+        self._cos_lats = np.cos(self._lats_rad)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[Hashable, float, float]]) -> "CoordinateArray":
+        ids: List[Hashable] = []
+        lats: List[float] = []
+        lngs: List[float] = []
+        for key, lat, lng in rows:
+            ids.append(key)
+            lats.append(lat)
+            lngs.append(lng)
+        return cls(ids, lats, lngs)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def distances_to(self, lat: float, lng: float) -> np.ndarray:
+        lat_rad = np.radians(lat)
+        return _haversine(lat_rad, np.radians(lng), np.cos(lat_rad), self._lats_rad, self._lngs_rad, self._cos_lats)
+
+    def distances_to_many(self, points: Sequence[Tuple[float, float]]) -> np.ndarray:
+        """Distance matrix of shape (len(points), len(self))."""
+        query = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        lat_rad = np.radians(query[:, 0])[:, None]
+        lng_rad = np.radians(query[:, 1])[:, None]
+        return _haversine(lat_rad, lng_rad, np.cos(lat_rad), self._lats_rad, self._lngs_rad, self._cos_lats)
+
+    def nearest(self, lat: float, lng: float, k: Optional[int] = None,
+                max_distance_km: Optional[float] = None) -> List[Tuple[Hashable, float]]:
+        """(id, distance_km) pairs nearest first, optionally capped by count and radius."""
+        if not self.ids:
+            return []
+        distances = self.distances_to(lat, lng)
+        return self._select(distances, k, max_distance_km)
+
+    def nearest_many(self, points: Sequence[Tuple[float, float]], k: Optional[int] = None,
+                     max_distance_km: Optional[float] = None) -> List[List[Tuple[Hashable, float]]]:
+        if not self.ids:
+            return [[] for _ in points]
+        matrix = self.distances_to_many(points)
+        return [self._select(row, k, max_distance_km) for row in matrix]
+
+    def _select(self, distances: np.ndarray, k: Optional[int],
+                max_distance_km: Optional[float]) -> List[Tuple[Hashable, float]]:
+        candidates = np.arange(distances.size)
+        if max_distance_km is not None:
+            candidates = np.flatnonzero(distances <= max_distance_km)
+        order = candidates[_top_k(distances[candidates], k)]
+        return [(self.ids[i], float(distances[i])) for i in order]
+
+
+if __name__ == "__main__":
+    import math
+    import timeit
+
+    def calculate_distance(lat1, lng1, lat2, lng2):
+        R = 6371
+        dlat = math.radians(lat2 - lat1)
+        dlng = math.radians(lng2 - lng1)
+        a = math.sin(dlat/2) * math.sin(dlat/2) + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlng/2) * math.sin(dlng/2)
+        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+        return R * c
+
+    rng = np.random.default_rng(42)
+    queries = [(49.1951, 16.6068), (50.0755, 14.4378), (49.8209, 18.2625)]
+
+    print(f"{'rides':>8} {'scalar ms':>10} {'vector ms':>10} {'batch3 ms':>10} {'speedup':>8}")
+    for size in (1_000, 10_000, 50_000, 200_000):
+        lats = rng.uniform(48.6, 51.0, size)
+        lngs = rng.uniform(12.1, 18.8, size)
+        rows = list(zip(range(size), lats.tolist(), lngs.tolist()))
+        coords = CoordinateArray.from_rows(rows)
+        lat, lng = queries[0]
+
+        def scalar():
+            hits = [(key, d) for key, rlat, rlng in rows
+                    if (d := calculate_distance(lat, lng, rlat, rlng)) <= 50]
+            hits.sort(key=lambda item: item[1])
+            return hits
+
+        def vector():
+            return coords.nearest(lat, lng, max_distance_km=50)
+
+        def batch():
+            return coords.nearest_many(queries, k=20, max_distance_km=50)
+
+        assert [key for key, _ in scalar()] == [key for key, _ in vector()]
+        repeat = max(1, 200_000 // size)
+        scalar_ms = timeit.timeit(scalar, number=repeat) / repeat * 1000
+        vector_ms = timeit.timeit(vector, number=repeat) / repeat * 1000
+        batch_ms = timeit.timeit(batch, number=repeat) / repeat * 1000
+        print(f"{size:>8} {scalar_ms:>10.2f} {vector_ms:>10.2f} {batch_ms:>10.2f} {scalar_ms / vector_ms:>7.1f}x")
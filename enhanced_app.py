@@ -256,16 +256,16 @@ def login():
         if user:
             password_hash = hashlib.sha256(password.encode('utf-8')).hexdigest()
             if user.password_hash == password_hash:
-            return jsonify({
-                'message': 'Přihlášení úspěšné',
-                'user_id': user.id,
-                'name': user.name,
-                'rating': user.rating,
-                'phone_verified': user.phone_verified,
-                'id_verified': user.id_verified
-            }), 200
-        else:
-            return jsonify({'error': 'Neplatné přihlašovací údaje'}), 401
+                return jsonify({
+                    'message': 'Přihlášení úspěšné',
+                    'user_id': user.id,
+                    'name': user.name,
+                    'rating': user.rating,
+                    'phone_verified': user.phone_verified,
+                    'id_verified': user.id_verified
+                }), 200
+        
+        return jsonify({'error': 'Neplatné přihlašovací údaje'}), 401
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
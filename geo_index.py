@@ -0,0 +1,111 @@
+"""
+In-process spatial index for ride coordinates.
+
+Points are bucketed into a uniform latitude/longitude cell grid so that a
+radius query only has to look at the handful of cells overlapping the
+query circle instead of every ride in the database.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+from collections import defaultdict
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from distance_kernel import CoordinateArray
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE_LAT = math.pi * EARTH_RADIUS_KM / 180.0
+
+# ~11 km in latitude; small enough to prune well for typical 10-50 km
+# search radii, large enough to keep the number of cells per query low.
+DEFAULT_CELL_SIZE_DEG = 0.1
+
+
+class GridIndex:
+    """Thread-safe mapping of keys (ride ids) to points, bucketed by grid cell."""
+
+    def __init__(self, cell_size_deg: float = DEFAULT_CELL_SIZE_DEG):
+        self.cell_size = cell_size_deg
+        self._cells: Dict[Tuple[int, int], Dict[Hashable, Tuple[float, float]]] = defaultdict(dict)
+        self._points: Dict[Hashable, Tuple[float, float]] = {}
+        self._lock = threading.RLock()
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.cell_size), math.floor(lng / self.cell_size))
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._points
+
+    def get(self, key: Hashable) -> Optional[Tuple[float, float]]:
+        return self._points.get(key)
+
+    def insert(self, key: Hashable, lat: float, lng: float) -> None:
+        with self._lock:
+            self._discard(key)
+            point = (float(lat), float(lng))
+            self._points[key] = point
+            self._cells[self._cell(*point)][key] = point
+
+    def remove(self, key: Hashable) -> None:
+        with self._lock:
+            self._discard(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cells.clear()
+            self._points.clear()
+
+    def _discard(self, key: Hashable) -> None:
+        point = self._points.pop(key, None)
+        if point is None:
+            return
+        cell = self._cell(*point)
+        bucket = self._cells.get(cell)
+        if bucket is not None:
+            bucket.pop(key, None)
+            if not bucket:
+                del self._cells[cell]
+
+    def _candidate_cells(self, lat: float, lng: float, radius_km: float) -> List[Tuple[int, int]]:
+        lat_span = radius_km / KM_PER_DEGREE_LAT
+        # Longitude degrees shrink towards the poles; size the box for the
+        # widest latitude the circle reaches.
+        max_abs_lat = min(abs(lat) + lat_span, 89.9)
+        lng_span = min(lat_span / math.cos(math.radians(max_abs_lat)), 180.0)
+
+        min_row, min_col = self._cell(lat - lat_span, lng - lng_span)
+        max_row, max_col = self._cell(lat + lat_span, lng + lng_span)
+
+        box_size = (max_row - min_row + 1) * (max_col - min_col + 1)
+        if box_size > len(self._cells):
+            # Very large radius: walking the occupied cells is cheaper.
+            return [
+                cell for cell in self._cells
+                if min_row <= cell[0] <= max_row and min_col <= cell[1] <= max_col
+            ]
+        return [
+            (row, col)
+            for row in range(min_row, max_row + 1)
+            for col in range(min_col, max_col + 1)
+            if (row, col) in self._cells
+        ]
+
+    def query_radius(self, lat: float, lng: float, radius_km: float) -> List[Tuple[Hashable, float]]:
+        """Returns (key, distance_km) pairs within `radius_km`, nearest first."""
+        keys = []
+        lats = []
+        lngs = []
+        with self._lock:
+            for cell in self._candidate_cells(lat, lng, radius_km):
+                for key, (point_lat, point_lng) in self._cells[cell].items():
+                    keys.append(key)
+                    lats.append(point_lat)
+                    lngs.append(point_lng)
+        if not keys:
+            return []
+        return CoordinateArray(keys, lats, lngs).nearest(lat, lng, max_distance_km=radius_km)
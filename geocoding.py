@@ -0,0 +1,104 @@
+"""
+Offline geocoding of free-text ride locations against a local gazetteer.
+
+The gazetteer is a CSV file with `name,lat,lng` columns (by default
+data/czech_places.csv, overridable with the GAZETTEER_PATH environment
+variable). Lookups are diacritics- and case-insensitive and memoized, so a
+location string is resolved at most once per process.
+"""
+
+from __future__ import annotations
+
+import csv
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+DEFAULT_GAZETTEER_PATH = Path(__file__).resolve().parent / "data" / "czech_places.csv"
+
+Coordinates = Tuple[float, float]
+
+
+def fold_text(text: str) -> str:
+    """Lowercase, strip diacritics and collapse punctuation/whitespace."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(re.split(r"[\s\-_.]+", stripped)).strip()
+
+
+class Gazetteer:
+    def __init__(self, places: Dict[str, Coordinates]):
+        self.places = places
+        self._by_key: Dict[str, Coordinates] = {fold_text(name): coords for name, coords in places.items()}
+
+    @classmethod
+    def load(cls, path: Optional[Path] = None) -> "Gazetteer":
+        path = Path(path or os.environ.get("GAZETTEER_PATH") or DEFAULT_GAZETTEER_PATH)
+        places: Dict[str, Coordinates] = {}
+        with open(path, newline="", encoding="utf-8") as handle:
+            for row in csv.DictReader(handle):
+                try:
+                    places[row["name"].strip()] = (float(row["lat"]), float(row["lng"]))
+                except (KeyError, TypeError, ValueError):
+                    continue
+        return cls(places)
+
+    def __len__(self) -> int:
+        return len(self.places)
+
+    def lookup(self, name: str) -> Optional[Coordinates]:
+        return self._by_key.get(fold_text(name))
+
+
+class Geocoder:
+    """Resolves location strings such as "Brno, Česko" to coordinates."""
+
+    def __init__(self, gazetteer: Gazetteer, cache_size: int = 4096):
+        self.gazetteer = gazetteer
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Optional[Coordinates]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def resolve(self, location: Optional[str]) -> Optional[Coordinates]:
+        if not location or not location.strip():
+            return None
+        with self._lock:
+            if location in self._cache:
+                self._cache.move_to_end(location)
+                return self._cache[location]
+
+        coords = self.gazetteer.lookup(location)
+        if coords is None:
+            # "Brno, Jihomoravský kraj" / "Náměstí 1, Brno" - try each part in order
+            for part in location.split(","):
+                if part.strip():
+                    coords = self.gazetteer.lookup(part)
+                    if coords is not None:
+                        break
+
+        with self._lock:
+            self._cache[location] = coords
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return coords
+
+
+_default_geocoder: Optional[Geocoder] = None
+_default_lock = threading.Lock()
+
+
+def get_geocoder() -> Geocoder:
+    global _default_geocoder
+    if _default_geocoder is None:
+        with _default_lock:
+            if _default_geocoder is None:
+                _default_geocoder = Geocoder(Gazetteer.load())
+    return _default_geocoder
+
+
+def geocode(location: Optional[str]) -> Optional[Coordinates]:
+    return get_geocoder().resolve(location)
@@ -0,0 +1,143 @@
+"""
+Live user locations shared by all worker processes.
+
+POST /api/users/location used to write into a module-level dict: entries
+never expired and every gunicorn worker saw only its own users. Locations
+now live in a small SQLite file in WAL mode, which any number of processes
+on the host can read and write concurrently (readers never block the single
+writer). The data is disposable, so the file is separate from the main
+database and uses synchronous=NORMAL.
+
+Each row stores the grid cell of the point (same cell scheme as
+geo_index.GridIndex), and `near` reads only the cells overlapping the query
+circle through the (cell_lat, cell_lng) index before the exact distance
+filter. Entries older than `ttl` seconds are ignored on read and deleted by
+`prune`, which `update` runs at most every `prune_interval` seconds.
+"""
+
+from __future__ import annotations
+
+import math
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from distance_kernel import haversine_km
+from geo_index import DEFAULT_CELL_SIZE_DEG, KM_PER_DEGREE_LAT
+
+DEFAULT_TTL_SECONDS = 300.0
+DEFAULT_PRUNE_INTERVAL_SECONDS = 60.0
+
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS live_locations (user_id INTEGER PRIMARY KEY, lat REAL NOT NULL, lng REAL NOT NULL,"
+    " cell_lat INTEGER NOT NULL, cell_lng INTEGER NOT NULL, updated_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_live_locations_cell ON live_locations (cell_lat, cell_lng, updated_at)",
+    "CREATE INDEX IF NOT EXISTS ix_live_locations_updated_at ON live_locations (updated_at)",
+]
+_UPSERT = ("INSERT INTO live_locations (user_id, lat, lng, cell_lat, cell_lng, updated_at) VALUES (?, ?, ?, ?, ?, ?) "
+           "ON CONFLICT (user_id) DO UPDATE SET lat = excluded.lat, lng = excluded.lng, cell_lat = excluded.cell_lat, "
+           "cell_lng = excluded.cell_lng, updated_at = excluded.updated_at")
+_COLUMNS = "user_id, lat, lng, updated_at"
+
+
+class Location(NamedTuple):
+    user_id: int
+    lat: float
+    lng: float
+    updated_at: float  # unix time
+
+
+class LiveLocationStore:
+
+    def __init__(self, path: str, ttl: float = DEFAULT_TTL_SECONDS, cell_size_deg: float = DEFAULT_CELL_SIZE_DEG,
+                 prune_interval: float = DEFAULT_PRUNE_INTERVAL_SECONDS, clock: Callable[[], float] = time.time):
+        self.path = path
+        self.ttl = ttl
+        self.cell_size = cell_size_deg
+        self.prune_interval = prune_interval
+        self._clock = clock
+        self._local = threading.local()
+        self._last_prune = 0.0
+
+    def update(self, user_id: int, lat: float, lng: float) -> None:
+        self.update_many([(user_id, lat, lng, None)])
+
+    def update_many(self, fixes) -> None:
+        """Writes (user_id, lat, lng, updated_at or None for now) tuples in one transaction."""
+        now = self._clock()
+        rows = [(int(user_id), float(lat), float(lng), *self._cell(lat, lng), now if updated_at is None else updated_at)
+                for user_id, lat, lng, updated_at in fixes]
+        if not rows:
+            return
+        with self._connection() as connection:
+            connection.executemany(_UPSERT, rows)
+        if now - self._last_prune >= self.prune_interval:
+            self.prune()
+
+    def get(self, user_id: int) -> Optional[Location]:
+        row = self._connection().execute(f"SELECT {_COLUMNS} FROM live_locations WHERE user_id = ? AND updated_at >= ?",
+                                         (user_id, self._clock() - self.ttl)).fetchone()
+        return Location(*row) if row else None
+
+    def active(self, limit: Optional[int] = None) -> List[Location]:
+        """Unexpired locations, most recently updated first."""
+        sql = f"SELECT {_COLUMNS} FROM live_locations WHERE updated_at >= ? ORDER BY updated_at DESC"
+        params: tuple = (self._clock() - self.ttl,)
+        if limit is not None:
+            sql += " LIMIT ?"
+            params += (limit,)
+        return [Location(*row) for row in self._connection().execute(sql, params)]
+
+    def near(self, lat: float, lng: float, radius_km: float, limit: Optional[int] = None) -> List[Location]:
+        """Unexpired locations within radius_km, nearest first."""
+        lat_span = radius_km / KM_PER_DEGREE_LAT
+        lng_span = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01))
+        min_lat, min_lng = self._cell(lat - lat_span, lng - lng_span)
+        max_lat, max_lng = self._cell(lat + lat_span, lng + lng_span)
+        rows = self._connection().execute(
+            f"SELECT {_COLUMNS} FROM live_locations WHERE cell_lat BETWEEN ? AND ? AND cell_lng BETWEEN ? AND ?"
+            " AND updated_at >= ?", (min_lat, max_lat, min_lng, max_lng, self._clock() - self.ttl)).fetchall()
+        if not rows:
+            return []
+        distances = haversine_km(lat, lng, [row[1] for row in rows], [row[2] for row in rows])
+        nearby = sorted((float(distance), Location(*row)) for distance, row in zip(distances, rows) if distance <= radius_km)
+        return [location for _, location in nearby[:limit]]
+
+    def remove(self, user_id: int) -> None:
+        with self._connection() as connection:
+            connection.execute("DELETE FROM live_locations WHERE user_id = ?", (user_id,))
+
+    def prune(self) -> int:
+        self._last_prune = self._clock()
+        with self._connection() as connection:
+            return connection.execute("DELETE FROM live_locations WHERE updated_at < ?", (self._last_prune - self.ttl,)).rowcount
+
+    def stats(self) -> Dict[str, int]:
+        connection = self._connection()
+        total = connection.execute("SELECT COUNT(*) FROM live_locations").fetchone()[0]
+        active = connection.execute("SELECT COUNT(*) FROM live_locations WHERE updated_at >= ?",
+                                    (self._clock() - self.ttl,)).fetchone()[0]
+        return {'stored': total, 'active': active}
+
+    def close(self) -> None:
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def _cell(self, lat: float, lng: float):
+        return math.floor(lat / self.cell_size), math.floor(lng / self.cell_size)
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections are per thread; each request thread opens its own (and creates the schema if missing)
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5.0)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            with connection:
+                for sql in _SCHEMA:
+                    connection.execute(sql)
+            self._local.connection = connection
+        return connection
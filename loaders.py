@@ -0,0 +1,66 @@
+"""
+Batched loaders for list endpoints in main_app.py.
+
+Each loader takes the SQLAlchemy session (or connection) and a collection of
+ids and resolves all of them with one query per entity type (chunked for very
+long id lists), instead of one query per row of the listing. Results are dicts
+keyed by id, so endpoints assemble their JSON with plain lookups.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Sequence, Set, Tuple
+
+from sqlalchemy import bindparam, text
+
+# Keeps IN lists well below SQLite's bound-parameter limit
+CHUNK_SIZE = 500
+
+_RIDES = text("""
+    SELECT id, user_id, from_location, to_location, departure_time, price_per_person
+    FROM rides WHERE id IN :ids
+""").bindparams(bindparam('ids', expanding=True))
+
+_USERS = text("SELECT id, name, phone FROM users WHERE id IN :ids").bindparams(bindparam('ids', expanding=True))
+
+_PAID = text("""
+    SELECT ride_id, passenger_id FROM payments
+    WHERE status = 'completed' AND ride_id IN :ride_ids AND passenger_id IN :passenger_ids
+""").bindparams(bindparam('ride_ids', expanding=True), bindparam('passenger_ids', expanding=True))
+
+
+def _chunks(ids: Iterable) -> List[List]:
+    unique = sorted({i for i in ids if i is not None})
+    return [unique[start:start + CHUNK_SIZE] for start in range(0, len(unique), CHUNK_SIZE)]
+
+
+def _load(session, statement, ids: Iterable) -> Dict[int, tuple]:
+    rows = {}
+    for chunk in _chunks(ids):
+        for row in session.execute(statement, {'ids': chunk}):
+            rows[row[0]] = tuple(row)
+    return rows
+
+
+def load_rides(session, ride_ids: Iterable[int]) -> Dict[int, tuple]:
+    """ride id -> (id, user_id, from_location, to_location, departure_time, price_per_person)"""
+    return _load(session, _RIDES, ride_ids)
+
+
+def load_users(session, user_ids: Iterable[int]) -> Dict[int, tuple]:
+    """user id -> (id, name, phone)"""
+    return _load(session, _USERS, user_ids)
+
+
+def load_paid(session, pairs: Sequence[Tuple[int, int]]) -> Set[Tuple[int, int]]:
+    """The (ride_id, passenger_id) pairs that have a completed payment."""
+    wanted = set(pairs)
+    paid = set()
+    for ride_chunk in _chunks(ride_id for ride_id, _ in wanted):
+        chunk_rides = set(ride_chunk)
+        passenger_ids = [passenger_id for ride_id, passenger_id in wanted if ride_id in chunk_rides]
+        for passenger_chunk in _chunks(passenger_ids):
+            for ride_id, passenger_id in session.execute(_PAID, {'ride_ids': ride_chunk, 'passenger_ids': passenger_chunk}):
+                if (ride_id, passenger_id) in wanted:
+                    paid.add((ride_id, passenger_id))
+    return paid
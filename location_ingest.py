@@ -0,0 +1,178 @@
+"""
+Batched GPS fix ingestion.
+
+Clients tracking a ride collect fixes locally and upload them in one request
+every ~20 s instead of one request per fix. The batch body is compact and
+delta-encoded:
+
+    {"user_id": 7,
+     "fixes": [[lat, lng, ts, accuracy, speed, heading],
+               [dlat, dlng, dts, accuracy, speed, heading], ...]}
+
+lat/lng are integers in 1e-5 degrees (~1 m) and ts is in milliseconds since
+the epoch. The first row is absolute, every following row holds the
+difference to the previous row, so consecutive fixes encode as small
+integers. accuracy (m), speed (m/s) and heading (degrees) are plain numbers,
+may be null, and trailing ones may be omitted.
+
+Decoded fixes go to a LocationWriter. It keeps only the newest fix (by ts)
+per user in memory and writes those into the LiveLocationStore in one
+transaction every `flush_interval` seconds, so the cost per GPS fix is a
+dict update. The store holds positions only: accuracy, speed and heading
+are validated and then dropped here (ride tracking keeps them, see
+ride_tracking.py). Client clocks are not trusted for expiry: the position
+is stored with the server time at which its batch arrived.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+
+COORDINATE_SCALE = 1e5
+MAX_FIXES_PER_BATCH = 1000
+DEFAULT_FLUSH_INTERVAL_SECONDS = 1.0
+DEFAULT_MAX_BUFFERED_USERS = 10_000
+
+
+class Fix(NamedTuple):
+    lat: float
+    lng: float
+    ts: int  # client time, ms since epoch
+    accuracy: Optional[float] = None
+    speed: Optional[float] = None
+    heading: Optional[float] = None
+
+
+def _number(value, field) -> Optional[float]:
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"fix field {field} must be a number")
+    return float(value)
+
+
+def _optional_number(row: Sequence, index: int) -> Optional[float]:
+    return _number(row[index], index) if len(row) > index else None
+
+
+def _check_range(fix: Fix) -> Fix:
+    if not (-90 <= fix.lat <= 90 and -180 <= fix.lng <= 180):
+        raise ValueError("coordinates out of range")
+    return fix
+
+
+def decode_fix(data: dict, ts: int) -> Fix:
+    """Decodes a single plain fix {"latitude", "longitude", "accuracy", "speed", "heading"} received at `ts`."""
+    try:
+        lat, lng = float(data["latitude"]), float(data["longitude"])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("latitude and longitude are required numbers") from None
+    return _check_range(Fix(lat, lng, ts, _number(data.get("accuracy"), "accuracy"),
+                            _number(data.get("speed"), "speed"), _number(data.get("heading"), "heading")))
+
+
+def decode_fixes(rows: Sequence[Sequence]) -> List[Fix]:
+    """Decodes the delta-encoded rows of a batch; raises ValueError on malformed input."""
+    if not isinstance(rows, list) or not rows:
+        raise ValueError("fixes must be a non-empty list")
+    if len(rows) > MAX_FIXES_PER_BATCH:
+        raise ValueError(f"at most {MAX_FIXES_PER_BATCH} fixes per batch")
+    fixes = []
+    lat = lng = ts = 0
+    for row in rows:
+        if not isinstance(row, list) or len(row) < 3 or not all(
+                isinstance(value, int) and not isinstance(value, bool) for value in row[:3]):
+            raise ValueError("each fix starts with integer lat, lng, ts")
+        lat, lng, ts = lat + row[0], lng + row[1], ts + row[2]
+        fixes.append(_check_range(Fix(lat / COORDINATE_SCALE, lng / COORDINATE_SCALE, ts,
+                                      _optional_number(row, 3), _optional_number(row, 4), _optional_number(row, 5))))
+    return fixes
+
+
+def encode_fixes(fixes: Sequence[Fix]) -> List[list]:
+    """Inverse of decode_fixes (used by tests and the benchmark client)."""
+    rows = []
+    previous = (0, 0, 0)
+    for fix in fixes:
+        current = (round(fix.lat * COORDINATE_SCALE), round(fix.lng * COORDINATE_SCALE), fix.ts)
+        row = [current[0] - previous[0], current[1] - previous[1], current[2] - previous[2],
+               fix.accuracy, fix.speed, fix.heading]
+        while len(row) > 3 and row[-1] is None:
+            row.pop()
+        rows.append(row)
+        previous = current
+    return rows
+
+
+class LocationWriter:
+    """Keeps the newest fix per user and flushes those positions to the store periodically."""
+
+    def __init__(self, store, flush_interval: float = DEFAULT_FLUSH_INTERVAL_SECONDS,
+                 max_buffered_users: int = DEFAULT_MAX_BUFFERED_USERS, clock: Callable[[], float] = time.time):
+        self.store = store
+        self.flush_interval = flush_interval
+        self.max_buffered_users = max_buffered_users
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._pending: Dict[int, tuple] = {}  # user id -> (lat, lng, received_at, client ts)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {'batches': 0, 'fixes': 0, 'flushes': 0, 'written': 0}
+
+    def add(self, user_id: int, fixes: Sequence[Fix]) -> None:
+        if not fixes:
+            return
+        received_at = self._clock()
+        latest = max(fixes, key=lambda fix: fix.ts)
+        with self._lock:
+            self.stats['batches'] += 1
+            self.stats['fixes'] += len(fixes)
+            current = self._pending.get(user_id)
+            # A delayed batch must not overwrite a newer buffered position
+            if current is None or latest.ts >= current[3]:
+                self._pending[user_id] = (latest.lat, latest.lng, received_at, latest.ts)
+            overflowing = len(self._pending) >= self.max_buffered_users
+        if overflowing:
+            self.flush()
+        else:
+            self._ensure_started()
+
+    def flush(self) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        self.store.update_many([(user_id, lat, lng, updated_at) for user_id, (lat, lng, updated_at, _) in pending.items()])
+        with self._lock:
+            self.stats['flushes'] += 1
+            self.stats['written'] += len(pending)
+        return len(pending)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='location-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:  # keep flushing; the next interval retries with newer fixes
+                print(f"Location flush failed: {e}")
@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory, redirect, Response
+from flask import Flask, request, jsonify, render_template, send_from_directory, redirect, Response, stream_with_context
 from flask_cors import CORS
 # from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask_sqlalchemy import SQLAlchemy
@@ -12,9 +12,25 @@ import sys
 import requests
 import stripe
 import traceback
-import bcrypt
 import secrets
+import click
+import threading
 from markupsafe import escape
+from geo_index import GridIndex
+from geocoding import geocode
+from route_corridor import CorridorIndex, build_route, parse_waypoints
+from ride_search import detect_backend, ride_text_condition
+from notification_bus import InboxRelay, NotificationBus
+from ride_membership import RideMembershipCache
+from push_dispatcher import PushDispatcher, webpush_sender, enqueue as enqueue_push
+from loaders import load_paid, load_rides, load_users
+from seat_inventory import SeatsUnavailable, cancel_reservation, reserve_seats, run_with_retry
+from user_directory import UserDirectory, normalize_name
+from password_hashing import DEFAULT_ROUNDS, HashingOverloaded, PasswordHasher
+import rating_aggregates
+import user_stats
+from live_locations import LiveLocationStore
+from location_ingest import LocationWriter, decode_fixes
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', secrets.token_hex(32))
@@ -41,6 +57,16 @@ migrate = Migrate(app, db)
 VAPID_PUBLIC_KEY = os.environ.get('VAPID_PUBLIC_KEY', 'BP_YOUR_PUBLIC_KEY_HERE')
 VAPID_PRIVATE_KEY = os.environ.get('VAPID_PRIVATE_KEY', 'YOUR_PRIVATE_KEY_HERE')
 VAPID_CLAIMS = {"sub": "mailto:your_email@example.com"} # Replace with your email
+# Web push se zapíná až se skutečnými klíči; odesílání běží na pozadí z tabulky push_outbox
+PUSH_ENABLED = VAPID_PRIVATE_KEY != 'YOUR_PRIVATE_KEY_HERE'
+PUSH_WORKERS = int(os.environ.get('PUSH_WORKERS', 8))
+PUSH_PER_ORIGIN_LIMIT = int(os.environ.get('PUSH_PER_ORIGIN_LIMIT', 4))
+
+# bcrypt běží ve vlastním omezeném poolu, ne na vláknech požadavků; při změně BCRYPT_ROUNDS se hesla přehashují při přihlášení
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', DEFAULT_ROUNDS))
+BCRYPT_THREADS = int(os.environ['BCRYPT_THREADS']) if os.environ.get('BCRYPT_THREADS') else None
+BCRYPT_MAX_PENDING = int(os.environ.get('BCRYPT_MAX_PENDING', 64))
+password_hasher = PasswordHasher(rounds=BCRYPT_ROUNDS, threads=BCRYPT_THREADS, max_pending=BCRYPT_MAX_PENDING)
 
 # New model for Push Subscriptions
 class PushSubscription(db.Model):
@@ -111,10 +137,176 @@ STRIPE_PUBLISHABLE_KEY = os.environ.get('STRIPE_PUBLISHABLE_KEY', 'pk_test_51QYO
 COMMISSION_RATE = 0.10
 YOUR_STRIPE_ACCOUNT_ID = 'acct_YourConnectedAccountId'
 
-user_locations = {}
+# Živé polohy uživatelů: sdílený SQLite soubor (WAL) pro všechny workery, záznamy po LIVE_LOCATION_TTL vyprší
+LIVE_LOCATIONS_PATH = os.environ.get('LIVE_LOCATIONS_PATH', 'live_locations.db')
+LIVE_LOCATION_TTL = float(os.environ.get('LIVE_LOCATION_TTL', 300))
+live_locations = LiveLocationStore(LIVE_LOCATIONS_PATH, ttl=LIVE_LOCATION_TTL)
+# Dávky GPS bodů (POST /api/users/location/batch) se bufferují a zapisují jednou za LOCATION_FLUSH_INTERVAL sekund
+LOCATION_FLUSH_INTERVAL = float(os.environ.get('LOCATION_FLUSH_INTERVAL', 1.0))
+location_writer = LocationWriter(live_locations, flush_interval=LOCATION_FLUSH_INTERVAL)
+
+# Sloupce jízdy ve stabilním pořadí (r.* se mění s migracemi)
+RIDE_COLUMNS = "r.id, r.user_id, r.from_location, r.to_location, r.departure_time, r.available_seats, r.price_per_person, r.route_waypoints, r.created_at"
+
+# Prostorový index jízd (start/cíl) pro radius vyhledávání
+ride_origin_index = GridIndex()
+ride_destination_index = GridIndex()
+# Koridory tras (start + route_waypoints + cíl) pro hledání jízd "po cestě"
+ride_corridor_index = CorridorIndex()
+ride_index_state = {'last_ride_id': 0}
+
+def resolve_ride_coordinates(location, lat=None, lng=None):
+    if lat is not None and lng is not None:
+        try:
+            return float(lat), float(lng)
+        except (TypeError, ValueError):
+            pass
+    return geocode(location)
+
+def index_ride(ride_id, from_coords, to_coords, route_waypoints=None):
+    if from_coords:
+        ride_origin_index.insert(ride_id, from_coords[0], from_coords[1])
+    if to_coords:
+        ride_destination_index.insert(ride_id, to_coords[0], to_coords[1])
+    ride_corridor_index.insert(ride_id, build_route(from_coords, parse_waypoints(route_waypoints), to_coords))
+    ride_index_state['last_ride_id'] = max(ride_index_state['last_ride_id'], ride_id)
+
+def unindex_ride(ride_id):
+    ride_origin_index.remove(ride_id)
+    ride_destination_index.remove(ride_id)
+    ride_corridor_index.remove(ride_id)
+
+def sync_ride_index():
+    # Dotáhne jízdy vložené jinými workery (nové ID nad posledním známým).
+    # Smazané jízdy v indexu nevadí - SQL dotaz je podle ID stejně nevrátí.
+    # Starší jízdy bez uložených souřadnic se geokódují jednou při indexaci.
+    rides = db.session.execute(db.text('SELECT id, from_location, to_location, from_lat, from_lng, to_lat, to_lng, route_waypoints FROM rides WHERE id > :last_id ORDER BY id'),
+                               {'last_id': ride_index_state['last_ride_id']}).fetchall()
+    for ride in rides:
+        index_ride(ride[0], resolve_ride_coordinates(ride[1], ride[3], ride[4]), resolve_ride_coordinates(ride[2], ride[5], ride[6]), ride[7])
+
+# Fulltext backend (FTS5 / tsvector / LIKE) podle stavu migrací, zjišťuje se jednou
+ride_text_search_state = {'backend': None}
+
+def get_ride_text_backend():
+    if ride_text_search_state['backend'] is None:
+        ride_text_search_state['backend'] = detect_backend(db.engine.dialect.name, lambda sql: db.session.execute(db.text(sql)).first())
+    return ride_text_search_state['backend']
+
+# Notifikace se posílají přes SSE z paměti procesu, klienti se nemusí dotazovat.
+# Při více workerech doručuje notifikace odeslané jinými procesy notification_relay (tail notification_inbox).
+notification_bus = NotificationBus()
+NOTIFICATION_HEARTBEAT_SECONDS = 25
+NOTIFICATION_RELAY_POLL_SECONDS = float(os.environ.get('NOTIFICATION_RELAY_POLL_SECONDS', 2))
+
+# Členství v jízdách (řidič + potvrzení pasažéři) v paměti; udržují ho handlery jízd a rezervací.
+# Loader běží v aktuální transakci, volat uvnitř db.session.begin().
+def load_ride_members(ride_id):
+    rows = db.session.execute(db.text('''
+        SELECT r.user_id, res.passenger_id
+        FROM rides r
+        LEFT JOIN reservations res ON res.ride_id = r.id AND res.status = 'confirmed'
+        WHERE r.id = :ride_id
+    '''), {'ride_id': ride_id}).fetchall()
+    if not rows:
+        return None
+    return rows[0][0], [row[1] for row in rows if row[1] is not None]
+
+ride_membership = RideMembershipCache(load_ride_members)
+
+# Jméno -> user_id přes indexovaný users.name_normalized a LRU cache; registrace a změna profilu ji invalidují.
+# Řádky bez name_normalized (zapsané mimo main_app) se najdou podle přesného jména.
+def load_users_by_name(name_normalized, name):
+    return db.session.execute(db.text('SELECT id, name FROM users WHERE name_normalized = :name_normalized OR (name_normalized IS NULL AND name = :name)'),
+                              {'name_normalized': name_normalized, 'name': name}).fetchall()
+
+user_directory = UserDirectory(load_users_by_name)
+
+def resolve_user_id(user_id=None, user_name=None):
+    # Přednost má user_id od klienta, jméno je jen fallback pro starší klienty
+    if user_id:
+        return int(user_id)
+    return user_directory.resolve(user_name)
+
+def get_ride_participant_ids(ride_id):
+    # Řidič + potvrzení pasažéři jízdy
+    return ride_membership.participant_ids(int(ride_id))
+
+# Veřejná adresa chat_gateway.py, např. https://chat.example.cz
+CHAT_GATEWAY_URL = os.environ.get('CHAT_GATEWAY_URL')
+
+# Stránka historie chatu (GET /api/chat/<ride_id>/messages)
+CHAT_PAGE_LIMIT = 50
+CHAT_PAGE_MAX = 200
+# Jak dlouho zpět ?after_id= vrací i zprávy s nižším id (transakce odeslání commitnutá až po novější zprávě)
+CHAT_LATE_COMMIT_SECONDS = 30
+
+# Skóre uživatele = průměr vyhlazený k RATING_PRIOR_MEAN s váhou RATING_PRIOR_WEIGHT virtuálních hodnocení (0 = prostý průměr)
+RATING_PRIOR_WEIGHT = float(os.environ.get('RATING_PRIOR_WEIGHT', rating_aggregates.DEFAULT_PRIOR_WEIGHT))
+RATING_PRIOR_MEAN = float(os.environ.get('RATING_PRIOR_MEAN', rating_aggregates.DEFAULT_PRIOR_MEAN))
+
+# Inbox notifikací: při odeslání zprávy jeden řádek na příjemce, čtení je indexovaný dotaz podle user_id
+NOTIFICATION_INBOX_RETENTION_DAYS = 30
+NOTIFICATION_INBOX_PAGE_LIMIT = 100
+# Jak dlouho zpět čtení od kurzoru vrací i řádky s nižším id (pozdě commitnutý fan-out)
+NOTIFICATION_LATE_COMMIT_SECONDS = 30
+
+def fan_out_notification(recipient_ids, ride_id, message_id, sender_id, sender_name, message, created_at):
+    if not recipient_ids:
+        return
+    db.session.execute(db.text('INSERT INTO notification_inbox (user_id, ride_id, message_id, sender_id, sender_name, message, created_at) VALUES (:user_id, :ride_id, :message_id, :sender_id, :sender_name, :message, :created_at)'),
+                       [{'user_id': uid, 'ride_id': ride_id, 'message_id': message_id, 'sender_id': sender_id,
+                         'sender_name': sender_name, 'message': message, 'created_at': created_at} for uid in recipient_ids])
+
+def read_notification_inbox(user_id, after_id=0, since=None, limit=NOTIFICATION_INBOX_PAGE_LIMIT):
+    # Vrací (id, ride_id, message, created_at, sender_name) - nejnovější první při since, jinak od kurzoru vzestupně
+    if since is not None:
+        return db.session.execute(db.text('SELECT id, ride_id, message, created_at, sender_name FROM notification_inbox WHERE user_id = :user_id AND created_at > :since ORDER BY created_at DESC LIMIT :limit'),
+                                  {'user_id': user_id, 'since': since, 'limit': limit}).fetchall()
+    rows = db.session.execute(db.text('SELECT id, ride_id, message, created_at, sender_name FROM notification_inbox WHERE user_id = :user_id AND id > :after_id ORDER BY id ASC LIMIT :limit'),
+                              {'user_id': user_id, 'after_id': after_id, 'limit': limit}).fetchall()
+    # Řádky fan-outu souběžně odeslané zprávy můžou být commitnuté až po řádcích s vyšším id,
+    # proto se k nim přidají i řádky <= kurzor z posledních NOTIFICATION_LATE_COMMIT_SECONDS (klient je filtruje podle id)
+    late = db.session.execute(db.text('SELECT id, ride_id, message, created_at, sender_name FROM notification_inbox WHERE user_id = :user_id AND created_at >= :since AND id <= :after_id ORDER BY created_at ASC LIMIT :limit'),
+                              {'user_id': user_id, 'after_id': after_id, 'limit': limit,
+                               'since': datetime.datetime.now() - datetime.timedelta(seconds=NOTIFICATION_LATE_COMMIT_SECONDS)}).fetchall()
+    return sorted(late, key=lambda row: row[0]) + list(rows)
+
+def fetch_inbox_rows(after_id, limit):
+    # Běží ve vlákně relaye mimo request, proto vlastní app context a přímo přes engine
+    with app.app_context(), db.engine.connect() as connection:
+        rows = connection.execute(db.text('SELECT id, user_id, message_id, ride_id, message, created_at, sender_name FROM notification_inbox WHERE id > :after_id ORDER BY id ASC LIMIT :limit'),
+                                  {'after_id': after_id, 'limit': limit}).fetchall()
+    return [(row[0], row[1], row[2], {'ride_id': row[3], 'message': row[4], 'created_at': parse_datetime_str(row[5]).isoformat() if row[5] else None,
+                                      'sender_name': row[6]}) for row in rows]
+
+def latest_inbox_id():
+    with app.app_context(), db.engine.connect() as connection:
+        return connection.execute(db.text('SELECT COALESCE(MAX(id), 0) FROM notification_inbox')).scalar()
+
+notification_relay = InboxRelay(notification_bus, fetch_inbox_rows, latest_inbox_id, poll_interval=NOTIFICATION_RELAY_POLL_SECONDS)
+
+push_dispatcher_state = {'dispatcher': None, 'started': False}
+push_dispatcher_lock = threading.Lock()
+
+def get_push_dispatcher():
+    with push_dispatcher_lock:
+        if push_dispatcher_state['dispatcher'] is None:
+            push_dispatcher_state['dispatcher'] = PushDispatcher(db.engine, webpush_sender(VAPID_PRIVATE_KEY, VAPID_CLAIMS),
+                                                                 workers=PUSH_WORKERS, per_origin_limit=PUSH_PER_ORIGIN_LIMIT)
+    return push_dispatcher_state['dispatcher']
 
 print("--- main_app.py is being loaded! ---")
 
+@app.before_request
+def start_background_workers():
+    # Vlákna běží od prvního požadavku (ne při importu kvůli CLI). Push dispatcher tak odešle i outbox
+    # nevyřízený před restartem včetně řádků čekajících na retry, ne až po další zprávě v chatu.
+    if PUSH_ENABLED and not push_dispatcher_state['started']:
+        push_dispatcher_state['started'] = True
+        get_push_dispatcher().start()
+    notification_relay.start()
+
 @app.after_request
 def add_header(response):
     response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, post-check=0, pre-check=0, max-age=0'
@@ -204,7 +396,11 @@ def api_status():
             'POST /api/rides/offer',
             'GET /api/rides/search',
             'WebSocket /socket.io - real-time lokalizace'
-        ]
+        ],
+        'ride_membership_cache': ride_membership.stats(),
+        'user_directory_cache': user_directory.stats(),
+        'password_hasher': password_hasher.stats(),
+        'live_locations': dict(live_locations.stats(), **location_writer.stats)
     })
 
 @app.route('/api/cities', methods=['GET'])
@@ -297,43 +493,6 @@ def get_ride_messages(ride_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/reservations/user/<int:user_id>')
-def reservations_test(user_id):
-    try:
-        with db.session.begin():
-            reservations = db.session.execute(db.text("""
-                SELECT res.id, res.seats_reserved, res.status, res.created_at,
-                       r.from_location, r.to_location, r.departure_time, r.price_per_person,
-                       u.name as driver_name, u.phone as driver_phone
-                FROM reservations res
-                JOIN rides r ON res.ride_id = r.id
-                JOIN users u ON r.user_id = u.id
-                WHERE res.passenger_id = :user_id AND res.status != 'cancelled'
-                ORDER BY r.departure_time ASC
-            """), {'user_id': user_id}).fetchall()
-        
-        result = []
-        for res in reservations:
-            created_at_val = parse_datetime_str(res[3])
-            departure_time_val = parse_datetime_str(res[6])
-            result.append({
-                'reservation_id': res[0],
-                'seats_reserved': res[1],
-                'status': res[2],
-                'created_at': created_at_val.isoformat() if created_at_val else None,
-                'from_location': res[4],
-                'to_location': res[5],
-                'departure_time': departure_time_val.isoformat() if departure_time_val else None,
-                'price_per_person': res[7],
-                'driver_name': res[8],
-                'driver_phone': res[9]
-            })
-        
-        return jsonify(result), 200
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
 @app.route('/api/users/all', methods=['GET'])
 def get_all_users_redirect():
     return redirect('/api/users/list', code=302)
@@ -423,7 +582,7 @@ def register():
         if email and '@' not in email:
             return jsonify({'error': 'Neplatný formát emailu'}), 400
         
-        password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        password_hash = password_hasher.hash(password)
         
         with db.session.begin():
             existing_phone = db.session.execute(db.text('SELECT id FROM users WHERE phone = :phone'), {'phone': phone_full}).fetchone()
@@ -435,11 +594,15 @@ def register():
                 if existing_email:
                     return jsonify({'error': 'Tento email je již registrován'}), 409
             
-            db.session.execute(db.text('INSERT INTO users (name, phone, email, password_hash, rating) VALUES (:name, :phone, :email, :password_hash, :rating)'),
-                             {'name': name, 'phone': phone_full, 'email': email if email else None, 'password_hash': password_hash, 'rating': 5.0})
-            
-            return jsonify({'message': 'Uživatel úspěšně registrován'}), 201
+            db.session.execute(db.text('INSERT INTO users (name, name_normalized, phone, email, password_hash, rating) VALUES (:name, :name_normalized, :phone, :email, :password_hash, :rating)'),
+                             {'name': name, 'name_normalized': normalize_name(str(name)), 'phone': phone_full, 'email': email if email else None, 'password_hash': password_hash, 'rating': 5.0})
+        
+        user_directory.invalidate(name)
+        
+        return jsonify({'message': 'Uživatel úspěšně registrován'}), 201
             
+    except HashingOverloaded:
+        return jsonify({'error': 'Server je přetížený, zkuste to prosím za chvíli'}), 503, {'Retry-After': '1'}
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -466,10 +629,16 @@ def login():
                 user_data = db.session.execute(db.text('SELECT id, name, rating, password_hash FROM users WHERE phone = :phone'),
                                          {'phone': phone_full}).fetchone()
         
-        if user_data and bcrypt.checkpw(password.encode('utf-8'), user_data[3].encode('utf-8')):
-            user = user_data
-        else:
-            user = None
+        user = None
+        if user_data:
+            matches, new_hash = password_hasher.verify(password, user_data[3])
+            if matches:
+                user = user_data
+            if new_hash:
+                # Podmínka na starý hash: souběžné přihlášení nepřepíše novější heslo
+                with db.session.begin():
+                    db.session.execute(db.text('UPDATE users SET password_hash = :new_hash WHERE id = :id AND password_hash = :old_hash'),
+                                       {'new_hash': new_hash, 'id': user_data[0], 'old_hash': user_data[3]})
         
         if user:
             return jsonify({
@@ -481,6 +650,8 @@ def login():
         else:
             return jsonify({'error': 'Neplatné přihlašovací údaje'}), 401
             
+    except HashingOverloaded:
+        return jsonify({'error': 'Server je přetížený, zkuste to prosím za chvíli'}), 503, {'Retry-After': '1'}
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -499,10 +670,22 @@ def offer_ride():
         price_per_person = data.get('price_per_person')
         route_waypoints = json.dumps(data.get('route_waypoints', []))
         
+        # Souřadnice se řeší jednou při vytvoření jízdy, vyhledávání je jen čte
+        from_coords = resolve_ride_coordinates(from_location, data.get('from_lat'), data.get('from_lng'))
+        to_coords = resolve_ride_coordinates(to_location, data.get('to_lat'), data.get('to_lng'))
+        
         with db.session.begin():
-            result = db.session.execute(db.text('INSERT INTO rides (user_id, from_location, to_location, departure_time, available_seats, price_per_person, route_waypoints) VALUES (:user_id, :from_location, :to_location, :departure_time, :available_seats, :price_per_person, :route_waypoints)'),
-                                     {'user_id': user_id, 'from_location': from_location, 'to_location': to_location, 'departure_time': departure_time, 'available_seats': available_seats, 'price_per_person': price_per_person, 'route_waypoints': route_waypoints})
+            result = db.session.execute(db.text('INSERT INTO rides (user_id, from_location, to_location, departure_time, available_seats, price_per_person, route_waypoints, from_lat, from_lng, to_lat, to_lng) VALUES (:user_id, :from_location, :to_location, :departure_time, :available_seats, :price_per_person, :route_waypoints, :from_lat, :from_lng, :to_lat, :to_lng)'),
+                                     {'user_id': user_id, 'from_location': from_location, 'to_location': to_location, 'departure_time': departure_time, 'available_seats': available_seats, 'price_per_person': price_per_person, 'route_waypoints': route_waypoints,
+                                      'from_lat': from_coords[0] if from_coords else None, 'from_lng': from_coords[1] if from_coords else None,
+                                      'to_lat': to_coords[0] if to_coords else None, 'to_lng': to_coords[1] if to_coords else None})
             ride_id = result.lastrowid
+            if ride_id:
+                user_stats.ride_offered(db.session, user_id, user_stats.ride_distance_km(*(from_coords or (None, None)), *(to_coords or (None, None))))
+        
+        if ride_id:
+            index_ride(ride_id, from_coords, to_coords, route_waypoints)
+            ride_membership.add_ride(ride_id, int(user_id))
         
         return jsonify({
             'message': 'Jízda úspěšně nabídnuta',
@@ -524,15 +707,18 @@ def search_rides():
         user_lat = request.args.get('lat', type=float)
         user_lng = request.args.get('lng', type=float)
         search_range = request.args.get('range', type=int)
+        dest_lat = request.args.get('to_lat', type=float)
+        dest_lng = request.args.get('to_lng', type=float)
         
         date_from = request.args.get('date_from', '').strip()
         date_to = request.args.get('date_to', '').strip()
         time_from = request.args.get('time_from', '').strip()
         time_to = request.args.get('time_to', '').strip()
 
-        query = "SELECT r.*, u.name, u.rating FROM rides r LEFT JOIN users u ON r.user_id = u.id"
+        query = f"SELECT {RIDE_COLUMNS}, u.name, u.rating, r.from_lat, r.from_lng, r.to_lat, r.to_lng FROM rides r LEFT JOIN users u ON r.user_id = u.id"
         conditions = []
         params = {}
+        bind_params = []
 
         if from_location:
             conditions.append("r.from_location LIKE :from_location")
@@ -566,34 +752,30 @@ def search_rides():
             conditions.append("TIME(r.departure_time) <= :time_to")
             params['time_to'] = time_to
 
+        # Radius vyhledávání jde přes prostorový index - do SQL se pošlou jen ID jízd v okolí
+        distances = {}
+        radius_search = bool(user_lat and user_lng and search_range)
+        if radius_search or (dest_lat and dest_lng and search_range):
+            with db.session.begin():
+                sync_ride_index()
+            candidate_ids = None
+            if radius_search:
+                distances = dict(ride_origin_index.query_radius(user_lat, user_lng, search_range))
+                candidate_ids = set(distances)
+            if dest_lat and dest_lng and search_range:
+                near_destination = {key for key, _ in ride_destination_index.query_radius(dest_lat, dest_lng, search_range)}
+                candidate_ids = near_destination if candidate_ids is None else candidate_ids & near_destination
+            if not candidate_ids:
+                return jsonify([])
+            conditions.append("r.id IN :nearby_ride_ids")
+            params['nearby_ride_ids'] = list(candidate_ids)
+            bind_params.append(db.bindparam('nearby_ride_ids', expanding=True))
+
         if conditions:
             query += " WHERE " + " AND ".join(conditions)
 
         with db.session.begin():
-            rides = db.session.execute(db.text(query), params).fetchall()
-
-        cities = {
-            'Praha': [50.0755, 14.4378],
-            'Brno': [49.1951, 16.6068],
-            'Ostrava': [49.8209, 18.2625],
-            'Plzeň': [49.7384, 13.3736],
-            'Liberec': [50.7663, 15.0543],
-            'Olomouc': [49.5938, 17.2509],
-            'Zlín': [49.2265, 17.6679],
-            'Rájec Jestřebí': [49.4186, 16.7486],
-            'České Budějovice': [48.9745, 14.4743],
-            'Hradec Králové': [50.2103, 15.8327],
-            'Pardubice': [50.0386, 15.7792]
-        }
-
-        def calculate_distance(lat1, lng1, lat2, lng2):
-            import math
-            R = 6371
-            dlat = math.radians(lat2 - lat1)
-            dlng = math.radians(lng2 - lng1)
-            a = math.sin(dlat/2) * math.sin(dlat/2) + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlng/2) * math.sin(dlng/2)
-            c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-            return R * c
+            rides = db.session.execute(db.text(query).bindparams(*bind_params), params).fetchall()
 
         result = []
         current_user_id = request.args.get('user_id', type=int)
@@ -601,24 +783,10 @@ def search_rides():
         for ride in rides:
             waypoints = json.loads(ride[7]) if ride[7] else []
             
-            from_city_name = ride[2].split(',')[0].strip()
-            to_city_name = ride[3].split(',')[0].strip()
+            from_coords = (ride[11], ride[12]) if ride[11] is not None else ride_origin_index.get(ride[0])
+            to_coords = (ride[13], ride[14]) if ride[13] is not None else ride_destination_index.get(ride[0])
             
-            from_coords = cities.get(from_city_name)
-            to_coords = cities.get(to_city_name)
-            
-            distance = 999
-            if user_lat and user_lng and search_range:
-                from_coords = cities.get(ride[2].split(',')[0].strip())
-                to_coords = cities.get(ride[3].split(',')[0].strip())
-                
-                if from_coords:
-                    distance = calculate_distance(user_lat, user_lng, from_coords[0], from_coords[1])
-                else:
-                    continue
-                
-                if distance > search_range:
-                    continue
+            distance = distances.get(ride[0], 999)
             
             is_own = False
             if current_user_id and ride[1] == current_user_id:
@@ -656,6 +824,60 @@ def search_rides():
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/rides/search-route', methods=['GET'])
+def search_rides_along_route():
+    # Jízdy, jejichž trasa vede kolem místa nástupu a potom kolem místa výstupu
+    try:
+        pickup = resolve_ride_coordinates(request.args.get('from', '').strip(), request.args.get('from_lat', type=float), request.args.get('from_lng', type=float))
+        dropoff = resolve_ride_coordinates(request.args.get('to', '').strip(), request.args.get('to_lat', type=float), request.args.get('to_lng', type=float))
+        corridor = request.args.get('corridor', type=float)
+        user_id = request.args.get('user_id', type=int)
+        include_own = request.args.get('include_own', 'true').lower() == 'true'
+
+        if not pickup or not dropoff:
+            return jsonify({'error': 'Zadejte místo nástupu a výstupu'}), 400
+
+        with db.session.begin():
+            sync_ride_index()
+        matches = ride_corridor_index.query(pickup, dropoff, corridor)
+        if not matches:
+            return jsonify([])
+
+        with db.session.begin():
+            rides = db.session.execute(db.text(f"SELECT {RIDE_COLUMNS}, u.name, u.rating FROM rides r LEFT JOIN users u ON r.user_id = u.id WHERE r.id IN :ride_ids").bindparams(db.bindparam('ride_ids', expanding=True)),
+                                       {'ride_ids': [match[0] for match in matches]}).fetchall()
+        rides_by_id = {ride[0]: ride for ride in rides}
+
+        result = []
+        for ride_id, pickup_km, dropoff_km, detour_km in matches:
+            ride = rides_by_id.get(ride_id)
+            if ride is None:
+                continue
+            if not include_own and user_id is not None and ride[1] == user_id:
+                continue
+            departure_time_val = parse_datetime_str(ride[4])
+            result.append({
+                'id': ride[0],
+                'user_id': ride[1],
+                'driver_name': ride[9] or 'Neznámý řidič',
+                'driver_rating': float(ride[10]) if ride[10] is not None else 5.0,
+                'from_location': ride[2],
+                'to_location': ride[3],
+                'departure_time': departure_time_val.isoformat() if departure_time_val else None,
+                'available_seats': ride[5],
+                'price_per_person': ride[6],
+                'route_waypoints': json.loads(ride[7]) if ride[7] else [],
+                'pickup_km': round(pickup_km, 1),
+                'dropoff_km': round(dropoff_km, 1),
+                'detour_km': round(detour_km, 1),
+                'is_own': bool(user_id and ride[1] == user_id)
+            })
+
+        return jsonify(result)
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/users/search', methods=['POST'])
 def search_user():
     try:
@@ -694,18 +916,10 @@ def search_rides_text():
         user_id = request.args.get('user_id', type=int)
         include_own = request.args.get('include_own', 'true').lower() == 'true'
         
-        query = "SELECT r.*, u.name, u.rating FROM rides r LEFT JOIN users u ON r.user_id = u.id"
+        query = f"SELECT {RIDE_COLUMNS}, u.name, u.rating FROM rides r LEFT JOIN users u ON r.user_id = u.id"
         conditions = []
         params = {}
 
-        if from_location:
-            conditions.append("r.from_location LIKE :from_location")
-            params['from_location'] = f'%{from_location}%'
-        
-        if to_location:
-            conditions.append("r.to_location LIKE :to_location")
-            params['to_location'] = f'%{to_location}%'
-
         if max_price is not None:
             conditions.append("r.price_per_person <= :max_price")
             params['max_price'] = max_price
@@ -714,12 +928,17 @@ def search_rides_text():
             conditions.append("r.user_id != :user_id")
             params['user_id'] = user_id
 
-        if conditions:
-            query += " WHERE " + " AND ".join(conditions)
-        
-        query += " ORDER BY r.departure_time ASC"
-
         with db.session.begin():
+            # Hledání bez diakritiky přes fulltextový index místo LIKE '%...%'
+            text_condition = ride_text_condition(get_ride_text_backend(), {'from_location': from_location, 'to_location': to_location}, params)
+            if text_condition:
+                conditions.append(text_condition)
+
+            if conditions:
+                query += " WHERE " + " AND ".join(conditions)
+
+            query += " ORDER BY r.departure_time ASC"
+
             rides = db.session.execute(db.text(query), params).fetchall()
 
         result = []
@@ -747,7 +966,7 @@ def search_rides_text():
 def get_all_rides():
     try:
         with db.session.begin():
-            rides = db.session.execute(db.text('SELECT r.*, u.name, u.rating FROM rides r LEFT JOIN users u ON r.user_id = u.id ORDER BY r.created_at DESC')).fetchall()
+            rides = db.session.execute(db.text(f'SELECT {RIDE_COLUMNS}, u.name, u.rating FROM rides r LEFT JOIN users u ON r.user_id = u.id ORDER BY r.created_at DESC')).fetchall()
         
         result = []
         for ride in rides:
@@ -783,19 +1002,26 @@ def create_reservation():
         
         if not passenger_id:
             return jsonify({'error': 'Přihlášení je vyžadováno'}), 401
-        seats_reserved = data.get('seats_reserved', 1)
+        try:
+            seats_reserved = int(data.get('seats_reserved', 1))
+        except (TypeError, ValueError):
+            seats_reserved = 0
+        if seats_reserved < 1:
+            return jsonify({'error': 'Neplatný počet míst'}), 400
+        
+        # Místa se berou jedním podmíněným UPDATE, při zamčené databázi se transakce opakuje
+        def book():
+            with db.session.begin():
+                reservation_id = reserve_seats(db.session, ride_id, passenger_id, seats_reserved)
+                user_stats.passenger_joined(db.session, ride_id, passenger_id)
+                return reservation_id
         
-        with db.session.begin():
-            ride = db.session.execute(db.text('SELECT available_seats FROM rides WHERE id = :ride_id'), {'ride_id': ride_id}).fetchone()
-            
-            if not ride or ride[0] < seats_reserved:
-                return jsonify({'error': 'Nedostatek volných míst'}), 400
-            
-            db.session.execute(db.text('INSERT INTO reservations (ride_id, passenger_id, seats_reserved, status) VALUES (:ride_id, :passenger_id, :seats_reserved, \'confirmed\')'),
-                             {'ride_id': ride_id, 'passenger_id': passenger_id, 'seats_reserved': seats_reserved})
-            
-            db.session.execute(db.text('UPDATE rides SET available_seats = available_seats - :seats_reserved WHERE id = :ride_id'), 
-                             {'seats_reserved': seats_reserved, 'ride_id': ride_id})
+        try:
+            run_with_retry(book)
+        except SeatsUnavailable:
+            return jsonify({'error': 'Nedostatek volných míst'}), 400
+        
+        ride_membership.add_passenger(int(ride_id), int(passenger_id))
         
         return jsonify({'message': 'Rezervace úspěšně vytvořena'}), 201
         
@@ -807,40 +1033,41 @@ def get_user_reservations_simple(user_id):
     try:
         with db.session.begin():
             reservations = db.session.execute(db.text("""
-                SELECT res.id, res.seats_reserved, res.status, res.created_at,
-                       r.from_location, r.to_location, r.departure_time, r.price_per_person,
-                       u.name as driver_name, u.phone as driver_phone, r.id as ride_id
-                FROM reservations res
-                JOIN rides r ON res.ride_id = r.id
-                JOIN users u ON r.user_id = u.id
-                WHERE res.passenger_id = :user_id AND res.status = 'confirmed'
-                ORDER BY r.departure_time ASC
+                SELECT id, ride_id, seats_reserved, status, created_at
+                FROM reservations
+                WHERE passenger_id = :user_id AND status = 'confirmed'
             """), {'user_id': user_id}).fetchall()
+            # Jízdy, řidiči a platby dávkově - jeden dotaz na typ entity místo dotazu na řádek
+            rides = load_rides(db.session, [res[1] for res in reservations])
+            drivers = load_users(db.session, [ride[1] for ride in rides.values()])
+            paid = load_paid(db.session, [(res[1], user_id) for res in reservations])
         
-            result = []
-            for res in reservations:
-                payment = db.session.execute(db.text('SELECT status FROM payments WHERE ride_id = :ride_id AND passenger_id = :user_id AND status = \'completed\''), 
-                                               {'ride_id': res[10], 'user_id': user_id}).fetchone()
-                
-                driver_phone = res[9] if payment else "Skryto - zaplaťte nejdříve"
-                
-                departure_time_val = parse_datetime_str(res[6])
-                created_at_val = parse_datetime_str(res[3])
-
-                result.append({
-                    'reservation_id': res[0],
-                    'seats_reserved': res[1],
-                    'status': res[2],
-                    'created_at': created_at_val.isoformat() if created_at_val else None,
-                    'from_location': res[4],
-                    'to_location': res[5],
-                    'departure_time': departure_time_val.isoformat() if departure_time_val else None,
-                    'price_per_person': res[7],
-                    'driver_name': res[8],
-                    'driver_phone': driver_phone,
-                    'is_paid': bool(payment)
-                })
+        result = []
+        for res in reservations:
+            ride = rides.get(res[1])
+            if not ride or ride[1] not in drivers:
+                continue
+            driver = drivers[ride[1]]
+            is_paid = (res[1], user_id) in paid
+            
+            departure_time_val = parse_datetime_str(ride[4])
+            created_at_val = parse_datetime_str(res[4])
+
+            result.append({
+                'reservation_id': res[0],
+                'seats_reserved': res[2],
+                'status': res[3],
+                'created_at': created_at_val.isoformat() if created_at_val else None,
+                'from_location': ride[2],
+                'to_location': ride[3],
+                'departure_time': departure_time_val.isoformat() if departure_time_val else None,
+                'price_per_person': ride[5],
+                'driver_name': driver[1],
+                'driver_phone': driver[2] if is_paid else "Skryto - zaplaťte nejdříve",
+                'is_paid': is_paid
+            })
         
+        result.sort(key=lambda item: item['departure_time'] or '')
         return jsonify(result), 200
         
     except Exception as e:
@@ -883,33 +1110,34 @@ def get_driver_reservations(driver_id):
     try:
         with db.session.begin():
             reservations = db.session.execute(db.text("""
-                SELECT res.id, res.seats_reserved, res.status, res.created_at,
-                       r.from_location, r.to_location, r.departure_time, r.id as ride_id,
-                       u.name as passenger_name, u.id as passenger_id
+                SELECT res.id, res.seats_reserved, res.status, res.created_at, res.ride_id, res.passenger_id
                 FROM reservations res
                 JOIN rides r ON res.ride_id = r.id
-                JOIN users u ON r.user_id = u.id
                 WHERE r.user_id = :driver_id AND res.status = 'confirmed'
-                ORDER BY r.departure_time DESC
             """), {'driver_id': driver_id}).fetchall()
+            rides = load_rides(db.session, [res[4] for res in reservations])
+            passengers = load_users(db.session, [res[5] for res in reservations])
         
         result = []
         for res in reservations:
-            departure_time_val = parse_datetime_str(res[6])
+            ride = rides[res[4]]
+            passenger = passengers.get(res[5])
+            departure_time_val = parse_datetime_str(ride[4])
             created_at_val = parse_datetime_str(res[3])
             result.append({
                 'reservation_id': res[0],
                 'seats_reserved': res[1],
                 'status': res[2],
                 'created_at': created_at_val.isoformat() if created_at_val else None,
-                'from_location': res[4],
-                'to_location': res[5],
+                'from_location': ride[2],
+                'to_location': ride[3],
                 'departure_time': departure_time_val.isoformat() if departure_time_val else None,
-                'ride_id': res[7],
-                'passenger_name': res[8],
-                'passenger_id': res[9]
+                'ride_id': res[4],
+                'passenger_name': passenger[1] if passenger else None,
+                'passenger_id': res[5]
             })
         
+        result.sort(key=lambda item: item['departure_time'] or '', reverse=True)
         return jsonify(result), 200
         
     except Exception as e:
@@ -919,9 +1147,13 @@ def get_driver_reservations(driver_id):
 def cancel_ride(ride_id):
     try:
         with db.session.begin():
+            user_stats.ride_cancelled(db.session, ride_id)
             db.session.execute(db.text('UPDATE reservations SET status = \'cancelled\' WHERE ride_id = :ride_id'), {'ride_id': ride_id})
             db.session.execute(db.text('DELETE FROM rides WHERE id = :ride_id'), {'ride_id': ride_id})
         
+        unindex_ride(ride_id)
+        ride_membership.remove_ride(ride_id)
+        
         return jsonify({'message': 'Jízda zrušena'}), 200
         
     except Exception as e:
@@ -930,18 +1162,20 @@ def cancel_ride(ride_id):
 @app.route('/api/reservations/cancel/<int:reservation_id>', methods=['DELETE'])
 def cancel_reservation_new(reservation_id):
     try:
-        with db.session.begin():
-            reservation = db.session.execute(db.text('SELECT ride_id, seats_reserved FROM reservations WHERE id = :reservation_id'), 
-                                               {'reservation_id': reservation_id}).fetchone()
-            
-            if not reservation:
-                return jsonify({'error': 'Rezervace nenalezena'}), 404
-            
-            ride_id, seats_reserved = reservation
-            
-            db.session.execute(db.text('UPDATE reservations SET status = \'cancelled\' WHERE id = :reservation_id'), {'reservation_id': reservation_id})
-            db.session.execute(db.text('UPDATE rides SET available_seats = available_seats + :seats_reserved WHERE id = :ride_id'), 
-                             {'seats_reserved': seats_reserved, 'ride_id': ride_id})
+        def cancel():
+            with db.session.begin():
+                reservation = cancel_reservation(db.session, reservation_id)
+                if reservation:
+                    user_stats.passenger_left(db.session, reservation[0], reservation[2])
+                return reservation
+        
+        reservation = run_with_retry(cancel)
+        if not reservation:
+            return jsonify({'error': 'Rezervace nenalezena nebo již zrušena'}), 404
+        
+        ride_id, seats_reserved, passenger_id = reservation
+        
+        ride_membership.invalidate_reservation(ride_id, passenger_id)
         
         return jsonify({'message': 'Rezervace zrušena'}), 200
         
@@ -949,78 +1183,58 @@ def cancel_reservation_new(reservation_id):
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/messages/send', methods=['POST'])
+@app.route('/api/chat/send', methods=['POST'])
 def send_chat_message():
     try:
         data = request.get_json()
         ride_id = data.get('ride_id')
+        sender_id = data.get('sender_id')
         sender_name = data.get('sender_name')
         message = data.get('message')
         
-        if not all([ride_id, sender_name, message]):
+        if not all([ride_id, sender_id or sender_name, message]):
             return jsonify({'error': 'Všechna pole jsou povinná'}), 400
+        if sender_id:
+            try:
+                sender_id = int(sender_id)
+            except (TypeError, ValueError):
+                return jsonify({'error': 'Neplatné sender_id'}), 400
         
-        # Find sender_id by name
         with db.session.begin():
-            user = db.session.execute(db.text('SELECT id FROM users WHERE name = :name'), {'name': sender_name}).fetchone()
+            sender_id = resolve_user_id(sender_id, sender_name)
+            # Jméno odesílatele vždy z databáze podle id - jde do inboxu, SSE i push notifikace
+            user = db.session.execute(db.text('SELECT name FROM users WHERE id = :user_id'), {'user_id': sender_id}).fetchone() if sender_id else None
             if not user:
                 return jsonify({'error': 'Uživatel nenalezen'}), 404
+            sender_name = user[0]
             
-            sender_id = user[0]
-            db.session.execute(db.text('INSERT INTO messages (ride_id, sender_id, message, created_at) VALUES (:ride_id, :sender_id, :message, :created_at)'),
-                             {'ride_id': ride_id, 'sender_id': sender_id, 'message': message, 'created_at': datetime.datetime.now()})
-
-            # --- Push Notification Logic (Temporarily Disabled) ---
-            # # Find the recipient(s) of the message
-            # # For a ride chat, recipients are the driver and passengers (excluding sender)
-            
-            # # Get ride details to find driver
-            # ride = db.session.execute(db.text('SELECT user_id FROM rides WHERE id = :ride_id'), {'ride_id': ride_id}).fetchone()
-            # if not ride:
-            #     print(f"Ride {ride_id} not found for sending push notification.")
-            #     return jsonify({'message': 'Zpráva odeslána, ale jízda nenalezena pro notifikaci'}), 201
-
-            # driver_id = ride[0]
-            # recipient_ids = [driver_id]
-
-            # # Get passengers for the ride
-            # passengers = db.session.execute(db.text('SELECT passenger_id FROM reservations WHERE ride_id = :ride_id AND status = \'confirmed\''), {'ride_id': ride_id}).fetchall()
-            # for passenger in passengers:
-            #     recipient_ids.append(passenger[0])
-            
-            # # Remove sender from recipients
-            # recipient_ids = list(set([uid for uid in recipient_ids if uid != sender_id]))
-
-            # print(f"Sending push notification to recipient_ids: {recipient_ids} for ride {ride_id}")
-
-            # for recipient_id in recipient_ids:
-            #     subscriptions = PushSubscription.query.filter_by(user_id=recipient_id).all()
-            #     for sub in subscriptions:
-            #         try:
-            #             payload = {
-            #                 "title": f"Nová zpráva od {sender_name}!",
-            #                 "body": message,
-            #                 "icon": "/static/icons/icon-192x192.png", # Path to your app icon
-            #                 "data": {"url": f"/?chat_ride_id={ride_id}&chat_partner_name={sender_name}"} # Deep link to chat
-            #             }
-            #             send_web_push(
-            #                 subscription_info={
-            #                     "endpoint": sub.endpoint,
-            #                     "keys": {"p256dh": sub.p256dh, "auth": sub.auth}
-            #                 },
-            #                 message=json.dumps(payload),
-            #                 vapid_private_key=VAPID_PRIVATE_KEY,
-            #                 vapid_claims=VAPID_CLAIMS
-            #             )
-            #             print(f"Push notification sent to user {recipient_id}")
-            #         except WebPushException as e:
-            #             print(f"Error sending push notification to user {recipient_id}: {e}")
-            #             # Optionally, remove invalid subscriptions from DB
-            #             if e.response and e.response.status_code == 410: # GONE status
-            #                 db.session.delete(sub)
-            #                 print(f"Deleted expired subscription for user {recipient_id}")
-            #         except Exception as e:
-            #             print(f"Unexpected error sending push notification to user {recipient_id}: {e}")
-            # # --- End Push Notification Logic ---
+            created_at = datetime.datetime.now()
+            # RETURNING id: cursor.lastrowid psycopg2 u PostgreSQL nevrací (SQLite >= 3.35 RETURNING umí)
+            message_id = db.session.execute(db.text('INSERT INTO messages (ride_id, sender_id, message, created_at) VALUES (:ride_id, :sender_id, :message, :created_at) RETURNING id'),
+                                            {'ride_id': ride_id, 'sender_id': sender_id, 'message': message, 'created_at': created_at}).scalar()
+            recipient_ids = [uid for uid in get_ride_participant_ids(ride_id) if uid != sender_id]
+            fan_out_notification(recipient_ids, ride_id, message_id, sender_id, sender_name, message, created_at)
+            # Publikuje se níže přímo do busu; relay tyto řádky inboxu přeskočí (označit ještě před commitem)
+            notification_relay.mark_published(message_id)
+
+            # Web push jde přes outbox, posílá ho push_dispatcher na pozadí po commitu
+            if PUSH_ENABLED:
+                enqueue_push(db.session, recipient_ids, {
+                    "title": f"Nová zpráva od {sender_name}!",
+                    "body": message,
+                    "icon": "/static/icons/icon-192x192.png",
+                    "data": {"url": f"/?chat_ride_id={ride_id}&chat_partner_name={sender_name}"}
+                })
+        
+        if PUSH_ENABLED and recipient_ids:
+            get_push_dispatcher().wake()
+        
+        notification_bus.publish(recipient_ids, {
+            'ride_id': ride_id,
+            'message': message,
+            'created_at': created_at.isoformat(),
+            'sender_name': sender_name
+        })
         
         return jsonify({'message': 'Zpráva odeslána'}), 201
         
@@ -1029,29 +1243,72 @@ def send_chat_message():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/chat/gateway', methods=['GET'])
+def get_chat_gateway():
+    # Real-time chat běží jako samostatný proces (chat_gateway.py); bez něj klient polluje
+    return jsonify({'url': CHAT_GATEWAY_URL}), 200
+
 @app.route('/api/chat/<int:ride_id>/messages', methods=['GET'])
 def get_chat_messages(ride_id):
+    # Keyset stránkování podle id: ?after_id= nové zprávy, ?before_id= starší historie, ?limit= bez kurzoru
+    # posledních N. Bez kurzoru i limitu celá historie jako dřív (starší klienti stránkovat neumí).
+    # Vždy vrací seznam vzestupně podle id, klient si kurzory bere z prvního/posledního id.
+    # Id se přiděluje při INSERT, ale zpráva je vidět až po commitu - zpráva s nižším id se tak může objevit
+    # až po vyšší. Proto after_id vrací navíc zprávy <= after_id z posledních CHAT_LATE_COMMIT_SECONDS
+    # a klient je odfiltruje podle id.
     try:
+        after_id = request.args.get('after_id', type=int)
+        before_id = request.args.get('before_id', type=int)
+        paged = after_id is not None or before_id is not None or 'limit' in request.args
+        limit = min(max(request.args.get('limit', CHAT_PAGE_LIMIT, type=int), 1), CHAT_PAGE_MAX)
+        
+        params = {'ride_id': ride_id, 'limit': limit}
+        if after_id is not None:
+            condition, order = 'AND m.id > :after_id', 'ASC'
+            params['after_id'] = after_id
+        elif before_id is not None:
+            condition, order = 'AND m.id < :before_id', 'DESC'
+            params['before_id'] = before_id
+        elif paged:
+            condition, order = '', 'DESC'
+        else:
+            condition, order = '', 'ASC'
+        
         with db.session.begin():
-            # Vymaž staré zprávy s NULL created_at
-            db.session.execute(db.text("DELETE FROM messages WHERE created_at IS NULL"))
-            
-            messages = db.session.execute(db.text("""
-                SELECT m.message, m.created_at, m.sender_id, u.name as sender_name
+            messages = db.session.execute(db.text(f"""
+                SELECT m.id, m.message, m.created_at, m.sender_id, u.name as sender_name
                 FROM messages m
                 JOIN users u ON m.sender_id = u.id
-                WHERE m.ride_id = :ride_id AND m.created_at IS NOT NULL
-                ORDER BY m.created_at ASC
-            """), {'ride_id': ride_id}).fetchall()
+                WHERE m.ride_id = :ride_id AND m.created_at IS NOT NULL {condition}
+                ORDER BY m.id {order}
+                {'LIMIT :limit' if paged else ''}
+            """), params).fetchall()
+            late = []
+            # Nové zprávy mají přednost, pozdní doplní zbytek stránky - celá odpověď má nejvýš limit zpráv
+            if after_id is not None and len(messages) < limit:
+                late = db.session.execute(db.text("""
+                    SELECT m.id, m.message, m.created_at, m.sender_id, u.name as sender_name
+                    FROM messages m
+                    JOIN users u ON m.sender_id = u.id
+                    WHERE m.ride_id = :ride_id AND m.created_at >= :since AND m.id <= :after_id
+                    ORDER BY m.created_at ASC
+                    LIMIT :limit
+                """), {'ride_id': ride_id, 'after_id': after_id, 'limit': limit - len(messages),
+                      'since': datetime.datetime.now() - datetime.timedelta(seconds=CHAT_LATE_COMMIT_SECONDS)}).fetchall()
+        
+        if order == 'DESC':
+            messages = messages[::-1]
+        messages = sorted(late, key=lambda msg: msg[0]) + list(messages)
         
         result = []
         for msg in messages:
-            created_at_val = parse_datetime_str(msg[1])
+            created_at_val = parse_datetime_str(msg[2])
             result.append({
-                'message': msg[0],
+                'id': msg[0],
+                'message': msg[1],
                 'created_at': created_at_val.isoformat() if created_at_val else None,
-                'sender_id': msg[2],
-                'sender_name': msg[3]
+                'sender_id': msg[3],
+                'sender_name': msg[4]
             })
         
         return jsonify(result), 200
@@ -1072,82 +1329,14 @@ def get_user_notifications(user_name):
     
     try:
         with db.session.begin():
-            # Najdi user_id podle jména
-            user = db.session.execute(db.text('SELECT id FROM users WHERE name = :name'), {'name': user_name}).fetchone()
-            if not user:
+            user_id = resolve_user_id(request.args.get('user_id', type=int), user_name)
+            if not user_id:
                 print(f"User {user_name} not found")
                 return jsonify([]), 200
             
-            user_id = user[0]
-            print(f"Found user {user_name} with ID {user_id}")
-            
-            # Najdi zprávy z posledních 5 minut kde je uživatel účastník jízdy ale není odesílatel
+            # Zprávy z posledních 5 minut z inboxu uživatele (zapsané při odeslání zprávy)
             five_minutes_ago = datetime.datetime.now() - datetime.timedelta(minutes=5)
-            print(f"Looking for messages after {five_minutes_ago}")
-            
-            # Debug: Najdi všechny jízdy uživatele
-            user_rides = db.session.execute(db.text("""
-                SELECT r.id, r.from_location, r.to_location, u.name as driver_name, 'driver' as role
-                FROM rides r
-                JOIN users u ON r.user_id = u.id
-                WHERE r.user_id = :user_id
-                UNION
-                SELECT r.id, r.from_location, r.to_location, u.name as driver_name, 'passenger' as role
-                FROM rides r
-                JOIN users u ON r.user_id = u.id
-                JOIN reservations res ON r.id = res.ride_id
-                WHERE res.passenger_id = :user_id
-            """), {'user_id': user_id}).fetchall()
-            
-            print(f"User {user_name} is involved in {len(user_rides)} rides:")
-            for ride in user_rides:
-                print(f"  - Ride {ride[0]}: {ride[1]} -> {ride[2]} (driver: {ride[3]}, role: {ride[4]})")
-            
-            # Debug: Najdi všechny zprávy v databázi
-            all_messages = db.session.execute(db.text("""
-                SELECT m.ride_id, m.message, m.created_at, u.name as sender_name, m.sender_id
-                FROM messages m
-                JOIN users u ON m.sender_id = u.id
-                ORDER BY m.created_at DESC
-                LIMIT 20
-            """)).fetchall()
-            
-            print(f"All messages in database:")
-            for msg in all_messages:
-                print(f"  - Ride {msg[0]}: '{msg[1]}' from {msg[3]} (ID {msg[4]}) at {msg[2]}")
-            
-            # Debug: Najdi jízdy uživatele
-            user_ride_ids = db.session.execute(db.text("""
-                SELECT r.id FROM rides r WHERE r.user_id = :user_id
-                UNION
-                SELECT res.ride_id FROM reservations res WHERE res.passenger_id = :user_id
-            """), {'user_id': user_id}).fetchall()
-            
-            ride_ids = [row[0] for row in user_ride_ids]
-            print(f"User {user_name} is involved in rides: {ride_ids}")
-            
-            # Najdi jízdy kde je uživatel řidič nebo pasažér
-            messages = db.session.execute(db.text("""
-                SELECT DISTINCT m.ride_id, m.message, m.created_at, u.name as sender_name
-                FROM messages m
-                JOIN users u ON m.sender_id = u.id
-                WHERE m.created_at > :five_minutes_ago
-                  AND m.sender_id != :user_id
-                  AND m.ride_id IN (
-                    SELECT r.id FROM rides r WHERE r.user_id = :user_id
-                    UNION
-                    SELECT res.ride_id FROM reservations res WHERE res.passenger_id = :user_id
-                  )
-                ORDER BY m.created_at DESC
-                LIMIT 10
-            """), {
-                'user_id': user_id, 
-                'five_minutes_ago': five_minutes_ago
-            }).fetchall()
-            
-            print(f"Found {len(messages)} relevant messages for {user_name}")
-            for msg in messages:
-                print(f"  - {msg[3]}: '{msg[1]}' at {msg[2]}")
+            messages = [row[1:] for row in read_notification_inbox(user_id, since=five_minutes_ago, limit=10)]
         
         result = []
         for msg in messages:
@@ -1176,35 +1365,15 @@ def get_user_notifications_v361(user_name):
         print(f"NEW CODE v361 - Getting notifications for {user_name}")
         
         with db.session.begin():
-            # Najdi user_id podle jména
-            user = db.session.execute(db.text('SELECT id FROM users WHERE name = :name'), {'name': user_name}).fetchone()
-            if not user:
+            user_id = resolve_user_id(request.args.get('user_id', type=int), user_name)
+            if not user_id:
                 print(f"User {user_name} not found")
                 return jsonify([]), 200
-            
-            user_id = user[0]
             print(f"Found user {user_name} with ID {user_id}")
             
             # Najdi zprávy z posledních 5 minut
             five_minutes_ago = datetime.datetime.now() - datetime.timedelta(minutes=5)
-            
-            messages = db.session.execute(db.text("""
-                SELECT DISTINCT m.ride_id, m.message, m.created_at, u.name as sender_name
-                FROM messages m
-                JOIN users u ON m.sender_id = u.id
-                WHERE m.created_at > :five_minutes_ago
-                  AND m.sender_id != :user_id
-                  AND m.ride_id IN (
-                    SELECT r.id FROM rides r WHERE r.user_id = :user_id
-                    UNION
-                    SELECT res.ride_id FROM reservations res WHERE res.passenger_id = :user_id
-                  )
-                ORDER BY m.created_at DESC
-                LIMIT 10
-            """), {
-                'user_id': user_id, 
-                'five_minutes_ago': five_minutes_ago
-            }).fetchall()
+            messages = [row[1:] for row in read_notification_inbox(user_id, since=five_minutes_ago, limit=10)]
             
             print(f"Found {len(messages)} messages for {user_name}")
         
@@ -1226,6 +1395,71 @@ def get_user_notifications_v361(user_name):
         print(f"Error in v361 notifications: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/notifications/inbox/<int:user_id>', methods=['GET'])
+def get_notification_inbox(user_id):
+    """Notifikace novější než kurzor (?after=<id>), nejstarší první; pozdě commitnuté notifikace s id <= kurzor
+    se můžou opakovat, klient je odfiltruje podle id"""
+    try:
+        after_id = request.args.get('after', 0, type=int)
+        limit = min(max(request.args.get('limit', NOTIFICATION_INBOX_PAGE_LIMIT, type=int), 1), NOTIFICATION_INBOX_PAGE_LIMIT)
+        
+        with db.session.begin():
+            rows = read_notification_inbox(user_id, after_id=after_id, limit=limit)
+        
+        notifications = []
+        for row in rows:
+            created_at_val = parse_datetime_str(row[3])
+            notifications.append({
+                'id': row[0],
+                'ride_id': row[1],
+                'message': row[2],
+                'created_at': created_at_val.isoformat() if created_at_val else None,
+                'sender_name': row[4]
+            })
+        
+        return jsonify({
+            'notifications': notifications,
+            'cursor': max([after_id] + [notification['id'] for notification in notifications])
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/notifications/stream', methods=['GET'])
+def notification_stream():
+    """SSE proud notifikací; nahrazuje dotazování /api/notifications/<user_name>
+
+    Čte z notification_bus tohoto procesu. Notifikace odeslané v jiném workeru sem dorazí přes
+    notification_relay (tail notification_inbox) nejpozději za NOTIFICATION_RELAY_POLL_SECONDS."""
+    user_id = request.args.get('user_id', type=int)
+    user_name = request.args.get('user_name', '').strip()
+    
+    if not user_id and user_name:
+        # Jméno se převede na ID jednou za připojení, ne při každém dotazu
+        with db.session.begin():
+            user_id = resolve_user_id(user_name=user_name)
+    if not user_id:
+        return jsonify({'error': 'Uživatel nenalezen'}), 404
+    
+    # Kurzor: Last-Event-ID při obnovení spojení, jinak jen nové události
+    cursor = request.headers.get('Last-Event-ID', type=int) or request.args.get('after', type=int)
+    if cursor is None:
+        cursor = notification_bus.latest(user_id)
+    
+    def generate(cursor):
+        yield 'retry: 3000\n\n'
+        while True:
+            events = notification_bus.wait(user_id, cursor, timeout=NOTIFICATION_HEARTBEAT_SECONDS)
+            if not events:
+                yield ': heartbeat\n\n'
+                continue
+            for sequence, event in events:
+                cursor = sequence
+                yield f'id: {sequence}\nevent: notification\ndata: {json.dumps(event)}\n\n'
+    
+    return Response(stream_with_context(generate(cursor)), mimetype='text/event-stream',
+                    headers={'X-Accel-Buffering': 'no'})
+
 @app.route('/api/vapid-public-key', methods=['GET'])
 def get_vapid_public_key():
     return jsonify({'publicKey': VAPID_PUBLIC_KEY}), 200
@@ -1240,28 +1474,24 @@ def create_rating():
         if not rater_id:
             return jsonify({'error': 'Přihlášení je vyžadováno'}), 401
         
-        rating = data.get('rating')
+        try:
+            rating = int(data.get('rating'))
+        except (TypeError, ValueError):
+            rating = 0
+        if not 1 <= rating <= 5:
+            return jsonify({'error': 'Hodnocení musí být 1 až 5'}), 400
         comment = data.get('comment', '')
         driver_name = data.get('driver_name')
         
         with db.session.begin():
-            rated_id = None
-            if driver_name:
-                user = db.session.execute(db.text('SELECT id FROM users WHERE name = :driver_name'), {'driver_name': driver_name}).fetchone()
-                if user:
-                    rated_id = user[0]
-            
-            if not rated_id:
-                rated_id = data.get('rated_id', 0)
+            rated_id = resolve_user_id(data.get('rated_id'), driver_name) or 0
             
             db.session.execute(db.text('INSERT INTO ratings (ride_id, rater_id, rated_id, rating, comment) VALUES (:ride_id, :rater_id, :rated_id, :rating, :comment)'),
                              {'ride_id': ride_id, 'rater_id': rater_id, 'rated_id': rated_id, 'rating': rating, 'comment': comment})
             
+            # Průběžný součet a počet v rating_aggregates místo AVG přes všechna hodnocení
             if rated_id:
-                avg_rating_result = db.session.execute(db.text('SELECT AVG(rating) FROM ratings WHERE rated_id = :rated_id'), {'rated_id': rated_id}).fetchone()
-                avg_rating = avg_rating_result[0] if avg_rating_result else None
-                if avg_rating:
-                    db.session.execute(db.text('UPDATE users SET rating = :avg_rating WHERE id = :rated_id'), {'avg_rating': avg_rating, 'rated_id': rated_id})
+                rating_aggregates.record_rating(db.session, rated_id, rating, RATING_PRIOR_WEIGHT, RATING_PRIOR_MEAN)
         
         return jsonify({'message': 'Hodnocení odesláno'}), 201
         
@@ -1317,16 +1547,13 @@ def subscribe():
 def get_user_profile(user_id):
     try:
         with db.session.begin():
-            user = db.session.execute(db.text('SELECT id, name, email, phone, home_city, bio, rating, created_at FROM users WHERE id = :user_id'), {'user_id': user_id}).fetchone()
+            # Počty jízd udržují handlery v user_stats (viz user_stats.py), profil je jeden dotaz podle primárního klíče
+            user = db.session.execute(db.text('SELECT u.id, u.name, u.email, u.phone, u.home_city, u.bio, u.rating, u.created_at, s.rides_as_driver, s.rides_as_passenger, s.total_distance FROM users u LEFT JOIN user_stats s ON s.user_id = u.id WHERE u.id = :user_id'), {'user_id': user_id}).fetchone()
             if not user:
                 return jsonify({'error': 'Uživatel nenalezen'}), 404
             
-            # Calculate rides as driver
-            rides_as_driver_count = db.session.execute(db.text('SELECT COUNT(*) FROM rides WHERE user_id = :user_id'), {'user_id': user_id}).scalar() or 0
-            
-            # Calculate rides as passenger
-            rides_as_passenger_count = db.session.execute(db.text('SELECT COUNT(DISTINCT ride_id) FROM reservations WHERE passenger_id = :user_id AND status = \'confirmed\''), {'user_id': user_id}).scalar() or 0
-            
+            rides_as_driver_count = user[8] or 0
+            rides_as_passenger_count = user[9] or 0
             total_rides_count = rides_as_driver_count + rides_as_passenger_count
 
             return jsonify({
@@ -1340,7 +1567,8 @@ def get_user_profile(user_id):
                 'member_since': user[7].isoformat() if user[7] else None,
                 'total_rides': total_rides_count,
                 'rides_as_driver': rides_as_driver_count,
-                'rides_as_passenger': rides_as_passenger_count
+                'rides_as_passenger': rides_as_passenger_count,
+                'total_distance_km': round(user[10] or 0.0, 1)
             }), 200
     except Exception as e:
         traceback.print_exc()
@@ -1354,15 +1582,19 @@ def update_user_profile(user_id):
         home_city = data.get('home_city')
         bio = data.get('bio')
         email = data.get('email')
+        name = data.get('name')
 
         with db.session.begin():
             # Check if the user exists
-            user = db.session.execute(db.text('SELECT id FROM users WHERE id = :user_id'), {'user_id': user_id}).fetchone()
+            user = db.session.execute(db.text('SELECT id, name FROM users WHERE id = :user_id'), {'user_id': user_id}).fetchone()
             if not user:
                 return jsonify({'error': 'Uživatel nenalezen'}), 404
 
             # Update user profile
             update_fields = {}
+            if name is not None and name.strip():
+                update_fields['name'] = str(escape(name.strip()))
+                update_fields['name_normalized'] = normalize_name(update_fields['name'])
             if home_city is not None:
                 update_fields['home_city'] = home_city
             if bio is not None:
@@ -1375,6 +1607,9 @@ def update_user_profile(user_id):
                 params = {'user_id': user_id, **update_fields}
                 db.session.execute(db.text(f'UPDATE users SET {set_clause} WHERE id = :user_id'), params)
 
+        if 'name' in update_fields:
+            user_directory.invalidate(user[1], update_fields['name'])
+
         return jsonify({'message': 'Profil úspěšně aktualizován'}), 200
 
     except Exception as e:
@@ -1386,14 +1621,20 @@ def update_user_location():
     try:
         data = request.get_json()
         user_id = data.get('user_id')
-        latitude = data.get('latitude')
-        longitude = data.get('longitude')
+        # app.html posílá lat/lng, enhanced_features.js latitude/longitude
+        latitude = data.get('latitude', data.get('lat'))
+        longitude = data.get('longitude', data.get('lng'))
 
-        if not all([user_id, latitude, longitude]):
+        if user_id is None or latitude is None or longitude is None:
             return jsonify({'error': 'Missing user_id, latitude, or longitude'}), 400
+        try:
+            user_id, latitude, longitude = int(user_id), float(latitude), float(longitude)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Invalid user_id, latitude, or longitude'}), 400
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            return jsonify({'error': 'Invalid user_id, latitude, or longitude'}), 400
 
-        user_locations[user_id] = {'latitude': latitude, 'longitude': longitude, 'timestamp': datetime.datetime.now().isoformat()}
-        print(f"User {user_id} location updated: {user_locations[user_id]}")
+        live_locations.update(user_id, latitude, longitude)
 
         return jsonify({'message': 'User location updated successfully'}), 200
 
@@ -1401,28 +1642,117 @@ def update_user_location():
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/users/location/batch', methods=['POST'])
+def update_user_location_batch():
+    # Formát dávky (delta kódování, souřadnice v 1e-5 stupně) viz location_ingest.py
+    try:
+        data = request.get_json(silent=True) or {}
+        try:
+            user_id = int(data.get('user_id'))
+            fixes = decode_fixes(data.get('fixes'))
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': f'Invalid batch: {e}'}), 400
+
+        location_writer.add(user_id, fixes)
+
+        return jsonify({'accepted': len(fixes)}), 202
+
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/users/locations', methods=['GET'])
 def get_user_locations():
     try:
+        # Volitelně jen okolí bodu: ?lat=&lng=&radius_km=
+        lat = request.args.get('lat', type=float)
+        lng = request.args.get('lng', type=float)
+        limit = request.args.get('limit', type=int)
+        if lat is not None and lng is not None:
+            locations = live_locations.near(lat, lng, request.args.get('radius_km', 20.0, type=float), limit)
+        else:
+            locations = live_locations.active(limit)
+        
+        # Jména jedním dotazem pro všechny polohy
+        with db.session.begin():
+            users = load_users(db.session, [location.user_id for location in locations])
+        
         result = []
-        for user_id, location_data in user_locations.items():
-            # Get user name from database
-            with db.session.begin():
-                user = db.session.execute(db.text('SELECT name FROM users WHERE id = :user_id'), {'user_id': user_id}).fetchone()
-                user_name = user[0] if user else f'User {user_id}'
-            
+        for location in locations:
+            user = users.get(location.user_id)
             result.append({
-                'user_id': user_id,
-                'user_name': user_name,
-                'lat': location_data['latitude'],
-                'lng': location_data['longitude'],
-                'updated_at': location_data['timestamp']
+                'user_id': location.user_id,
+                'user_name': user[1] if user else f'User {location.user_id}',
+                'lat': location.lat,
+                'lng': location.lng,
+                'updated_at': datetime.datetime.fromtimestamp(location.updated_at).isoformat()
             })
         
         return jsonify(result), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.cli.command('geocode-rides')
+def geocode_rides_command():
+    """Doplní chybějící souřadnice jízd z lokálního gazetteeru."""
+    updated = 0
+    with db.session.begin():
+        rides = db.session.execute(db.text('SELECT id, from_location, to_location FROM rides WHERE from_lat IS NULL OR to_lat IS NULL')).fetchall()
+        for ride in rides:
+            from_coords = geocode(ride[1])
+            to_coords = geocode(ride[2])
+            if not from_coords and not to_coords:
+                continue
+            db.session.execute(db.text('UPDATE rides SET from_lat = COALESCE(from_lat, :from_lat), from_lng = COALESCE(from_lng, :from_lng), to_lat = COALESCE(to_lat, :to_lat), to_lng = COALESCE(to_lng, :to_lng) WHERE id = :ride_id'),
+                               {'ride_id': ride[0],
+                                'from_lat': from_coords[0] if from_coords else None, 'from_lng': from_coords[1] if from_coords else None,
+                                'to_lat': to_coords[0] if to_coords else None, 'to_lng': to_coords[1] if to_coords else None})
+            updated += 1
+    print(f"Geocoded {updated} of {len(rides)} rides")
+
+@app.cli.command('prune-notifications')
+@click.option('--days', default=NOTIFICATION_INBOX_RETENTION_DAYS, show_default=True, help='Ponechat notifikace mladší než N dní.')
+def prune_notifications_command(days):
+    """Smaže staré řádky z notification_inbox."""
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=days)
+    with db.session.begin():
+        result = db.session.execute(db.text('DELETE FROM notification_inbox WHERE created_at < :cutoff'), {'cutoff': cutoff})
+    print(f"Deleted {result.rowcount} notifications older than {days} days")
+
+@app.cli.command('cleanup-messages')
+def cleanup_messages_command():
+    """Smaže zprávy bez created_at (pozůstatek starých verzí), dřív se to dělalo při každém čtení chatu."""
+    with db.session.begin():
+        result = db.session.execute(db.text('DELETE FROM messages WHERE created_at IS NULL'))
+    print(f"Deleted {result.rowcount} messages without created_at")
+
+@app.cli.command('backfill-ratings')
+def backfill_ratings_command():
+    """Přepočítá rating_aggregates a users.rating z tabulky ratings (např. po změně RATING_PRIOR_*)."""
+    with db.session.begin():
+        rated = rating_aggregates.backfill(db.session, RATING_PRIOR_WEIGHT, RATING_PRIOR_MEAN)
+    print(f"Rebuilt rating aggregates for {rated} users")
+
+@app.cli.command('reconcile-user-stats')
+def reconcile_user_stats_command():
+    """Přepočítá user_stats (počty jízd, vzdálenost) z rides a reservations."""
+    with db.session.begin():
+        updated = user_stats.reconcile(db.session)
+    print(f"Reconciled ride stats for {updated} users")
+
+@app.cli.command('drain-push')
+def drain_push_command():
+    """Odešle všechny splatné web push notifikace z push_outbox (bez běžícího serveru)."""
+    dispatcher = get_push_dispatcher()
+    total = 0
+    while True:
+        claimed = dispatcher.drain_once()
+        if not claimed:
+            break
+        total += claimed
+    dispatcher.stop()
+    print(f"Processed {total} outbox rows: {dispatcher.stats}")
+
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
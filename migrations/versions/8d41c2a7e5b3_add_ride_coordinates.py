@@ -0,0 +1,32 @@
+"""Add geocoded coordinates to rides
+
+Revision ID: 8d41c2a7e5b3
+Revises: 543ff2f94c66
+Create Date: 2026-10-18 09:12:31.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d41c2a7e5b3'
+down_revision = '543ff2f94c66'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('rides') as batch_op:
+        batch_op.add_column(sa.Column('from_lat', sa.FLOAT(), nullable=True))
+        batch_op.add_column(sa.Column('from_lng', sa.FLOAT(), nullable=True))
+        batch_op.add_column(sa.Column('to_lat', sa.FLOAT(), nullable=True))
+        batch_op.add_column(sa.Column('to_lng', sa.FLOAT(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('rides') as batch_op:
+        batch_op.drop_column('to_lng')
+        batch_op.drop_column('to_lat')
+        batch_op.drop_column('from_lng')
+        batch_op.drop_column('from_lat')
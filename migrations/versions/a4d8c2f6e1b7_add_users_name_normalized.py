@@ -0,0 +1,38 @@
+"""Add indexed users.name_normalized for name lookups
+
+Revision ID: a4d8c2f6e1b7
+Revises: f2c7d9e4a8b3
+Create Date: 2026-10-18 17:36:55.210948
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4d8c2f6e1b7'
+down_revision = 'f2c7d9e4a8b3'
+branch_labels = None
+depends_on = None
+
+
+def normalize_name(name):
+    # Same as user_directory.normalize_name; copied so the migration does not depend on app code
+    return ' '.join((name or '').split()).casefold()
+
+
+def upgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.add_column(sa.Column('name_normalized', sa.String(length=100), nullable=True))
+    connection = op.get_bind()
+    users = connection.execute(sa.text('SELECT id, name FROM users')).fetchall()
+    if users:
+        connection.execute(sa.text('UPDATE users SET name_normalized = :name_normalized WHERE id = :id'),
+                           [{'id': user_id, 'name_normalized': normalize_name(name)} for user_id, name in users])
+    op.create_index('ix_users_name_normalized', 'users', ['name_normalized'])
+
+
+def downgrade():
+    op.drop_index('ix_users_name_normalized', table_name='users')
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('name_normalized')
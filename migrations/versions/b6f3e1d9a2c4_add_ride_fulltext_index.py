@@ -0,0 +1,85 @@
+"""Add full-text index on ride locations
+
+Revision ID: b6f3e1d9a2c4
+Revises: 8d41c2a7e5b3
+Create Date: 2026-10-18 11:40:05.218644
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6f3e1d9a2c4'
+down_revision = '8d41c2a7e5b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("""
+            CREATE VIRTUAL TABLE rides_fts USING fts5(
+                from_location, to_location,
+                content='rides', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        """)
+        op.execute("""
+            CREATE TRIGGER rides_fts_insert AFTER INSERT ON rides BEGIN
+                INSERT INTO rides_fts(rowid, from_location, to_location)
+                VALUES (new.id, new.from_location, new.to_location);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER rides_fts_delete AFTER DELETE ON rides BEGIN
+                INSERT INTO rides_fts(rides_fts, rowid, from_location, to_location)
+                VALUES ('delete', old.id, old.from_location, old.to_location);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER rides_fts_update AFTER UPDATE OF from_location, to_location ON rides BEGIN
+                INSERT INTO rides_fts(rides_fts, rowid, from_location, to_location)
+                VALUES ('delete', old.id, old.from_location, old.to_location);
+                INSERT INTO rides_fts(rowid, from_location, to_location)
+                VALUES (new.id, new.from_location, new.to_location);
+            END
+        """)
+        op.execute("INSERT INTO rides_fts(rides_fts) VALUES ('rebuild')")
+    elif dialect == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+        op.add_column('rides', sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+        op.execute("""
+            CREATE FUNCTION rides_search_vector_update() RETURNS trigger AS $$
+            BEGIN
+                NEW.search_vector :=
+                    setweight(to_tsvector('simple', unaccent(coalesce(NEW.from_location, ''))), 'A') ||
+                    setweight(to_tsvector('simple', unaccent(coalesce(NEW.to_location, ''))), 'B');
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql
+        """)
+        op.execute("""
+            CREATE TRIGGER rides_search_vector_trigger
+            BEFORE INSERT OR UPDATE OF from_location, to_location ON rides
+            FOR EACH ROW EXECUTE FUNCTION rides_search_vector_update()
+        """)
+        # Fires the trigger for existing rows
+        op.execute("UPDATE rides SET from_location = from_location")
+        op.create_index('ix_rides_search_vector', 'rides', ['search_vector'], postgresql_using='gin')
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS rides_fts_update")
+        op.execute("DROP TRIGGER IF EXISTS rides_fts_delete")
+        op.execute("DROP TRIGGER IF EXISTS rides_fts_insert")
+        op.execute("DROP TABLE IF EXISTS rides_fts")
+    elif dialect == 'postgresql':
+        op.drop_index('ix_rides_search_vector', table_name='rides')
+        op.execute("DROP TRIGGER IF EXISTS rides_search_vector_trigger ON rides")
+        op.execute("DROP FUNCTION IF EXISTS rides_search_vector_update()")
+        op.drop_column('rides', 'search_vector')
@@ -0,0 +1,35 @@
+"""Add per-user rating aggregates
+
+Revision ID: b9e4d1f7c2a6
+Revises: a4d8c2f6e1b7
+Create Date: 2026-10-18 18:12:07.418920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b9e4d1f7c2a6'
+down_revision = 'a4d8c2f6e1b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('rating_aggregates',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('rating_sum', sa.Integer(), nullable=False),
+    sa.Column('rating_count', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    # Same set-based rebuild as `flask backfill-ratings`
+    op.execute("INSERT INTO rating_aggregates (user_id, rating_sum, rating_count, updated_at) "
+               "SELECT rated_id, SUM(rating), COUNT(*), CURRENT_TIMESTAMP FROM ratings "
+               "WHERE rated_id IN (SELECT id FROM users) GROUP BY rated_id")
+
+
+def downgrade():
+    op.drop_table('rating_aggregates')
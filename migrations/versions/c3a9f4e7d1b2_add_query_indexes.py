@@ -0,0 +1,52 @@
+"""Add secondary indexes for hot query predicates
+
+Revision ID: c3a9f4e7d1b2
+Revises: b6f3e1d9a2c4
+Create Date: 2026-10-18 13:05:47.530912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3a9f4e7d1b2'
+down_revision = 'b6f3e1d9a2c4'
+branch_labels = None
+depends_on = None
+
+
+# (index name, table, columns); see check_query_plans.py for the queries they serve
+INDEXES = [
+    # Passenger's reservations (+ status filter), ride ids for notifications/chat membership
+    ('ix_reservations_passenger_status_ride', 'reservations', ['passenger_id', 'status', 'ride_id']),
+    # Reservations of a ride / driver's rides joined to their reservations
+    ('ix_reservations_ride_status', 'reservations', ['ride_id', 'status']),
+    # Chat history of a ride in time order, notifications since a timestamp
+    ('ix_messages_ride_created', 'messages', ['ride_id', 'created_at']),
+    ('ix_messages_created', 'messages', ['created_at']),
+    # Driver's rides ordered by departure
+    ('ix_rides_user_departure', 'rides', ['user_id', 'departure_time']),
+    ('ix_rides_departure_time', 'rides', ['departure_time']),
+    # Name lookups (chat sender, notifications, ratings by driver name)
+    ('ix_users_name', 'users', ['name']),
+    # Rating average recomputation
+    ('ix_ratings_rated_id', 'ratings', ['rated_id']),
+    # Payment check per reservation; the table exists only in deployed databases
+    ('ix_payments_ride_passenger_status', 'payments', ['ride_id', 'passenger_id', 'status']),
+]
+
+
+def upgrade():
+    tables = set(sa.inspect(op.get_bind()).get_table_names())
+    for name, table, columns in INDEXES:
+        if table in tables:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    for name, table, columns in reversed(INDEXES):
+        if table in tables and name in {index['name'] for index in inspector.get_indexes(table)}:
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,61 @@
+"""Add driver/passenger ride counters to user_stats and fill them
+
+Revision ID: c6a2f8d3e9b4
+Revises: b9e4d1f7c2a6
+Create Date: 2026-10-18 18:47:51.206374
+
+"""
+import math
+from collections import defaultdict
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6a2f8d3e9b4'
+down_revision = 'b9e4d1f7c2a6'
+branch_labels = None
+depends_on = None
+
+
+def ride_distance_km(from_lat, from_lng, to_lat, to_lng):
+    # Same as user_stats.ride_distance_km; copied so the migration does not depend on app code
+    if None in (from_lat, from_lng, to_lat, to_lng):
+        return 0.0
+    lat1, lng1, lat2, lng2 = map(math.radians, (from_lat, from_lng, to_lat, to_lng))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(min(1.0, a)))
+
+
+def upgrade():
+    with op.batch_alter_table('user_stats') as batch_op:
+        batch_op.add_column(sa.Column('rides_as_driver', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('rides_as_passenger', sa.Integer(), nullable=False, server_default='0'))
+
+    # Same rebuild as `flask reconcile-user-stats`
+    connection = op.get_bind()
+    rides = {row[0]: (row[1], ride_distance_km(*row[2:])) for row in connection.execute(
+        sa.text('SELECT id, user_id, from_lat, from_lng, to_lat, to_lng FROM rides')).fetchall()}
+    totals = defaultdict(lambda: [0, 0, 0.0])
+    for driver_id, distance in rides.values():
+        totals[driver_id][0] += 1
+        totals[driver_id][2] += distance
+    for ride_id, passenger_id in connection.execute(
+            sa.text("SELECT DISTINCT ride_id, passenger_id FROM reservations WHERE status = 'confirmed'")).fetchall():
+        totals[passenger_id][1] += 1
+        totals[passenger_id][2] += rides.get(ride_id, (None, 0.0))[1]
+    user_ids = {row[0] for row in connection.execute(sa.text('SELECT id FROM users')).fetchall()}
+    rows = [{'user_id': user_id, 'driver': driver, 'passenger': passenger, 'distance': distance}
+            for user_id, (driver, passenger, distance) in totals.items() if user_id in user_ids]
+    # Nothing wrote user_stats before this revision
+    connection.execute(sa.text('DELETE FROM user_stats'))
+    if rows:
+        connection.execute(sa.text('INSERT INTO user_stats (user_id, total_rides, rides_as_driver, rides_as_passenger, total_distance) '
+                                   'VALUES (:user_id, :driver + :passenger, :driver, :passenger, :distance)'), rows)
+
+
+def downgrade():
+    with op.batch_alter_table('user_stats') as batch_op:
+        batch_op.drop_column('rides_as_passenger')
+        batch_op.drop_column('rides_as_driver')
@@ -0,0 +1,41 @@
+"""Add per-user notification inbox
+
+Revision ID: d7e2b5c8f3a1
+Revises: c3a9f4e7d1b2
+Create Date: 2026-10-18 15:21:09.663207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7e2b5c8f3a1'
+down_revision = 'c3a9f4e7d1b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('notification_inbox',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('ride_id', sa.Integer(), nullable=False),
+    sa.Column('message_id', sa.Integer(), nullable=True),
+    sa.Column('sender_id', sa.Integer(), nullable=True),
+    sa.Column('sender_name', sa.String(length=100), nullable=True),
+    sa.Column('message', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_notification_inbox_user_id', 'notification_inbox', ['user_id', 'id'])
+    op.create_index('ix_notification_inbox_user_created', 'notification_inbox', ['user_id', 'created_at'])
+    op.create_index('ix_notification_inbox_created_at', 'notification_inbox', ['created_at'])
+
+
+def downgrade():
+    op.drop_index('ix_notification_inbox_created_at', table_name='notification_inbox')
+    op.drop_index('ix_notification_inbox_user_created', table_name='notification_inbox')
+    op.drop_index('ix_notification_inbox_user_id', table_name='notification_inbox')
+    op.drop_table('notification_inbox')
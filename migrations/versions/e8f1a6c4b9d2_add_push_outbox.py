@@ -0,0 +1,50 @@
+"""Add push outbox and push subscriptions
+
+Revision ID: e8f1a6c4b9d2
+Revises: d7e2b5c8f3a1
+Create Date: 2026-10-18 16:02:41.118530
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8f1a6c4b9d2'
+down_revision = 'd7e2b5c8f3a1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # PushSubscription was only ever created by db.create_all() in some deployments
+    if 'push_subscription' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table('push_subscription',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('endpoint', sa.String(length=512), nullable=False),
+        sa.Column('p256dh', sa.String(length=256), nullable=False),
+        sa.Column('auth', sa.String(length=128), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('endpoint')
+        )
+        op.create_index('ix_push_subscription_user_id', 'push_subscription', ['user_id'])
+    op.create_table('push_outbox',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_ids', sa.Text(), nullable=False),
+    sa.Column('endpoints', sa.Text(), nullable=True),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('available_at', sa.DateTime(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_push_outbox_available_at', 'push_outbox', ['available_at', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_push_outbox_available_at', table_name='push_outbox')
+    op.drop_table('push_outbox')
+    # push_subscription is left in place: it may predate this migration
@@ -0,0 +1,25 @@
+"""Add messages (ride_id, id) index for chat keyset pagination
+
+Revision ID: f2c7d9e4a8b3
+Revises: e8f1a6c4b9d2
+Create Date: 2026-10-18 16:48:12.904371
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c7d9e4a8b3'
+down_revision = 'e8f1a6c4b9d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # GET /api/chat/<ride_id>/messages pages by id within a ride (after_id / before_id)
+    op.create_index('ix_messages_ride_id', 'messages', ['ride_id', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_messages_ride_id', table_name='messages')
@@ -10,9 +10,74 @@ import os
 import json
 import datetime
 from enhanced_app import *
+# After the star import, which brings in enhanced_app's `from time import time`
+import time
+from distance_kernel import CoordinateArray
+from ride_membership import RideMembershipCache
+from live_locations import LiveLocationStore
+from location_ingest import LocationWriter, decode_fix, decode_fixes
+from ride_tracking import RideTracker
 
+# Own Flask app on enhanced_app's database; `db` comes from the star import and must be registered here too
+database_uri = app.config['SQLALCHEMY_DATABASE_URI']
 app = Flask(__name__)
 CORS(app)
+app.config.update(SQLALCHEMY_DATABASE_URI=database_uri, SQLALCHEMY_TRACK_MODIFICATIONS=False)
+db.init_app(app)
+
+def load_ride_members(ride_id):
+    """Driver and confirmed passengers of a ride (enhanced schema: rides.driver_id, bookings)"""
+    with db.session.begin():
+        ride = db.session.execute(db.text(
+            'SELECT driver_id FROM rides WHERE id = :ride_id'
+        ), {'ride_id': ride_id}).fetchone()
+        if not ride:
+            return None
+        passengers = db.session.execute(db.text(
+            "SELECT passenger_id FROM bookings WHERE ride_id = :ride_id AND status = 'confirmed'"
+        ), {'ride_id': ride_id}).fetchall()
+    return ride[0], [p[0] for p in passengers]
+
+# Bookings are written by enhanced_app, so membership here is only kept fresh by the TTL
+ride_membership = RideMembershipCache(load_ride_members, ttl=30)
+
+# Live locations, shared with main_app through the same SQLite file; fixes are buffered and flushed every second
+live_locations = LiveLocationStore(os.environ.get('LIVE_LOCATIONS_PATH', 'live_locations.db'))
+location_writer = LocationWriter(live_locations)
+# Recent positions of each participant per ride for /api/rides/<id>/track (replaces the planned Redis store)
+ride_tracker = RideTracker()
+TRACK_MAX_POINTS = 500
+
+# Start coordinates of active rides for /api/rides/nearby, kept between requests as one CoordinateArray.
+# Rides are written by enhanced_app, so the array is rebuilt at most every NEARBY_RIDES_TTL seconds;
+# details (seats, price, status) are read fresh for the matched rides only.
+NEARBY_RIDES_TTL = 30
+nearby_rides_state = {'coords': None, 'loaded_at': 0.0}
+
+def active_ride_coordinates():
+    now = time.monotonic()
+    if nearby_rides_state['coords'] is None or now - nearby_rides_state['loaded_at'] >= NEARBY_RIDES_TTL:
+        with db.session.begin():
+            rows = db.session.execute(db.text(
+                "SELECT id, from_lat, from_lng FROM rides WHERE status = 'active' AND from_lat IS NOT NULL AND from_lng IS NOT NULL"
+            )).fetchall()
+        nearby_rides_state.update(coords=CoordinateArray.from_rows(rows), loaded_at=now)
+    return nearby_rides_state['coords']
+
+
+def record_ride_fixes(ride_id, user_id, fixes):
+    """Adds fixes sent with a ride_id to the ride's track; returns an error response or None."""
+    if ride_id is None:
+        return None
+    try:
+        ride_id = int(ride_id)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Neplatná jízda'}), 400
+    if user_id not in ride_membership.participant_ids(ride_id):
+        return jsonify({'error': 'Nejste účastníkem této jízdy'}), 403
+    if not ride_tracker.record(ride_id, user_id, fixes):
+        return jsonify({'error': 'Příliš mnoho sledovaných účastníků'}), 409
+    return None
 
 # PWA Configuration
 @app.route('/manifest.json')
@@ -86,39 +151,46 @@ def get_nearby_rides():
         lat = request.args.get('lat', type=float)
         lng = request.args.get('lng', type=float)
         radius = request.args.get('radius', 10, type=int)  # km
+        limit = request.args.get('limit', type=int)
         
         if not lat or not lng:
             return jsonify({'error': 'Poloha je vyžadována'}), 400
         
-        # Calculate distance using Haversine formula
-        query = """
-        SELECT r.*, u.name, u.rating,
-               (6371 * acos(cos(radians(?)) * cos(radians(r.from_lat)) * 
-               cos(radians(r.from_lng) - radians(?)) + 
-               sin(radians(?)) * sin(radians(r.from_lat)))) AS distance
-        FROM rides r
-        JOIN users u ON r.driver_id = u.id
-        WHERE r.status = 'active'
-        HAVING distance < ?
-        ORDER BY distance
-        """
+        # Haversine pro všechny aktivní jízdy najednou (vektorově) nad polem drženým mezi požadavky, nejbližší první;
+        # bere se dvojnásobek limitu, aby jízdy zrušené od načtení pole nezkrátily odpověď
+        nearest = active_ride_coordinates().nearest(lat, lng, k=limit * 2 if limit else limit, max_distance_km=radius)
+        if not nearest:
+            return jsonify([]), 200
         
+        # Detaily jen pro nalezené jízdy; jízdy zrušené od posledního načtení pole vypadnou podle status
         with db.session.begin():
-            rides = db.session.execute(db.text(query), 
-                                     (lat, lng, lat, radius)).fetchall()
+            rides = db.session.execute(db.text("""
+                SELECT r.id, r.from_location, r.to_location, r.departure_time,
+                       r.available_seats, r.price, u.name, u.rating
+                FROM rides r
+                JOIN users u ON r.driver_id = u.id
+                WHERE r.id IN :ride_ids AND r.status = 'active'
+            """).bindparams(db.bindparam('ride_ids', expanding=True)), {'ride_ids': [ride_id for ride_id, _ in nearest]}).fetchall()
+        rides_by_id = {ride[0]: ride for ride in rides}
         
         result = []
-        for ride in rides:
+        for ride_id, distance in nearest:
+            if limit and len(result) >= limit:
+                break
+            ride = rides_by_id.get(ride_id)
+            if ride is None:
+                continue
+            departure_time = ride[3]
             result.append({
                 'id': ride[0],
-                'driver_name': ride[-3],
-                'driver_rating': ride[-2],
-                'from_location': ride[2],
-                'to_location': ride[3],
-                'departure_time': ride[6].isoformat() if ride[6] else None,
-                'available_seats': ride[7],
-                'price': ride[8],
-                'distance': round(ride[-1], 1)
+                'driver_name': ride[6],
+                'driver_rating': ride[7],
+                'from_location': ride[1],
+                'to_location': ride[2],
+                'departure_time': departure_time.isoformat() if hasattr(departure_time, 'isoformat') else departure_time,
+                'available_seats': ride[4],
+                'price': ride[5],
+                'distance': round(distance, 1)
             })
         
         return jsonify(result), 200
@@ -130,54 +202,84 @@ def get_nearby_rides():
 def update_user_location_enhanced(user_id):
     """Enhanced location update with accuracy and speed"""
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Neplatná poloha'}), 400
         
-        location_data = {
-            'user_id': user_id,
-            'latitude': data.get('latitude'),
-            'longitude': data.get('longitude'),
-            'accuracy': data.get('accuracy'),
-            'speed': data.get('speed'),
-            'heading': data.get('heading'),
-            'timestamp': datetime.datetime.now()
-        }
+        try:
+            fix = decode_fix(data, int(time.time() * 1000))
+        except ValueError as e:
+            return jsonify({'error': f'Neplatná poloha: {e}'}), 400
         
-        # Store in Redis for real-time tracking
-        # redis_client.setex(f"location:{user_id}", 300, json.dumps(location_data))
+        error = record_ride_fixes(data.get('ride_id'), user_id, [fix])
+        if error:
+            return error
+        location_writer.add(user_id, [fix])
         
         return jsonify({'message': 'Poloha aktualizována'}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/users/<int:user_id>/location/batch', methods=['POST'])
+def update_user_location_batch(user_id):
+    """Delta-encoded batch of GPS fixes (format in location_ingest.py)"""
+    try:
+        data = request.get_json(silent=True) or {}
+        try:
+            fixes = decode_fixes(data.get('fixes'))
+        except ValueError as e:
+            return jsonify({'error': f'Neplatná dávka: {e}'}), 400
+        
+        error = record_ride_fixes(data.get('ride_id'), user_id, fixes)
+        if error:
+            return error
+        location_writer.add(user_id, fixes)
+        
+        return jsonify({'accepted': len(fixes)}), 202
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/rides/<int:ride_id>/track', methods=['GET'])
 def track_ride(ride_id):
-    """Real-time ride tracking"""
+    """Real-time ride tracking; ?since=<cursor> returns only newer points"""
     try:
         # Get ride participants
-        with db.session.begin():
-            ride = db.session.execute(db.text(
-                'SELECT driver_id FROM rides WHERE id = ?'
-            ), (ride_id,)).fetchone()
-            
-            if not ride:
-                return jsonify({'error': 'Jízda nenalezena'}), 404
-            
-            passengers = db.session.execute(db.text(
-                'SELECT passenger_id FROM bookings WHERE ride_id = ? AND status = "confirmed"'
-            ), (ride_id,)).fetchall()
+        participant_ids = ride_membership.participant_ids(ride_id)
+        if not participant_ids:
+            return jsonify({'error': 'Jízda nenalezena'}), 404
         
-        # Get current locations from Redis
-        locations = {}
-        participant_ids = [ride[0]] + [p[0] for p in passengers]
+        since = max(0, request.args.get('since', 0, type=int))
+        max_points = min(max(2, request.args.get('max_points', TRACK_MAX_POINTS, type=int)), TRACK_MAX_POINTS)
+        track = ride_tracker.snapshot(ride_id, participant_ids, since=since, max_points=max_points)
         
+        locations = {}
         for user_id in participant_ids:
-            # location_data = redis_client.get(f"location:{user_id}")
-            # if location_data:
-            #     locations[user_id] = json.loads(location_data)
-            pass
+            points = track['participants'].get(user_id)
+            if points:
+                latest = points[-1]
+                locations[user_id] = {
+                    'latitude': latest.lat,
+                    'longitude': latest.lng,
+                    'accuracy': latest.accuracy,
+                    'speed': latest.speed,
+                    'heading': latest.heading,
+                    'timestamp': latest.ts,
+                    'points': [[point.lat, point.lng, point.ts] for point in points]
+                }
+            elif since == 0 or track['reset']:
+                # Fixes received by another worker: at least the current position from the shared store
+                current = live_locations.get(user_id)
+                if current:
+                    locations[user_id] = {
+                        'latitude': current.lat,
+                        'longitude': current.lng,
+                        'timestamp': int(current.updated_at * 1000),
+                        'points': []
+                    }
         
-        return jsonify(locations), 200
+        return jsonify({'cursor': track['cursor'], 'reset': track['reset'], 'locations': locations}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
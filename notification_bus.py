@@ -0,0 +1,211 @@
+"""
+In-process publish/subscribe for user notifications.
+
+Every published event gets a process-wide increasing sequence number and
+is appended to a bounded per-user buffer. Subscribers keep their own
+cursor (the last sequence they have seen, sent back by EventSource as
+Last-Event-ID) and block on the user's channel until something newer
+arrives, so an idle client costs a sleeping thread and no database work.
+
+The bus lives in one process. With several worker processes an
+InboxRelay in each of them tails the shared notification_inbox table and
+republishes rows written by the other workers, so an SSE client gets every
+notification whichever worker it is connected to: rows from its own worker
+immediately, the rest within `poll_interval` seconds. The relay costs one
+indexed query per interval per process, independent of the number of
+connected clients.
+"""
+
+from __future__ import annotations
+
+import itertools
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+Event = Tuple[int, Dict[str, Any]]
+
+# (inbox row id, user id, message id, event)
+InboxRow = Tuple[int, Any, Any, Dict[str, Any]]
+
+DEFAULT_HISTORY_SIZE = 100
+DEFAULT_RELAY_POLL_SECONDS = 2.0
+DEFAULT_RELAY_SETTLE_SECONDS = 10.0
+
+
+class _Channel:
+    __slots__ = ('events', 'condition', 'subscribers')
+
+    def __init__(self, history_size: int, lock: threading.Lock):
+        self.events: Deque[Event] = deque(maxlen=history_size)
+        self.condition = threading.Condition(lock)
+        self.subscribers = 0
+
+
+class NotificationBus:
+    """Per-user event buffers with blocking reads from a cursor."""
+
+    def __init__(self, history_size: int = DEFAULT_HISTORY_SIZE):
+        self.history_size = history_size
+        self._lock = threading.Lock()
+        self._channels: Dict[Any, _Channel] = {}
+        # Seeded from the clock so cursors held by clients stay valid across restarts
+        self._sequence = itertools.count(int(time.time() * 1000))
+
+    def _channel(self, user_id) -> _Channel:
+        channel = self._channels.get(user_id)
+        if channel is None:
+            channel = self._channels[user_id] = _Channel(self.history_size, self._lock)
+        return channel
+
+    def publish(self, user_ids: Iterable, event: Dict[str, Any]) -> int:
+        """Appends `event` to each user's buffer and wakes their subscribers."""
+        with self._lock:
+            sequence = next(self._sequence)
+            for user_id in set(user_ids):
+                channel = self._channel(user_id)
+                channel.events.append((sequence, event))
+                channel.condition.notify_all()
+        return sequence
+
+    def latest(self, user_id) -> int:
+        """Cursor pointing at the newest event, for subscribers that want only new ones."""
+        with self._lock:
+            channel = self._channels.get(user_id)
+            if channel and channel.events:
+                return channel.events[-1][0]
+            return 0
+
+    def events_after(self, user_id, cursor: int) -> List[Event]:
+        with self._lock:
+            channel = self._channels.get(user_id)
+            return self._after(channel, cursor) if channel else []
+
+    @staticmethod
+    def _after(channel: _Channel, cursor: int) -> List[Event]:
+        if not channel.events or channel.events[-1][0] <= cursor:
+            return []
+        return [event for event in channel.events if event[0] > cursor]
+
+    def wait(self, user_id, cursor: int, timeout: Optional[float] = None) -> List[Event]:
+        """Events newer than `cursor`, blocking up to `timeout` seconds for the first one."""
+        with self._lock:
+            channel = self._channel(user_id)
+            channel.subscribers += 1
+            try:
+                channel.condition.wait_for(lambda: self._after(channel, cursor), timeout)
+                return self._after(channel, cursor)
+            finally:
+                channel.subscribers -= 1
+
+    def subscriber_count(self, user_id=None) -> int:
+        with self._lock:
+            if user_id is not None:
+                channel = self._channels.get(user_id)
+                return channel.subscribers if channel else 0
+            return sum(channel.subscribers for channel in self._channels.values())
+
+
+class InboxRelay:
+    """
+    Republishes inbox rows written by other processes into the local bus.
+
+    `fetch(after_id, limit)` returns InboxRow tuples with id > after_id in id
+    order and `latest_id()` the current maximum id; both run on the relay
+    thread. The send path calls `mark_published(message_id)` when it
+    publishes locally, and rows of that message are then skipped.
+
+    Row ids are assigned at INSERT but visible at COMMIT, so like
+    chat_gateway the relay keeps re-reading ids delivered within the last
+    `settle_seconds` and skips the ones it has already seen.
+    """
+
+    def __init__(self, bus: NotificationBus, fetch: Callable[[int, int], Sequence[InboxRow]],
+                 latest_id: Callable[[], int], poll_interval: float = DEFAULT_RELAY_POLL_SECONDS,
+                 settle_seconds: float = DEFAULT_RELAY_SETTLE_SECONDS, batch_size: int = 500,
+                 clock: Callable[[], float] = time.monotonic):
+        self.bus = bus
+        self._fetch = fetch
+        self._latest_id = latest_id
+        self.poll_interval = poll_interval
+        self.settle_seconds = settle_seconds
+        self.batch_size = batch_size
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._local: Dict[Any, float] = {}  # message id -> when it was published here
+        self._recent: Dict[int, float] = {}  # inbox id above floor_id -> first seen
+        self.floor_id: Optional[int] = None
+        self.stats = {'relayed': 0, 'skipped_local': 0}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def mark_published(self, message_id) -> None:
+        with self._lock:
+            self._local[message_id] = self._clock()
+
+    def poll_once(self) -> int:
+        """Publishes unseen rows from other processes; returns how many events were published."""
+        now = self._clock()
+        if self.floor_id is None:
+            self.floor_id = self._latest_id()
+        messages: Dict[Any, List] = {}
+        after_id = self.floor_id
+        while True:
+            rows = self._fetch(after_id, self.batch_size)
+            for row_id, user_id, message_id, event in rows:
+                if row_id in self._recent:
+                    continue
+                self._recent[row_id] = now
+                messages.setdefault(message_id, [event, set()])[1].add(user_id)
+            if len(rows) < self.batch_size:
+                break
+            after_id = rows[-1][0]
+
+        published = 0
+        with self._lock:
+            local = set(self._local)
+        for message_id, (event, user_ids) in messages.items():
+            if message_id in local:
+                self.stats['skipped_local'] += len(user_ids)
+                continue
+            self.bus.publish(user_ids, event)
+            self.stats['relayed'] += len(user_ids)
+            published += 1
+        self._settle(now)
+        return published
+
+    def _settle(self, now: float) -> None:
+        settled = {row_id for row_id, seen_at in self._recent.items() if now - seen_at >= self.settle_seconds}
+        if settled:
+            self.floor_id = max(self.floor_id, max(settled))
+            self._recent = {row_id: seen_at for row_id, seen_at in self._recent.items()
+                            if row_id > self.floor_id and row_id not in settled}
+        with self._lock:
+            # A local send's rows are visible well before this; keep its id a little longer than the look-back
+            self._local = {message_id: published_at for message_id, published_at in self._local.items()
+                           if now - published_at < 2 * self.settle_seconds}
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='notification-relay', daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:  # e.g. the table is missing before migrations; retry on the next interval
+                print(f"Notification relay poll failed: {e}")
+            self._stop.wait(self.poll_interval)
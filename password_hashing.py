@@ -0,0 +1,125 @@
+"""
+Password hashing off the request threads.
+
+bcrypt is deliberately slow (~250 ms at cost 12) and releases the GIL while it
+runs, so a burst of logins used to occupy every request thread with hashing
+and starve search traffic. PasswordHasher runs hashpw/checkpw on its own
+small thread pool: at most `threads` hashes run at once (leaving cores for
+the rest of the app), at most `max_pending` wait behind them, and anything
+beyond that is rejected with HashingOverloaded so the endpoint can answer 503
+instead of piling up requests.
+
+The cost factor is configurable. verify() also reports a replacement hash
+when the stored one was made with a different cost (or is a legacy unsalted
+SHA-256 hex digest from the old seed scripts), so the caller can upgrade it
+on a successful login.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+import bcrypt
+
+DEFAULT_ROUNDS = 12
+DEFAULT_MAX_PENDING = 64
+DEFAULT_TIMEOUT_SECONDS = 30.0
+
+_BCRYPT_HASH = re.compile(r'^\$2[aby]?\$(\d{2})\$')
+_SHA256_HEX = re.compile(r'^[0-9a-f]{64}$')
+
+
+class HashingOverloaded(Exception):
+    """Too many hashing requests are already queued."""
+
+
+def default_threads() -> int:
+    # Leave one core for request handling
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+def hash_cost(stored_hash: str) -> Optional[int]:
+    match = _BCRYPT_HASH.match(stored_hash or '')
+    return int(match.group(1)) if match else None
+
+
+class PasswordHasher:
+
+    def __init__(self, rounds: int = DEFAULT_ROUNDS, threads: Optional[int] = None,
+                 max_pending: int = DEFAULT_MAX_PENDING, timeout: float = DEFAULT_TIMEOUT_SECONDS):
+        if not 4 <= rounds <= 31:
+            raise ValueError("bcrypt rounds must be between 4 and 31")
+        self.rounds = rounds
+        self.threads = threads or default_threads()
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(self.threads + max_pending)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._counts = {'hashed': 0, 'verified': 0, 'rehashed': 0, 'rejected': 0}
+
+    def hash(self, password: str) -> str:
+        return self._submit(self._hash, password)
+
+    def verify(self, password: str, stored_hash: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """Returns (matches, new_hash); new_hash is set when the stored hash should be replaced."""
+        if not stored_hash:
+            return False, None
+        return self._submit(self._verify, password, stored_hash)
+
+    def needs_rehash(self, stored_hash: str) -> bool:
+        return hash_cost(stored_hash) != self.rounds
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts, rounds=self.rounds, threads=self.threads)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _submit(self, function, *args):
+        if not self._slots.acquire(blocking=False):
+            self._count('rejected')
+            raise HashingOverloaded()
+        try:
+            future = self._get_executor().submit(function, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result(timeout=self.timeout)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='bcrypt')
+            return self._executor
+
+    def _hash(self, password: str) -> str:
+        self._count('hashed')
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(self.rounds)).decode('utf-8')
+
+    def _verify(self, password: str, stored_hash: str) -> Tuple[bool, Optional[str]]:
+        self._count('verified')
+        if hash_cost(stored_hash) is not None:
+            matches = bcrypt.checkpw(password.encode('utf-8'), stored_hash.encode('utf-8'))
+        elif _SHA256_HEX.match(stored_hash):
+            matches = hmac.compare_digest(hashlib.sha256(password.encode('utf-8')).hexdigest(), stored_hash)
+        else:
+            return False, None
+        if not matches or not self.needs_rehash(stored_hash):
+            return matches, None
+        self._count('rehashed')
+        return True, self._hash(password)
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._counts[key] += 1
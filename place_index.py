@@ -0,0 +1,159 @@
+"""
+Autocomplete index over place names.
+
+Names are diacritics-folded once at load time (see geocoding.fold_text) and
+indexed two ways: a prefix trie over the whole name and each of its words
+("labem" finds "Ústí nad Labem"), and a trigram index for typos ("prga").
+A query collects a small shortlist from both and scores only those
+candidates, so the cost does not grow with the size of the place list.
+
+Run `python place_index.py` for a benchmark against a linear fuzzy scan.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import Counter
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from geocoding import Gazetteer, fold_text
+
+# Candidates taken from the trigram index per requested result
+SHORTLIST_FACTOR = 4
+MIN_SHORTLIST = 20
+
+# Same scoring as AdvancedSearchAPI: ratio + prefix and substring bonuses
+MATCH_THRESHOLD = 0.6
+STARTS_WITH_BONUS = 0.2
+CONTAINS_BONUS = 0.1
+
+
+def trigrams(folded: str) -> Set[str]:
+    padded = f"  {folded} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def score(folded_query: str, folded_name: str) -> float:
+    """Unclamped match score of two already folded strings."""
+    similarity = SequenceMatcher(None, folded_query, folded_name).ratio()
+    if folded_name.startswith(folded_query):
+        similarity += STARTS_WITH_BONUS
+    if folded_query in folded_name:
+        similarity += CONTAINS_BONUS
+    return similarity
+
+
+class _TrieNode:
+    __slots__ = ('children', 'ids')
+
+    def __init__(self):
+        self.children: Dict[str, _TrieNode] = {}
+        # Ids of every name with a word (or the full name) starting at this prefix, in rank order
+        self.ids: List[int] = []
+
+
+class PlaceIndex:
+    """Immutable prefix trie + trigram index over a ranked list of place names."""
+
+    def __init__(self, names: Iterable[str]):
+        self.names: List[str] = []
+        self.folded: List[str] = []
+        seen = set()
+        for name in names:
+            folded = fold_text(name)
+            if folded and folded not in seen:
+                seen.add(folded)
+                self.names.append(name)
+                self.folded.append(folded)
+
+        self._root = _TrieNode()
+        self._trigrams: Dict[str, List[int]] = {}
+        for place_id, folded in enumerate(self.folded):
+            words = folded.split(" ")
+            keys = {folded} | {" ".join(words[i:]) for i in range(1, len(words))}
+            for key in keys:
+                self._insert_prefixes(key, place_id)
+            for gram in trigrams(folded):
+                self._trigrams.setdefault(gram, []).append(place_id)
+
+    @classmethod
+    def from_gazetteer(cls, path=None) -> "PlaceIndex":
+        return cls(Gazetteer.load(path).places)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _insert_prefixes(self, key: str, place_id: int) -> None:
+        node = self._root
+        for ch in key:
+            node = node.children.setdefault(ch, _TrieNode())
+            if not node.ids or node.ids[-1] != place_id:
+                node.ids.append(place_id)
+
+    def prefix_ids(self, folded_prefix: str) -> List[int]:
+        node = self._root
+        for ch in folded_prefix:
+            node = node.children.get(ch)
+            if node is None:
+                return []
+        return node.ids
+
+    def trigram_ids(self, folded_query: str, count: int) -> List[int]:
+        """The `count` names sharing the most trigrams with the query."""
+        overlap = Counter()
+        for gram in trigrams(folded_query):
+            overlap.update(self._trigrams.get(gram, ()))
+        return [place_id for place_id, _ in overlap.most_common(count)]
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[str, float]]:
+        """(name, confidence) pairs, best first; confidence is clamped to 1.0."""
+        folded_query = fold_text(query)
+        if not folded_query or limit <= 0:
+            return []
+        shortlist_size = max(limit * SHORTLIST_FACTOR, MIN_SHORTLIST)
+        shortlist: Dict[int, None] = dict.fromkeys(self.prefix_ids(folded_query)[:shortlist_size])
+        shortlist.update(dict.fromkeys(self.trigram_ids(folded_query, shortlist_size)))
+
+        scored = []
+        for place_id in shortlist:
+            value = score(folded_query, self.folded[place_id])
+            if value >= MATCH_THRESHOLD:
+                scored.append((-min(1.0, value), place_id))
+        scored.sort()
+        return [(self.names[place_id], -negative) for negative, place_id in scored[:limit]]
+
+
+_default_index: Optional[PlaceIndex] = None
+_default_lock = threading.Lock()
+
+
+def get_place_index() -> PlaceIndex:
+    global _default_index
+    if _default_index is None:
+        with _default_lock:
+            if _default_index is None:
+                _default_index = PlaceIndex.from_gazetteer()
+    return _default_index
+
+
+if __name__ == "__main__":
+    import timeit
+
+    index = get_place_index()
+
+    def linear(query, limit=10):
+        folded_query = fold_text(query)
+        scored = [(min(1.0, value), name) for name, folded in zip(index.names, index.folded)
+                  if (value := score(folded_query, folded)) >= MATCH_THRESHOLD]
+        scored.sort(key=lambda item: -item[0])
+        return scored[:limit]
+
+    queries = ["pra", "brn", "ostrav", "plzen", "usti n", "labem", "hradec k", "prga", "ceske bu", "z"]
+    print(f"{len(index)} places")
+    print(f"{'query':>10} {'index us':>9} {'linear us':>10}  top results")
+    for query in queries:
+        index_us = timeit.timeit(lambda: index.search(query), number=200) / 200 * 1e6
+        linear_us = timeit.timeit(lambda: linear(query), number=20) / 20 * 1e6
+        top = ", ".join(f"{name} {confidence:.2f}" for name, confidence in index.search(query, 3))
+        print(f"{query:>10} {index_us:>9.0f} {linear_us:>10.0f}  {top}")
@@ -0,0 +1,243 @@
+"""
+Background Web Push dispatch from a persistent outbox.
+
+Request handlers only insert one `push_outbox` row per chat message (the
+recipient user ids and the JSON payload) inside their own transaction, so the
+cost of sending a message does not depend on how many recipients or devices
+there are. A dispatcher thread claims due outbox rows in batches, resolves the
+recipients' `push_subscription` rows with one query per batch, and hands the
+sends to a thread pool. Concurrency is limited per push service origin
+(fcm.googleapis.com, updates.push.services.mozilla.com, ...) so one slow
+service cannot hold all workers.
+
+Subscriptions answered with 404/410 are deleted. Other failures (5xx, 429,
+network errors) are retried with exponential backoff, only for the endpoints
+that failed, up to `max_attempts`.
+
+The sender is injectable: `sender(subscription_info, payload) -> status code`.
+The default uses pywebpush (optional dependency, imported on first send);
+`http_sender` posts the payload unencrypted and is meant for a local HTTP
+stand-in of the push service in tests.
+"""
+
+from __future__ import annotations
+
+import datetime
+import json
+import threading
+import traceback
+import urllib.error
+import urllib.request
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+
+from sqlalchemy import bindparam, text
+
+Sender = Callable[[dict, str], int]
+
+GONE_STATUSES = (404, 410)
+
+_CLAIM = text("UPDATE push_outbox SET available_at = :lease WHERE id = :id AND available_at <= :now")
+_DUE = text("SELECT id FROM push_outbox WHERE available_at <= :now ORDER BY available_at, id LIMIT :limit")
+_LOAD = text("SELECT id, user_ids, endpoints, payload, attempts FROM push_outbox WHERE id IN :ids"
+             ).bindparams(bindparam('ids', expanding=True))
+_SUBSCRIPTIONS = text("SELECT user_id, endpoint, p256dh, auth FROM push_subscription WHERE user_id IN :user_ids"
+                      ).bindparams(bindparam('user_ids', expanding=True))
+_DELETE_ROWS = text("DELETE FROM push_outbox WHERE id IN :ids").bindparams(bindparam('ids', expanding=True))
+_DELETE_GONE = text("DELETE FROM push_subscription WHERE endpoint IN :endpoints"
+                    ).bindparams(bindparam('endpoints', expanding=True))
+_INSERT = text("INSERT INTO push_outbox (user_ids, endpoints, payload, attempts, available_at, created_at)"
+               " VALUES (:user_ids, :endpoints, :payload, :attempts, :available_at, :created_at)")
+
+
+def enqueue(connection, user_ids: Iterable[int], payload: dict, now: Optional[datetime.datetime] = None) -> None:
+    """Inserts an outbox row using the caller's session/connection (same transaction)."""
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return
+    now = now or datetime.datetime.now()
+    connection.execute(_INSERT, {'user_ids': json.dumps(user_ids), 'endpoints': None, 'payload': json.dumps(payload),
+                                 'attempts': 0, 'available_at': now, 'created_at': now})
+
+
+def webpush_sender(vapid_private_key: str, vapid_claims: dict, ttl: int = 3600) -> Sender:
+    def send(subscription_info: dict, payload: str) -> int:
+        from pywebpush import WebPushException, webpush
+        try:
+            response = webpush(subscription_info=subscription_info, data=payload, vapid_private_key=vapid_private_key,
+                               vapid_claims=dict(vapid_claims), ttl=ttl)
+        except WebPushException as e:
+            response = getattr(e, 'response', None)
+            if response is None:
+                raise
+        return response.status_code
+    return send
+
+
+def http_sender(timeout: float = 10.0) -> Sender:
+    def send(subscription_info: dict, payload: str) -> int:
+        request = urllib.request.Request(subscription_info['endpoint'], data=payload.encode('utf-8'), method='POST',
+                                         headers={'Content-Type': 'application/json', 'TTL': '3600'})
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+    return send
+
+
+class PushDispatcher:
+    def __init__(self, engine, sender: Sender, workers: int = 8, per_origin_limit: int = 4, batch_size: int = 100,
+                 poll_interval: float = 5.0, max_attempts: int = 5, retry_base_seconds: float = 30.0,
+                 lease_seconds: float = 300.0):
+        self.engine = engine
+        self.sender = sender
+        self.workers = workers
+        self.per_origin_limit = per_origin_limit
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.lease_seconds = lease_seconds
+        self.stats = {'sent': 0, 'failed': 0, 'pruned': 0, 'dropped': 0}
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._start_lock = threading.Lock()
+
+    # --- lifecycle ---------------------------------------------------------
+
+    def start(self) -> None:
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='push-send')
+            self._thread = threading.Thread(target=self._run, name='push-dispatcher', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def wake(self) -> None:
+        """Called after a transaction that enqueued pushes has committed."""
+        self.start()
+        self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                while self.drain_once() and not self._stopping.is_set():
+                    pass
+            except Exception:
+                traceback.print_exc()
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    # --- one batch ---------------------------------------------------------
+
+    def drain_once(self, now: Optional[datetime.datetime] = None) -> int:
+        """Claims and sends one batch of due outbox rows; returns how many rows were claimed."""
+        now = now or datetime.datetime.now()
+        rows = self._claim(now)
+        if not rows:
+            return 0
+
+        user_ids = sorted({uid for row in rows for uid in json.loads(row[1])})
+        with self.engine.begin() as connection:
+            subscriptions = connection.execute(_SUBSCRIPTIONS, {'user_ids': user_ids}).fetchall()
+        by_user: Dict[int, List[dict]] = {}
+        for user_id, endpoint, p256dh, auth in subscriptions:
+            by_user.setdefault(user_id, []).append({'endpoint': endpoint, 'keys': {'p256dh': p256dh, 'auth': auth}})
+
+        jobs = []
+        for outbox_id, row_user_ids, endpoints, payload, attempts in rows:
+            only = set(json.loads(endpoints)) if endpoints else None
+            for user_id in json.loads(row_user_ids):
+                for subscription in by_user.get(user_id, ()):
+                    if only is None or subscription['endpoint'] in only:
+                        jobs.append((outbox_id, user_id, subscription, payload))
+
+        gone: List[str] = []
+        failed: Dict[int, dict] = {}
+        for (outbox_id, user_id, subscription, _), status in zip(jobs, self._send_all(jobs)):
+            if status is not None and 200 <= status < 300:
+                self.stats['sent'] += 1
+            elif status in GONE_STATUSES:
+                gone.append(subscription['endpoint'])
+            else:
+                self.stats['failed'] += 1
+                retry = failed.setdefault(outbox_id, {'user_ids': set(), 'endpoints': set()})
+                retry['user_ids'].add(user_id)
+                retry['endpoints'].add(subscription['endpoint'])
+
+        retries = []
+        for outbox_id, row_user_ids, endpoints, payload, attempts in rows:
+            if outbox_id not in failed:
+                continue
+            if attempts + 1 >= self.max_attempts:
+                self.stats['dropped'] += 1
+                continue
+            delay = datetime.timedelta(seconds=self.retry_base_seconds * 2 ** attempts)
+            retries.append({'user_ids': json.dumps(sorted(failed[outbox_id]['user_ids'])),
+                            'endpoints': json.dumps(sorted(failed[outbox_id]['endpoints'])),
+                            'payload': payload, 'attempts': attempts + 1,
+                            'available_at': now + delay, 'created_at': now})
+
+        with self.engine.begin() as connection:
+            connection.execute(_DELETE_ROWS, {'ids': [row[0] for row in rows]})
+            if gone:
+                connection.execute(_DELETE_GONE, {'endpoints': sorted(set(gone))})
+            if retries:
+                connection.execute(_INSERT, retries)
+        self.stats['pruned'] += len(set(gone))
+        return len(rows)
+
+    def _claim(self, now: datetime.datetime):
+        lease = now + datetime.timedelta(seconds=self.lease_seconds)
+        with self.engine.begin() as connection:
+            due = [row[0] for row in connection.execute(_DUE, {'now': now, 'limit': self.batch_size})]
+            # Leasing row by row keeps two dispatchers (e.g. several app processes) from sending the same row
+            claimed = [outbox_id for outbox_id in due
+                       if connection.execute(_CLAIM, {'lease': lease, 'id': outbox_id, 'now': now}).rowcount == 1]
+            if not claimed:
+                return []
+            return connection.execute(_LOAD, {'ids': claimed}).fetchall()
+
+    def _send_all(self, jobs) -> List[Optional[int]]:
+        """Sends all jobs, at most `per_origin_limit` at a time per push service; None marks an error."""
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='push-send')
+        statuses: List[Optional[int]] = [None] * len(jobs)
+        queues: Dict[str, deque] = {}
+        for index, job in enumerate(jobs):
+            queues.setdefault(urlsplit(job[2]['endpoint']).netloc, deque()).append(index)
+
+        def drain(queue: deque) -> None:
+            # Each runner takes the next send for its origin, so waiting never blocks a pool thread
+            while True:
+                try:
+                    index = queue.popleft()
+                except IndexError:
+                    return
+                subscription, payload = jobs[index][2], jobs[index][3]
+                try:
+                    statuses[index] = self.sender(subscription, payload)
+                except Exception as e:
+                    print(f"Push to {subscription['endpoint']} failed: {e}")
+
+        runners = [self._pool.submit(drain, queue)
+                   for queue in queues.values() for _ in range(min(self.per_origin_limit, len(queue)))]
+        for runner in runners:
+            runner.result()
+        return statuses
@@ -0,0 +1,67 @@
+"""
+Per-user rating aggregates.
+
+`rating_aggregates` keeps a running sum and count of the ratings each user
+has received. create_rating adds to them with one upsert in the same
+transaction as the INSERT into ratings and copies the resulting score to
+`users.rating`, so the cost of a new rating no longer depends on how many
+ratings the user already has (previously AVG over all of them).
+
+The score is Bayesian-smoothed towards `prior_mean` with the weight of
+`prior_weight` virtual ratings:
+
+    score = (prior_weight * prior_mean + rating_sum) / (prior_weight + rating_count)
+
+With prior_weight = 0 (the default) this is the plain average, as before.
+A few ratings then move a new user's score less than they would move a plain
+average.
+
+`backfill` rebuilds the table from `ratings` in set-based statements.
+"""
+
+from __future__ import annotations
+
+import datetime
+from typing import Optional
+
+from sqlalchemy import text
+
+DEFAULT_PRIOR_MEAN = 5.0
+DEFAULT_PRIOR_WEIGHT = 0.0
+
+# ON CONFLICT upsert: SQLite >= 3.24, PostgreSQL >= 9.5
+_RECORD = text("INSERT INTO rating_aggregates (user_id, rating_sum, rating_count, updated_at) "
+               "VALUES (:user_id, :rating, 1, :now) "
+               "ON CONFLICT (user_id) DO UPDATE SET rating_sum = rating_aggregates.rating_sum + excluded.rating_sum, "
+               "rating_count = rating_aggregates.rating_count + 1, updated_at = excluded.updated_at")
+_SCORE_SQL = "(:prior_weight * :prior_mean + a.rating_sum) / (:prior_weight + a.rating_count)"
+_COPY_SCORE = text(f"UPDATE users SET rating = (SELECT {_SCORE_SQL} FROM rating_aggregates a WHERE a.user_id = users.id) "
+                   "WHERE id = :user_id")
+_CLEAR = text("DELETE FROM rating_aggregates")
+_REBUILD = text("INSERT INTO rating_aggregates (user_id, rating_sum, rating_count, updated_at) "
+                "SELECT rated_id, SUM(rating), COUNT(*), :now FROM ratings "
+                "WHERE rated_id IN (SELECT id FROM users) GROUP BY rated_id")
+_COPY_ALL_SCORES = text(f"UPDATE users SET rating = (SELECT {_SCORE_SQL} FROM rating_aggregates a WHERE a.user_id = users.id) "
+                        "WHERE id IN (SELECT user_id FROM rating_aggregates)")
+
+
+def score(rating_sum: float, rating_count: int, prior_weight: float = DEFAULT_PRIOR_WEIGHT,
+          prior_mean: float = DEFAULT_PRIOR_MEAN) -> Optional[float]:
+    if prior_weight + rating_count <= 0:
+        return None
+    return (prior_weight * prior_mean + rating_sum) / (prior_weight + rating_count)
+
+
+def record_rating(session, user_id: int, rating: int, prior_weight: float = DEFAULT_PRIOR_WEIGHT,
+                  prior_mean: float = DEFAULT_PRIOR_MEAN) -> None:
+    """Adds one rating to the user's aggregate and refreshes users.rating. Runs in the caller's transaction."""
+    session.execute(_RECORD, {'user_id': user_id, 'rating': rating, 'now': datetime.datetime.now()})
+    session.execute(_COPY_SCORE, {'user_id': user_id, 'prior_weight': float(prior_weight), 'prior_mean': float(prior_mean)})
+
+
+def backfill(session, prior_weight: float = DEFAULT_PRIOR_WEIGHT, prior_mean: float = DEFAULT_PRIOR_MEAN) -> int:
+    """Recomputes every aggregate from ratings and users.rating from them; returns the number of users rated."""
+    session.execute(_CLEAR)
+    rebuilt = session.execute(_REBUILD, {'now': datetime.datetime.now()}).rowcount
+    session.execute(_COPY_ALL_SCORES, {'prior_weight': float(prior_weight), 'prior_mean': float(prior_mean)})
+    return rebuilt
@@ -0,0 +1,108 @@
+"""
+Cache of ride membership: ride -> (driver id, confirmed passenger ids).
+
+Entries are loaded on a miss through a loader callback supplied by the app
+(each app has its own schema), kept in a bounded LRU map with a TTL, and
+updated in place by the reservation/ride handlers after they commit. The TTL
+bounds staleness from writers that do not go through this cache (other
+processes, scripts).
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Callable, Dict, FrozenSet, Hashable, Iterable, Optional, Tuple
+
+from ttl_cache import TTLCache
+
+Participants = Tuple[Hashable, FrozenSet[Hashable]]
+
+DEFAULT_MAX_ENTRIES = 10_000
+DEFAULT_TTL_SECONDS = 300.0
+
+
+class RideMembershipCache:
+    """
+    `load_ride(ride_id)` returns (driver_id, iterable of passenger ids) or
+    None if the ride does not exist. It is called without the cache lock held.
+    """
+
+    def __init__(self, load_ride: Callable[[Hashable], Optional[Tuple[Hashable, Iterable[Hashable]]]],
+                 max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self._load_ride = load_ride
+        self._clock = clock
+        self._rides = TTLCache(max_entries, ttl)
+        self._lock = threading.Lock()
+        # Bumped by every write; a load started before a write is not cached
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+
+    # --- reads -------------------------------------------------------------
+
+    def participants(self, ride_id) -> Optional[Participants]:
+        """(driver_id, frozenset of confirmed passenger ids), or None if no such ride."""
+        with self._lock:
+            cached = self._rides.get(ride_id, self._clock())
+            if cached is not None:
+                self.hits += 1
+                return cached
+            self.misses += 1
+            version = self._version
+        loaded = self._load_ride(ride_id)
+        if loaded is None:
+            return None
+        value = (loaded[0], frozenset(loaded[1]))
+        with self._lock:
+            if version == self._version:
+                self._rides.put(ride_id, value, self._clock())
+        return value
+
+    def participant_ids(self, ride_id) -> list:
+        """Driver first, then passengers; empty for an unknown ride."""
+        members = self.participants(ride_id)
+        if members is None:
+            return []
+        driver_id, passengers = members
+        return [driver_id] + sorted(passenger for passenger in passengers if passenger != driver_id)
+
+    # --- writes (call after the database transaction has committed) -------
+
+    def add_ride(self, ride_id, driver_id) -> None:
+        with self._lock:
+            self._version += 1
+            self._rides.put(ride_id, (driver_id, frozenset()), self._clock())
+
+    def add_passenger(self, ride_id, user_id) -> None:
+        with self._lock:
+            self._version += 1
+            cached = self._rides.peek(ride_id)
+            if cached is not None:
+                self._rides.replace(ride_id, (cached[0], cached[1] | {user_id}))
+
+    def invalidate_reservation(self, ride_id, user_id) -> None:
+        """A reservation was cancelled; the user may still hold another seat, so reload the ride."""
+        with self._lock:
+            self._version += 1
+            self._rides.pop(ride_id)
+
+    def remove_ride(self, ride_id) -> None:
+        with self._lock:
+            self._version += 1
+            self._rides.pop(ride_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._version += 1
+            self._rides.data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'rides': len(self._rides.data),
+                'evictions': self._rides.evictions,
+            }
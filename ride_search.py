@@ -0,0 +1,113 @@
+"""
+Full-text search over ride locations.
+
+The migration `b6f3e1d9a2c4` creates the index for the current database:
+- SQLite: an external-content FTS5 table `rides_fts` (unicode61 tokenizer
+  with remove_diacritics 2) kept in sync with `rides` by triggers.
+- PostgreSQL: a `rides.search_vector` tsvector column filled by a trigger
+  from unaccent()-ed locations (from_location weighted A, to_location B)
+  with a GIN index.
+
+Both backends do accent- and case-insensitive word-prefix matching, so
+"ceske bud" finds "České Budějovice". Without the migration the callers
+fall back to the old LIKE scan.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Callable, Dict, List, Optional
+
+from geocoding import fold_text
+
+FTS5 = 'fts5'
+TSVECTOR = 'tsvector'
+LIKE = 'like'
+
+# Column -> tsvector weight label used by the Postgres trigger
+TSVECTOR_WEIGHTS = {'from_location': 'A', 'to_location': 'B'}
+
+_DETECT_SQL = {
+    'sqlite': "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rides_fts'",
+    'postgresql': "SELECT 1 FROM information_schema.columns WHERE table_name = 'rides' AND column_name = 'search_vector'",
+}
+
+
+def detect_backend(dialect: str, fetch_one: Callable[[str], object]) -> str:
+    """
+    Which backend the database supports. `fetch_one(sql)` runs a query and
+    returns its first row (or None).
+    """
+    sql = _DETECT_SQL.get(dialect)
+    if sql is None:
+        return LIKE
+    if fetch_one(sql) is None:
+        return LIKE
+    return FTS5 if dialect == 'sqlite' else TSVECTOR
+
+
+def search_tokens(text: Optional[str]) -> List[str]:
+    """Folded word tokens of a user query."""
+    return re.findall(r'\w+', fold_text(text or ''))
+
+
+def fts5_query(terms: Dict[Optional[str], str]) -> Optional[str]:
+    """
+    FTS5 MATCH expression for {column: text}; the None key matches any
+    column. All tokens must match, each as a word prefix.
+    """
+    parts = []
+    for column, text in terms.items():
+        tokens = search_tokens(text)
+        if not tokens:
+            continue
+        phrase = ' '.join('"%s"*' % token.replace('"', '""') for token in tokens)
+        parts.append(f'{column} : ({phrase})' if column else f'({phrase})')
+    return ' AND '.join(parts) or None
+
+
+def tsquery(terms: Dict[Optional[str], str]) -> Optional[str]:
+    """to_tsquery('simple', ...) text for {column: text}; the None key matches any column."""
+    parts = []
+    for column, text in terms.items():
+        weight = TSVECTOR_WEIGHTS.get(column, '') if column else ''
+        parts.extend(f'{token}:*{weight}' for token in search_tokens(text))
+    return ' & '.join(parts) or None
+
+
+def ride_text_condition(backend: str, terms: Dict[Optional[str], str], params: dict,
+                        alias: str = 'r', placeholder: Callable[[str], str] = lambda name: f':{name}') -> Optional[str]:
+    """
+    SQL condition restricting `alias` (the rides table) to rows matching
+    `terms`, adding its bind values to `params`. `placeholder` renders a
+    parameter reference (":name" for SQLAlchemy text, "?" for sqlite3 with a
+    list of params). Returns None when there is nothing to match on.
+    """
+    def bind(name, value):
+        if isinstance(params, list):
+            params.append(value)
+        else:
+            params[name] = value
+        return placeholder(name)
+
+    if backend == FTS5:
+        expression = fts5_query(terms)
+        if expression is None:
+            return None
+        return f"{alias}.id IN (SELECT rowid FROM rides_fts WHERE rides_fts MATCH {bind('fts_query', expression)})"
+    if backend == TSVECTOR:
+        expression = tsquery(terms)
+        if expression is None:
+            return None
+        return f"{alias}.search_vector @@ to_tsquery('simple', {bind('fts_query', expression)})"
+
+    conditions = []
+    for column, text in terms.items():
+        if not text or not text.strip():
+            continue
+        if column:
+            conditions.append(f"{alias}.{column} LIKE {bind(column, f'%{text}%')}")
+        else:
+            conditions.append(f"({alias}.from_location LIKE {bind('from_any', f'%{text}%')}"
+                              f" OR {alias}.to_location LIKE {bind('to_any', f'%{text}%')})")
+    return ' AND '.join(conditions) or None
@@ -0,0 +1,164 @@
+"""
+In-process live tracking of rides.
+
+Replaces the Redis reads that track_ride had commented out. Every tracked
+ride keeps one fixed-size ring buffer (deque with maxlen) of recent GPS
+points per participant, so memory is bounded by
+
+    max_rides x max_participants x buffer_length points.
+
+Rides are kept in LRU order of their last update; the least recently updated
+ride is dropped when `max_rides` is exceeded, and rides idle for longer than
+`idle_ttl` are dropped on the next write.
+
+Every point gets a per-ride sequence number. A client polls with the
+`cursor` of its previous response and receives only newer points, so steady
+polling costs O(new points); `reset` in the response tells it to start over
+when the cursor no longer matches (process restart, evicted ride). Full
+histories of long rides are downsampled to at most `max_points` per
+participant (Douglas-Peucker via route_corridor.simplify, then an even
+stride), always keeping the newest point.
+
+The state is per process; with several workers each one tracks the fixes it
+received, and the endpoint falls back to the shared live-location store for
+the current position.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, Hashable, Iterable, List, NamedTuple, Optional, Sequence
+
+from route_corridor import simplify
+
+DEFAULT_MAX_RIDES = 1000
+DEFAULT_MAX_PARTICIPANTS = 9
+DEFAULT_BUFFER_LENGTH = 720  # 12 minutes at 1 fix/s
+DEFAULT_IDLE_TTL_SECONDS = 3600.0
+DEFAULT_TOLERANCE_KM = 0.01
+
+
+class TrackPoint(NamedTuple):
+    seq: int
+    lat: float
+    lng: float
+    ts: int  # client time, ms since epoch
+    accuracy: Optional[float] = None
+    speed: Optional[float] = None
+    heading: Optional[float] = None
+
+
+class _Ride:
+    __slots__ = ('seq', 'participants', 'updated_at')
+
+    def __init__(self):
+        self.seq = 0
+        self.participants: Dict[Hashable, Deque[TrackPoint]] = {}
+        self.updated_at = 0.0
+
+
+def downsample(points: Sequence[TrackPoint], max_points: int, tolerance_km: float = DEFAULT_TOLERANCE_KM) -> List[TrackPoint]:
+    """At most max_points of the polyline, keeping its shape and the first and last point."""
+    if len(points) <= max_points:
+        return list(points)
+    if max_points < 2:
+        return list(points[-max_points:]) if max_points > 0 else []
+    positions = [(point.lat, point.lng) for point in points]
+    # simplify returns the kept input tuples themselves, in order
+    by_identity = {id(position): point for position, point in zip(positions, points)}
+    simplified = [by_identity[id(position)] for position in simplify(positions, tolerance_km)]
+    if len(simplified) <= max_points:
+        return simplified
+    step = (len(simplified) - 1) / (max_points - 1)
+    return [simplified[round(i * step)] for i in range(max_points)]
+
+
+class RideTracker:
+
+    def __init__(self, max_rides: int = DEFAULT_MAX_RIDES, max_participants: int = DEFAULT_MAX_PARTICIPANTS,
+                 buffer_length: int = DEFAULT_BUFFER_LENGTH, idle_ttl: float = DEFAULT_IDLE_TTL_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_rides = max_rides
+        self.max_participants = max_participants
+        self.buffer_length = buffer_length
+        self.idle_ttl = idle_ttl
+        self._clock = clock
+        self._rides: "OrderedDict[Hashable, _Ride]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def record(self, ride_id: Hashable, user_id: Hashable, fixes: Iterable) -> bool:
+        """Appends fixes (location_ingest.Fix) in ts order; returns False if the ride already has max_participants."""
+        now = self._clock()
+        with self._lock:
+            ride = self._rides.get(ride_id)
+            if ride is None:
+                ride = self._rides[ride_id] = _Ride()
+            self._rides.move_to_end(ride_id)
+            ride.updated_at = now
+            buffer = ride.participants.get(user_id)
+            if buffer is None:
+                if len(ride.participants) >= self.max_participants:
+                    return False
+                buffer = ride.participants[user_id] = deque(maxlen=self.buffer_length)
+            last_ts = buffer[-1].ts if buffer else None
+            for fix in sorted(fixes, key=lambda fix: fix.ts):
+                # Duplicates and fixes older than what we have would fold the polyline back
+                if last_ts is not None and fix.ts <= last_ts:
+                    continue
+                ride.seq += 1
+                buffer.append(TrackPoint(ride.seq, fix.lat, fix.lng, fix.ts, fix.accuracy, fix.speed, fix.heading))
+                last_ts = fix.ts
+            self._evict(now)
+        return True
+
+    def snapshot(self, ride_id: Hashable, participant_ids: Optional[Iterable[Hashable]] = None, since: int = 0,
+                 max_points: Optional[int] = None, tolerance_km: float = DEFAULT_TOLERANCE_KM) -> Dict:
+        """{'cursor': seq, 'reset': bool, 'participants': {user_id: [TrackPoint, ...]}} with points newer than `since`.
+
+        `reset` is set when `since` is ahead of the ride (the process restarted or
+        the ride was evicted); the points are then the full buffer and replace
+        whatever the client has."""
+        with self._lock:
+            ride = self._rides.get(ride_id)
+            if ride is None:
+                return {'cursor': 0, 'reset': since > 0, 'participants': {}}
+            reset = since > ride.seq
+            if reset:
+                since = 0
+            wanted = ride.participants if participant_ids is None else set(participant_ids)
+            copied = {}
+            for user_id, buffer in ride.participants.items():
+                if user_id not in wanted:
+                    continue
+                newer = []
+                for point in reversed(buffer):
+                    if point.seq <= since:
+                        break
+                    newer.append(point)
+                if newer:
+                    copied[user_id] = newer[::-1]
+            cursor = ride.seq
+        if max_points is not None:
+            copied = {user_id: downsample(points, max_points, tolerance_km) for user_id, points in copied.items()}
+        return {'cursor': cursor, 'reset': reset, 'participants': copied}
+
+    def end_ride(self, ride_id: Hashable) -> None:
+        with self._lock:
+            self._rides.pop(ride_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'rides': len(self._rides),
+                    'points': sum(len(buffer) for ride in self._rides.values() for buffer in ride.participants.values()),
+                    'evictions': self.evictions}
+
+    def _evict(self, now: float) -> None:
+        while self._rides:
+            ride_id, ride = next(iter(self._rides.items()))
+            if len(self._rides) <= self.max_rides and now - ride.updated_at <= self.idle_ttl:
+                break
+            del self._rides[ride_id]
+            self.evictions += 1
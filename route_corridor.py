@@ -0,0 +1,314 @@
+"""
+Route corridor index: finds rides whose route passes near a passenger's
+pickup and drop-off, in that order.
+
+Each ride's route (origin + route_waypoints + destination) is simplified
+with Douglas-Peucker and rasterized into the set of grid cells lying within
+the corridor width of the route. An inverted index maps cell -> rides, so a
+query only touches the rides covering the pickup and drop-off cells; the
+exact point-to-polyline check runs on those few candidates only.
+
+Run `python route_corridor.py` for a benchmark against a per-ride scan.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import threading
+from collections import defaultdict
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE_LAT = math.pi * EARTH_RADIUS_KM / 180.0
+
+DEFAULT_CELL_SIZE_DEG = 0.05
+DEFAULT_CORRIDOR_KM = 5.0
+DEFAULT_SIMPLIFY_KM = 0.5
+
+Point = Tuple[float, float]
+
+
+def parse_waypoints(raw) -> List[Point]:
+    """Reads route_waypoints (JSON text or list) as [(lat, lng), ...]."""
+    if not raw:
+        return []
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except ValueError:
+            return []
+    points = []
+    for item in raw if isinstance(raw, list) else []:
+        try:
+            if isinstance(item, dict):
+                lat = item.get('lat', item.get('latitude'))
+                lng = item.get('lng', item.get('lon', item.get('longitude')))
+            else:
+                lat, lng = item[0], item[1]
+            points.append((float(lat), float(lng)))
+        except (TypeError, ValueError, IndexError, KeyError):
+            continue
+    return points
+
+
+def build_route(origin: Optional[Point], waypoints: Iterable[Point], destination: Optional[Point]) -> List[Point]:
+    route = [origin] if origin else []
+    route.extend(waypoints)
+    if destination:
+        route.append(destination)
+    return route
+
+
+def _to_km(point: Point, cos_lat: float) -> Tuple[float, float]:
+    """Local equirectangular projection; accurate over a few hundred km."""
+    return point[1] * cos_lat * KM_PER_DEGREE_LAT, point[0] * KM_PER_DEGREE_LAT
+
+
+def _project(p, a, b) -> Tuple[float, float]:
+    """(distance from p to segment ab, fraction along ab) in projected km."""
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    length_sq = dx * dx + dy * dy
+    t = 0.0 if length_sq == 0 else max(0.0, min(1.0, ((p[0] - a[0]) * dx + (p[1] - a[1]) * dy) / length_sq))
+    return math.hypot(p[0] - a[0] - t * dx, p[1] - a[1] - t * dy), t
+
+
+def simplify(points: Sequence[Point], tolerance_km: float) -> List[Point]:
+    """Douglas-Peucker simplification keeping every point needed within `tolerance_km`."""
+    if len(points) < 3:
+        return list(points)
+    cos_lat = math.cos(math.radians(sum(lat for lat, _ in points) / len(points)))
+    projected = [_to_km(point, cos_lat) for point in points]
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        worst, worst_index = tolerance_km, None
+        for i in range(first + 1, last):
+            distance, _ = _project(projected[i], projected[first], projected[last])
+            if distance > worst:
+                worst, worst_index = distance, i
+        if worst_index is not None:
+            keep[worst_index] = True
+            stack.append((first, worst_index))
+            stack.append((worst_index, last))
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+class _Route:
+    __slots__ = ('points', 'projected', 'offsets', 'cos_lat')
+
+    def __init__(self, points: List[Point]):
+        self.points = points
+        self.cos_lat = math.cos(math.radians(sum(lat for lat, _ in points) / len(points)))
+        self.projected = [_to_km(point, self.cos_lat) for point in points]
+        # Distance along the route (km) at each vertex
+        self.offsets = [0.0]
+        for a, b in zip(self.projected, self.projected[1:]):
+            self.offsets.append(self.offsets[-1] + math.hypot(b[0] - a[0], b[1] - a[1]))
+
+    def locate(self, point: Point, corridor_km: float) -> Optional[Tuple[float, float, float]]:
+        """(earliest, latest position along route, min distance) of `point`, or None if outside."""
+        p = _to_km(point, self.cos_lat)
+        earliest = latest = best = None
+        for k in range(len(self.projected) - 1):
+            distance, t = _project(p, self.projected[k], self.projected[k + 1])
+            if distance > corridor_km:
+                continue
+            position = self.offsets[k] + t * (self.offsets[k + 1] - self.offsets[k])
+            earliest = position if earliest is None else min(earliest, position)
+            latest = position if latest is None else max(latest, position)
+            best = distance if best is None else min(best, distance)
+        if best is None:
+            return None
+        return earliest, latest, best
+
+
+class CorridorIndex:
+    """Thread-safe inverted index of grid cell -> rides whose corridor covers it."""
+
+    def __init__(self, cell_size_deg: float = DEFAULT_CELL_SIZE_DEG, corridor_km: float = DEFAULT_CORRIDOR_KM,
+                 simplify_km: float = DEFAULT_SIMPLIFY_KM):
+        self.cell_size = cell_size_deg
+        self.corridor_km = corridor_km
+        self.simplify_km = simplify_km
+        # Sample spacing along segments when rasterizing
+        self._step_km = cell_size_deg * KM_PER_DEGREE_LAT
+        # cell -> ride -> (min, max) route position of the samples covering the cell
+        self._cells: Dict[Tuple[int, int], Dict[Hashable, Tuple[float, float]]] = defaultdict(dict)
+        self._routes: Dict[Hashable, _Route] = {}
+        self._coverage: Dict[Hashable, List[Tuple[int, int]]] = {}
+        self._lock = threading.RLock()
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.cell_size), math.floor(lng / self.cell_size))
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._routes
+
+    def route(self, key: Hashable) -> Optional[List[Point]]:
+        """Simplified polyline stored for a ride."""
+        route = self._routes.get(key)
+        return list(route.points) if route else None
+
+    def _rasterize(self, route: _Route) -> Dict[Tuple[int, int], Tuple[float, float]]:
+        reach_km = self.corridor_km + self._step_km / 2.0
+        lat_span = reach_km / KM_PER_DEGREE_LAT
+        covered: Dict[Tuple[int, int], Tuple[float, float]] = {}
+        for k in range(len(route.points) - 1):
+            (lat1, lng1), (lat2, lng2) = route.points[k], route.points[k + 1]
+            start, end = route.offsets[k], route.offsets[k + 1]
+            samples = max(1, math.ceil((end - start) / self._step_km))
+            for s in range(samples + 1):
+                t = s / samples
+                lat = lat1 + t * (lat2 - lat1)
+                lng = lng1 + t * (lng2 - lng1)
+                position = start + t * (end - start)
+                lng_span = lat_span / max(math.cos(math.radians(min(abs(lat) + lat_span, 89.9))), 1e-6)
+                min_row, min_col = self._cell(lat - lat_span, lng - lng_span)
+                max_row, max_col = self._cell(lat + lat_span, lng + lng_span)
+                for row in range(min_row, max_row + 1):
+                    for col in range(min_col, max_col + 1):
+                        low_high = covered.get((row, col))
+                        if low_high is None:
+                            covered[(row, col)] = (position, position)
+                        elif position < low_high[0] or position > low_high[1]:
+                            covered[(row, col)] = (min(low_high[0], position), max(low_high[1], position))
+        return covered
+
+    def insert(self, key: Hashable, polyline: Sequence[Point]) -> bool:
+        """Indexes a ride route; returns False if it has fewer than two points."""
+        points = [(float(lat), float(lng)) for lat, lng in polyline]
+        points = [p for i, p in enumerate(points) if i == 0 or p != points[i - 1]]
+        if len(points) < 2:
+            self.remove(key)
+            return False
+        route = _Route(simplify(points, self.simplify_km))
+        covered = self._rasterize(route)
+        with self._lock:
+            self._discard(key)
+            self._routes[key] = route
+            self._coverage[key] = list(covered)
+            for cell, positions in covered.items():
+                self._cells[cell][key] = positions
+        return True
+
+    def remove(self, key: Hashable) -> None:
+        with self._lock:
+            self._discard(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cells.clear()
+            self._routes.clear()
+            self._coverage.clear()
+
+    def _discard(self, key: Hashable) -> None:
+        self._routes.pop(key, None)
+        for cell in self._coverage.pop(key, ()):
+            bucket = self._cells.get(cell)
+            if bucket is not None:
+                bucket.pop(key, None)
+                if not bucket:
+                    del self._cells[cell]
+
+    def query(self, pickup: Point, dropoff: Point,
+              corridor_km: Optional[float] = None) -> List[Tuple[Hashable, float, float, float]]:
+        """
+        Rides passing within `corridor_km` (capped at the index width) of
+        `pickup` and then of `dropoff`. Returns (key, pickup_km, dropoff_km,
+        detour_km) sorted by detour, where the positions are distances along
+        the route and detour is the sum of both distances to the route.
+        """
+        corridor_km = self.corridor_km if corridor_km is None else min(corridor_km, self.corridor_km)
+        with self._lock:
+            pickup_cell = self._cells.get(self._cell(*pickup))
+            dropoff_cell = self._cells.get(self._cell(*dropoff))
+            if not pickup_cell or not dropoff_cell:
+                return []
+            if len(dropoff_cell) < len(pickup_cell):
+                keys = [key for key in dropoff_cell if key in pickup_cell]
+            else:
+                keys = [key for key in pickup_cell if key in dropoff_cell]
+            # Cheap ordering filter on the cell positions; slack of one sample step
+            candidates = [
+                (key, self._routes[key]) for key in keys
+                if pickup_cell[key][0] < dropoff_cell[key][1] + self._step_km
+            ]
+
+        matches = []
+        for key, route in candidates:
+            at_pickup = route.locate(pickup, corridor_km)
+            if at_pickup is None:
+                continue
+            at_dropoff = route.locate(dropoff, corridor_km)
+            if at_dropoff is None or at_pickup[0] >= at_dropoff[1]:
+                continue
+            matches.append((key, at_pickup[0], at_dropoff[1], at_pickup[2] + at_dropoff[2]))
+        matches.sort(key=lambda match: match[3])
+        return matches
+
+    def scan(self, pickup: Point, dropoff: Point,
+             corridor_km: Optional[float] = None) -> List[Tuple[Hashable, float, float, float]]:
+        """Reference implementation: checks every route. Same result as `query`."""
+        corridor_km = self.corridor_km if corridor_km is None else min(corridor_km, self.corridor_km)
+        with self._lock:
+            routes = list(self._routes.items())
+        matches = []
+        for key, route in routes:
+            at_pickup = route.locate(pickup, corridor_km)
+            if at_pickup is None:
+                continue
+            at_dropoff = route.locate(dropoff, corridor_km)
+            if at_dropoff is None or at_pickup[0] >= at_dropoff[1]:
+                continue
+            matches.append((key, at_pickup[0], at_dropoff[1], at_pickup[2] + at_dropoff[2]))
+        matches.sort(key=lambda match: match[3])
+        return matches
+
+
+if __name__ == "__main__":
+    import random
+    import time
+
+    rng = random.Random(42)
+    cities = [(50.0755, 14.4378), (49.1951, 16.6068), (49.8209, 18.2625), (49.7384, 13.3736),
+              (50.2092, 15.8328), (48.9745, 14.4743), (50.7663, 15.0543), (49.5938, 17.2509)]
+
+    def random_route():
+        a, b = rng.sample(cities, 2)
+        jitter = lambda p: (p[0] + rng.uniform(-0.1, 0.1), p[1] + rng.uniform(-0.1, 0.1))
+        a, b = jitter(a), jitter(b)
+        steps = rng.randint(10, 40)
+        bend = (rng.uniform(-0.3, 0.3), rng.uniform(-0.3, 0.3))
+        return [
+            (a[0] + (b[0] - a[0]) * t + bend[0] * math.sin(math.pi * t),
+             a[1] + (b[1] - a[1]) * t + bend[1] * math.sin(math.pi * t))
+            for t in (i / steps for i in range(steps + 1))
+        ]
+
+    print(f"{'rides':>7} {'build s':>8} {'index ms':>9} {'scan ms':>9} {'speedup':>8}")
+    for size in (1_000, 5_000, 20_000):
+        index = CorridorIndex()
+        routes = [random_route() for _ in range(size)]
+        started = time.perf_counter()
+        for ride_id, route in enumerate(routes):
+            index.insert(ride_id, route)
+        build_s = time.perf_counter() - started
+        queries = []
+        for _ in range(50):
+            route = rng.choice(routes)
+            i, j = sorted(rng.sample(range(len(route)), 2))
+            queries.append((route[i], route[j]))
+        started = time.perf_counter()
+        indexed = [index.query(p, d) for p, d in queries]
+        index_ms = (time.perf_counter() - started) / len(queries) * 1000
+        started = time.perf_counter()
+        scanned = [index.scan(p, d) for p, d in queries]
+        scan_ms = (time.perf_counter() - started) / len(queries) * 1000
+        assert indexed == scanned
+        print(f"{size:>7} {build_s:>8.2f} {index_ms:>9.2f} {scan_ms:>9.2f} {scan_ms / index_ms:>7.1f}x")
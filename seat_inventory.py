@@ -0,0 +1,89 @@
+"""
+Atomic seat booking for rides.
+
+The seat count is claimed with a single conditional statement,
+
+    UPDATE rides SET available_seats = available_seats - :seats
+    WHERE id = :ride_id AND available_seats >= :seats
+
+and the booking only proceeds if it changed exactly one row, so two passengers
+can never both take the last seat (no read-then-write window). Doing the
+UPDATE first also makes the transaction take SQLite's write lock immediately
+instead of upgrading a read lock later, which is what produced "database is
+locked" failures under concurrent bookings. Row counts are used instead of
+RETURNING so the same code runs on SQLite < 3.35.
+
+Transient lock/serialization errors are retried with jittered exponential
+backoff by `run_with_retry`.
+"""
+
+from __future__ import annotations
+
+import random
+import time
+from typing import Callable, Optional, Tuple, TypeVar
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError, DBAPIError
+
+T = TypeVar('T')
+
+# serialization_failure, deadlock_detected, lock_not_available
+_RETRYABLE_PGCODES = {'40001', '40P01', '55P03'}
+
+
+class SeatsUnavailable(Exception):
+    """The ride does not exist or has fewer free seats than requested."""
+
+
+_CLAIM = text("UPDATE rides SET available_seats = available_seats - :seats "
+              "WHERE id = :ride_id AND available_seats >= :seats")
+_INSERT = text("INSERT INTO reservations (ride_id, passenger_id, seats_reserved, status) "
+               "VALUES (:ride_id, :passenger_id, :seats, 'confirmed')")
+_CANCEL = text("UPDATE reservations SET status = 'cancelled' WHERE id = :reservation_id AND status != 'cancelled'")
+_RESERVATION = text("SELECT ride_id, seats_reserved, passenger_id FROM reservations WHERE id = :reservation_id")
+_RELEASE = text("UPDATE rides SET available_seats = available_seats + :seats WHERE id = :ride_id")
+
+
+def reserve_seats(session, ride_id: int, passenger_id: int, seats: int) -> int:
+    """Claims `seats` on the ride and inserts a confirmed reservation; returns its id.
+
+    Must run inside the caller's transaction. Raises SeatsUnavailable if the
+    seats could not be claimed (nothing is written in that case)."""
+    if seats < 1:
+        raise ValueError("seats must be at least 1")
+    if session.execute(_CLAIM, {'ride_id': ride_id, 'seats': seats}).rowcount != 1:
+        raise SeatsUnavailable(ride_id)
+    return session.execute(_INSERT, {'ride_id': ride_id, 'passenger_id': passenger_id, 'seats': seats}).lastrowid
+
+
+def cancel_reservation(session, reservation_id: int) -> Optional[Tuple[int, int, int]]:
+    """Cancels the reservation and returns its seats to the ride exactly once.
+
+    Returns (ride_id, seats_reserved, passenger_id), or None if the reservation
+    does not exist or was already cancelled."""
+    # Write first, like reserve_seats, so the transaction never upgrades a read lock
+    if session.execute(_CANCEL, {'reservation_id': reservation_id}).rowcount != 1:
+        return None
+    ride_id, seats, passenger_id = session.execute(_RESERVATION, {'reservation_id': reservation_id}).fetchone()
+    session.execute(_RELEASE, {'ride_id': ride_id, 'seats': seats})
+    return ride_id, seats, passenger_id
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, OperationalError) and 'locked' in str(error.orig).lower():
+        return True
+    return isinstance(error, DBAPIError) and getattr(error.orig, 'pgcode', None) in _RETRYABLE_PGCODES
+
+
+def run_with_retry(transaction: Callable[[], T], attempts: int = 6, base_delay: float = 0.02,
+                   max_delay: float = 1.0, sleep: Callable[[float], None] = time.sleep) -> T:
+    """Runs `transaction` (which opens and commits its own transaction), retrying lock errors."""
+    for attempt in range(attempts):
+        try:
+            return transaction()
+        except DBAPIError as e:
+            if attempt == attempts - 1 or not is_retryable(e):
+                raise
+            sleep(min(max_delay, base_delay * 2 ** attempt) * random.uniform(0.5, 1.5))
+    raise AssertionError("unreachable")
@@ -0,0 +1,69 @@
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+
+if __name__ == "__main__" and os.path.basename(os.getcwd()) == 'src':
+    os.chdir('..') # Run from the project root so `src` is importable
+sys.path.insert(0, os.getcwd())
+
+from src.matching import MatchingEngine
+from src.models import UserRequest
+
+# Commute hubs (lat, lon) the synthetic requests cluster around
+HUBS = [
+    (50.0755, 14.4378), (49.1951, 16.6068), (49.8209, 18.2625), (49.7384, 13.3736),
+    (50.7663, 15.0543), (49.5938, 17.2509), (50.2103, 15.8327), (48.9745, 14.4743),
+]
+
+
+def synthetic_requests(count: int, seed: int = 1) -> list:
+    """Generates commute-like requests: home near one hub, work near another, 6:00-9:00 departures."""
+    rng = random.Random(seed)
+    base = datetime.datetime(2026, 3, 2, 6, 0)
+    requests = []
+    for i in range(count):
+        home = rng.choice(HUBS)
+        work = rng.choice(HUBS)
+        departure = base + datetime.timedelta(minutes=rng.randrange(0, 180))
+        requests.append(UserRequest(
+            f"user{i}",
+            home[0] + rng.gauss(0, 0.08), home[1] + rng.gauss(0, 0.12),
+            work[0] + rng.gauss(0, 0.08), work[1] + rng.gauss(0, 0.12),
+            departure.strftime("%Y-%m-%d %H:%M"),
+        ))
+    return requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MatchingEngine scaling across CPU cores.")
+    parser.add_argument("--requests", type=int, default=100_000, help="Number of synthetic requests.")
+    parser.add_argument("--radius", type=float, default=1.0, help="Distance radius in km.")
+    parser.add_argument("--tolerance", type=float, default=10, help="Time tolerance in minutes.")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1, help="Highest worker count to try.")
+    args = parser.parse_args()
+
+    requests = synthetic_requests(args.requests)
+    print(f"{args.requests} requests, radius {args.radius} km, tolerance {args.tolerance} min, "
+          f"{os.cpu_count()} CPU cores")
+
+    # 1, 2, 4, ... up to --max-workers
+    worker_counts = sorted({1, args.max_workers} | {2 ** k for k in range(args.max_workers.bit_length())
+                                                    if 2 ** k <= args.max_workers})
+    baseline = None
+    reference = None
+    for workers in worker_counts:
+        engine = MatchingEngine(requests, args.radius, args.tolerance, workers=workers)
+        started = time.perf_counter()
+        matches = engine.find_matches()
+        elapsed = time.perf_counter() - started
+        if reference is None:
+            baseline, reference = elapsed, matches
+        assert matches == reference, "parallel result differs from single-worker result"
+        print(f"  workers={workers:<3} {elapsed:8.2f} s  speedup {baseline / elapsed:5.2f}x  matches {len(matches)}")
+
+
+if __name__ == "__main__":
+    main()
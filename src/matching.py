@@ -1,2 +1,386 @@
-from typing import List, Tuple\nfrom src.models import UserRequest\nfrom src.utils import haversine_distance, time_difference_minutes\n\nclass MatchingEngine:\n    """\n    Core engine for finding carpool matches among a list of user requests.\n    """\n    def __init__(self, user_requests: List[UserRequest], distance_radius_km: float, time_tolerance_minutes: float):\n        self.user_requests = user_requests\n        self.distance_radius_km = distance_radius_km\n        self.time_tolerance_minutes = time_tolerance_minutes\n\n    def find_matches(self) -> List[Tuple[UserRequest, UserRequest, float, float, float]]:\n        """\n        Finds potential carpool matches based on geographical proximity of start/end\n        points and temporal proximity of departure times.\n\n        A match is suggested if:\n        1. The straight-line (Haversine) distance between their start points\n           is within `distance_radius_km`.\n        2. The straight-line (Haversine) distance between their end points\n           is within `distance_radius_km`.\n        3. The absolute difference in their departure times is within\n           `time_tolerance_minutes`.\n\n        Returns a list of tuples, where each tuple contains:\n        (UserRequest1, UserRequest2, start_distance_km, end_distance_km, time_difference_minutes)\n        """\n        matches = []\n        num_users = len(self.user_requests)\n\n        print(f"\
-Analyzing {num_users} user requests for potential matches...")\n\n        # Iterate through all unique pairs of users to find matches\n        for i in range(num_users):\n            for j in range(i + 1, num_users): # Start from i+1 to avoid self-matching and duplicate pairs\n                user1 = self.user_requests[i]\n                user2 = self.user_requests[j]\n\n                # 1. Check proximity of start points\n                dist_start = haversine_distance(\n                    user1.start_lat, user1.start_lon,\n                    user2.start_lat, user2.start_lon\n                )\n                if dist_start > self.distance_radius_km:\n                    continue # Start points are too far apart, no match\n\n                # 2. Check proximity of end points\n                dist_end = haversine_distance(\n                    user1.end_lat, user1.end_lon,\n                    user2.end_lat, user2.end_lon\n                )\n                if dist_end > self.distance_radius_km:\n                    continue # End points are too far apart, no match\n\n                # 3. Check proximity of departure times\n                time_diff = time_difference_minutes(user1.departure_time, user2.departure_time)\n                if abs(time_diff) > self.time_tolerance_minutes:\n                    continue # Departure times are too far apart, no match\n\n                # If all conditions are met, a potential match is found\n                matches.append((user1, user2, dist_start, dist_end, time_diff))\n                print(f"  Potential match found between {user1.id} and {user2.id}.")\n\n        return matches\n
\ No newline at end of file
+import bisect
+import math
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Sequence, Tuple, Union
+from src.models import EPOCH, UserRequest, UserRequestBatch
+from src.utils import EARTH_RADIUS_KM, haversine_distance, time_difference_minutes
+
+# (request1, request2, start_distance_km, end_distance_km, time_difference_minutes);
+# requests are UserRequest objects for a list input and ids for a UserRequestBatch
+Match = Tuple[UserRequest, UserRequest, float, float, float]
+BatchMatch = Tuple[str, str, float, float, float]
+Matches = Union[List[Match], List[BatchMatch]]
+
+# Relative padding applied to bucket sizes so that floating point rounding in
+# the distance formula can never push a true match into a non-neighbouring cell.
+_BUCKET_PADDING = 1e-6
+
+
+def bucket_steps(radius_km: float, time_tolerance_minutes: float,
+                 latitudes: Iterable[float]) -> Tuple[float, float, float]:
+    """
+    Returns (minutes, lat_degrees, lon_degrees) bucket sizes such that any two
+    points within `radius_km` / `time_tolerance_minutes` of each other always
+    fall into the same or directly neighbouring buckets.
+
+    Latitude: the great-circle distance is never shorter than R * |dlat|.
+    Longitude: hav(d) >= cos^2(max_lat) * hav(dlon), so the bucket width is
+    taken at the highest latitude present in the data.
+    """
+    padding = 1.0 + _BUCKET_PADDING
+    minutes_step = max(time_tolerance_minutes * padding, 1e-9)
+    lat_step = max(math.degrees(radius_km / EARTH_RADIUS_KM) * padding, 1e-9)
+
+    max_abs_lat = max((abs(lat) for lat in latitudes), default=0.0)
+    cos_max = math.cos(math.radians(min(max_abs_lat, 90.0)))
+    ratio = math.sin(radius_km / (2 * EARTH_RADIUS_KM)) / cos_max if cos_max > 0 else math.inf
+    if ratio >= 1.0:
+        lon_step = 360.0
+    else:
+        lon_step = min(max(math.degrees(2 * math.asin(ratio)) * padding, 1e-9), 360.0)
+    return minutes_step, lat_step, lon_step
+
+
+def bucketed_candidate_pairs(start_points: Sequence[Tuple[float, float]],
+                             end_points: Sequence[Tuple[float, float]],
+                             departure_minutes: Sequence[float],
+                             radius_km: float,
+                             time_tolerance_minutes: float) -> List[Tuple[int, int]]:
+    """
+    Returns index pairs (i, j), i < j, sorted, whose departure-time window and
+    start/end grid cells are neighbours. Every pair that can satisfy the
+    distance and time limits is included; callers still apply the exact checks.
+
+    Requests are bucketed by (time window, start cell) and, inside that, by end
+    cell, so only 27 outer and 9 inner neighbour buckets are ever compared.
+    """
+    num_users = len(departure_minutes)
+    if num_users < 2 or radius_km < 0 or time_tolerance_minutes < 0:
+        return []
+
+    minutes_step, lat_step, lon_step = bucket_steps(
+        radius_km, time_tolerance_minutes,
+        [lat for lat, _ in start_points] + [lat for lat, _ in end_points],
+    )
+    # Cells must tile 360 degrees evenly for the antimeridian wrap to stay adjacent
+    lon_cells = max(1, math.floor(360.0 / lon_step))
+    lon_step = 360.0 / lon_cells
+
+    def lon_cell(lon: float) -> int:
+        return min(math.floor((lon + 180.0) / lon_step), lon_cells - 1)
+
+    def lon_neighbours(cell: int) -> set:
+        # Longitude wraps around at the antimeridian
+        return {(cell + offset) % lon_cells for offset in (-1, 0, 1)}
+
+    buckets: Dict[Tuple[int, int, int], Dict[Tuple[int, int], List[int]]] = defaultdict(lambda: defaultdict(list))
+    for i in range(num_users):
+        start_lat, start_lon = start_points[i]
+        end_lat, end_lon = end_points[i]
+        outer = (math.floor(departure_minutes[i] / minutes_step),
+                 math.floor(start_lat / lat_step), lon_cell(start_lon))
+        inner = (math.floor(end_lat / lat_step), lon_cell(end_lon))
+        buckets[outer][inner].append(i)
+
+    pairs = []
+    for outer_key, inner_buckets in buckets.items():
+        time_key, start_row, start_col = outer_key
+        for neighbour_col in lon_neighbours(start_col):
+            for time_offset in (-1, 0, 1):
+                for row_offset in (-1, 0, 1):
+                    neighbour_key = (time_key + time_offset, start_row + row_offset, neighbour_col)
+                    # Each unordered bucket pair is visited once, from its smaller key
+                    if neighbour_key < outer_key or neighbour_key not in buckets:
+                        continue
+                    other_inner = buckets[neighbour_key]
+                    same_outer = neighbour_key == outer_key
+                    for inner_key, members in inner_buckets.items():
+                        end_row, end_col = inner_key
+                        for other_col in lon_neighbours(end_col):
+                            for end_offset in (-1, 0, 1):
+                                other_key = (end_row + end_offset, other_col)
+                                if same_outer and other_key < inner_key:
+                                    continue
+                                others = other_inner.get(other_key)
+                                if not others:
+                                    continue
+                                if same_outer and other_key == inner_key:
+                                    for a in range(len(members)):
+                                        for b in range(a + 1, len(members)):
+                                            pairs.append((members[a], members[b]))
+                                else:
+                                    for i in members:
+                                        for j in others:
+                                            pairs.append((i, j) if i < j else (j, i))
+    pairs.sort()
+    return pairs
+
+
+def time_shards(departure_minutes: Sequence[float], time_tolerance_minutes: float,
+                num_shards: int) -> List[Tuple[List[int], List[bool]]]:
+    """
+    Splits request indices into consecutive departure-time shards.
+
+    Each shard holds its own time slab (core) plus a halo of requests departing
+    up to `time_tolerance_minutes` before the slab, flagged False. A pair is
+    owned by the shard holding its later request in the core, so keeping only
+    pairs with at least one core member yields every pair exactly once.
+    """
+    order = sorted(range(len(departure_minutes)), key=lambda i: departure_minutes[i])
+    if not order:
+        return []
+    sorted_minutes = [departure_minutes[i] for i in order]
+    halo = time_tolerance_minutes * (1.0 + _BUCKET_PADDING)
+    first, last = sorted_minutes[0], sorted_minutes[-1]
+    width = max((last - first) / max(num_shards, 1), halo, 1e-9)
+
+    shards = []
+    lo = first
+    while lo <= last:
+        hi = lo + width
+        halo_start = bisect.bisect_left(sorted_minutes, lo - halo)
+        core_start = bisect.bisect_left(sorted_minutes, lo)
+        core_end = bisect.bisect_left(sorted_minutes, hi)
+        if core_end > core_start:
+            members = order[halo_start:core_end]
+            shards.append((members, [False] * (core_start - halo_start) + [True] * (core_end - core_start)))
+        lo = hi
+    return shards
+
+
+def _match_time_shard(shard) -> List[Tuple[int, int]]:
+    """
+    Worker-process entry point: bucketed matching inside one time shard.
+    Returns global index pairs that pass the distance checks; the time check
+    is slightly relaxed here and applied exactly by the caller.
+    """
+    indices, core_flags, start_points, end_points, minutes, radius_km, time_tolerance_minutes = shard
+    time_limit = time_tolerance_minutes * (1.0 + _BUCKET_PADDING)
+    accepted = []
+    for a, b in bucketed_candidate_pairs(start_points, end_points, minutes, radius_km, time_tolerance_minutes):
+        if not (core_flags[a] or core_flags[b]):
+            continue # Both in the halo: owned by the previous shard
+        if abs(minutes[a] - minutes[b]) > time_limit:
+            continue
+        if haversine_distance(*start_points[a], *start_points[b]) > radius_km:
+            continue
+        if haversine_distance(*end_points[a], *end_points[b]) > radius_km:
+            continue
+        i, j = indices[a], indices[b]
+        accepted.append((i, j) if i < j else (j, i))
+    return accepted
+
+
+class MatchingEngine:
+    """
+    Core engine for finding carpool matches among a list of user requests.
+
+    `strategy` selects how candidate pairs are generated:
+    - "bucketed" (default): only requests in neighbouring time/space buckets
+      are compared; scales to ~100k requests per batch.
+    - "brute_force": every pair is compared; kept as the reference
+      implementation. Both return identical results in identical order.
+
+    `user_requests` is either a list of UserRequest objects or a columnar
+    UserRequestBatch. With a batch, match tuples carry request ids instead of
+    UserRequest objects and no per-request objects are ever created.
+    """
+    STRATEGIES = ("bucketed", "brute_force")
+
+    # Shards per worker; more, smaller shards even out load across processes
+    SHARDS_PER_WORKER = 4
+
+    def __init__(self, user_requests: Union[List[UserRequest], UserRequestBatch], distance_radius_km: float, time_tolerance_minutes: float,
+                 strategy: str = "bucketed", workers: int = 1):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown matching strategy '{strategy}', expected one of {self.STRATEGIES}")
+        self.user_requests = user_requests
+        self.distance_radius_km = distance_radius_km
+        self.time_tolerance_minutes = time_tolerance_minutes
+        self.strategy = strategy
+        # Number of worker processes for the bucketed strategy; 0/None = all CPU cores
+        self.workers = workers if workers else (os.cpu_count() or 1)
+
+    def find_matches(self) -> Matches:
+        """
+        Finds potential carpool matches using the configured strategy.
+        See `find_matches_brute_force` for the matching rules.
+        """
+        if self.strategy == "brute_force":
+            return self.find_matches_brute_force()
+        if self.workers > 1:
+            return self.find_matches_parallel()
+        return self.find_matches_bucketed()
+
+    def find_matches_bucketed(self) -> Matches:
+        """
+        Same rules and output as `find_matches_brute_force`, but only pairs in
+        neighbouring departure-time windows and start/end grid cells are checked.
+        """
+        start_points, end_points, minutes = self._columns()
+        candidates = bucketed_candidate_pairs(
+            start_points,
+            end_points,
+            minutes,
+            self.distance_radius_km,
+            self.time_tolerance_minutes,
+        )
+        return self._check_pairs(candidates)
+
+    def find_matches_parallel(self) -> Matches:
+        """
+        Bucketed matching sharded by departure-time window and run across
+        `self.workers` processes. Shard results are merged in (i, j) order, so
+        the output is identical to `find_matches_bucketed` for any worker count.
+        """
+        start_points, end_points, minutes = self._columns()
+        if len(minutes) < 2 or self.distance_radius_km < 0 or self.time_tolerance_minutes < 0:
+            return []
+
+        shards = [
+            (
+                members,
+                core_flags,
+                [start_points[i] for i in members],
+                [end_points[i] for i in members],
+                [minutes[i] for i in members],
+                self.distance_radius_km,
+                self.time_tolerance_minutes,
+            )
+            for members, core_flags in time_shards(minutes, self.time_tolerance_minutes,
+                                                   self.workers * self.SHARDS_PER_WORKER)
+        ]
+
+        pairs = []
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            for shard_pairs in executor.map(_match_time_shard, shards):
+                pairs.extend(shard_pairs)
+        pairs.sort()
+        return self._check_pairs(pairs)
+
+    def _columns(self) -> Tuple[List[Tuple[float, float]], List[Tuple[float, float]], Sequence[float]]:
+        """Start points, end points and departure epoch minutes, in request order."""
+        requests = self.user_requests
+        if isinstance(requests, UserRequestBatch):
+            return (
+                list(zip(requests.start_lat, requests.start_lon)),
+                list(zip(requests.end_lat, requests.end_lon)),
+                requests.departure_minutes,
+            )
+        return (
+            [(user.start_lat, user.start_lon) for user in requests],
+            [(user.end_lat, user.end_lon) for user in requests],
+            [(user.departure_time - EPOCH).total_seconds() / 60 for user in requests],
+        )
+
+    def _check_pairs(self, pairs: Iterable[Tuple[int, int]]) -> Matches:
+        if isinstance(self.user_requests, UserRequestBatch):
+            return self._check_batch_pairs(pairs)
+        matches = []
+        for i, j in pairs:
+            user1 = self.user_requests[i]
+            user2 = self.user_requests[j]
+
+            time_diff = time_difference_minutes(user1.departure_time, user2.departure_time)
+            if abs(time_diff) > self.time_tolerance_minutes:
+                continue
+
+            dist_start = haversine_distance(
+                user1.start_lat, user1.start_lon,
+                user2.start_lat, user2.start_lon
+            )
+            if dist_start > self.distance_radius_km:
+                continue
+
+            dist_end = haversine_distance(
+                user1.end_lat, user1.end_lon,
+                user2.end_lat, user2.end_lon
+            )
+            if dist_end > self.distance_radius_km:
+                continue
+
+            matches.append((user1, user2, dist_start, dist_end, time_diff))
+        return matches
+
+    def _check_batch_pairs(self, pairs: Iterable[Tuple[int, int]]) -> List[BatchMatch]:
+        batch = self.user_requests
+        ids, minutes = batch.ids, batch.departure_minutes
+        start_lat, start_lon = batch.start_lat, batch.start_lon
+        end_lat, end_lon = batch.end_lat, batch.end_lon
+        matches = []
+        for i, j in pairs:
+            time_diff = float(minutes[i] - minutes[j])
+            if abs(time_diff) > self.time_tolerance_minutes:
+                continue
+
+            dist_start = haversine_distance(start_lat[i], start_lon[i], start_lat[j], start_lon[j])
+            if dist_start > self.distance_radius_km:
+                continue
+
+            dist_end = haversine_distance(end_lat[i], end_lon[i], end_lat[j], end_lon[j])
+            if dist_end > self.distance_radius_km:
+                continue
+
+            matches.append((ids[i], ids[j], dist_start, dist_end, time_diff))
+        return matches
+
+    def find_matches_brute_force(self) -> Matches:
+        """
+        Finds potential carpool matches based on geographical proximity of start/end
+        points and temporal proximity of departure times.
+
+        A match is suggested if:
+        1. The straight-line (Haversine) distance between their start points
+           is within `distance_radius_km`.
+        2. The straight-line (Haversine) distance between their end points
+           is within `distance_radius_km`.
+        3. The absolute difference in their departure times is within
+           `time_tolerance_minutes`.
+
+        Returns a list of tuples, where each tuple contains:
+        (UserRequest1, UserRequest2, start_distance_km, end_distance_km, time_difference_minutes)
+        For a UserRequestBatch input the first two items are request ids.
+        """
+        if isinstance(self.user_requests, UserRequestBatch):
+            num_users = len(self.user_requests)
+            return self._check_batch_pairs((i, j) for i in range(num_users) for j in range(i + 1, num_users))
+
+        matches = []
+        num_users = len(self.user_requests)
+
+        print(f"\nAnalyzing {num_users} user requests for potential matches...")
+
+        # Iterate through all unique pairs of users to find matches
+        for i in range(num_users):
+            for j in range(i + 1, num_users): # Start from i+1 to avoid self-matching and duplicate pairs
+                user1 = self.user_requests[i]
+                user2 = self.user_requests[j]
+
+                # 1. Check proximity of start points
+                dist_start = haversine_distance(
+                    user1.start_lat, user1.start_lon,
+                    user2.start_lat, user2.start_lon
+                )
+                if dist_start > self.distance_radius_km:
+                    continue # Start points are too far apart, no match
+
+                # 2. Check proximity of end points
+                dist_end = haversine_distance(
+                    user1.end_lat, user1.end_lon,
+                    user2.end_lat, user2.end_lon
+                )
+                if dist_end > self.distance_radius_km:
+                    continue # End points are too far apart, no match
+
+                # 3. Check proximity of departure times
+                time_diff = time_difference_minutes(user1.departure_time, user2.departure_time)
+                if abs(time_diff) > self.time_tolerance_minutes:
+                    continue # Departure times are too far apart, no match
+
+                # If all conditions are met, a potential match is found
+                matches.append((user1, user2, dist_start, dist_end, time_diff))
+                print(f"  Potential match found between {user1.id} and {user2.id}.")
+
+        return matches
@@ -1 +1,148 @@
-import datetime\n\nclass UserRequest:\n    """\n    Represents a user's request for a ride, including start/end geographical points\n    and a departure time.\n    """\n    def __init__(self, user_id: str, start_lat: float, start_lon: float,\n                 end_lat: float, end_lon: float, departure_time_str: str):\n        self.id = user_id\n        self.start_lat = start_lat\n        self.start_lon = start_lon\n        self.end_lat = end_lat\n        self.end_lon = end_lon\n        # Parse the time string into a datetime object for easier comparison\n        self.departure_time = datetime.datetime.strptime(departure_time_str, "%Y-%m-%d %H:%M")\n\n    def __repr__(self):\n        return (\n            f"UserRequest(ID='{self.id}', "\n            f"Start=({self.start_lat:.4f},{self.start_lon:.4f}), "\n            f"End=({self.end_lat:.4f},{self.end_lon:.4f}), "\n            f"Departure='{self.departure_time.strftime('%Y-%m-%d %H:%M')}')"\n        )\n
\ No newline at end of file
+import csv
+import datetime
+import json
+from array import array
+from typing import Iterable, Mapping
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+class UserRequest:
+    """
+    Represents a user's request for a ride, including start/end geographical points
+    and a departure time.
+    """
+    def __init__(self, user_id: str, start_lat: float, start_lon: float,
+                 end_lat: float, end_lon: float, departure_time_str: str):
+        self.id = user_id
+        self.start_lat = start_lat
+        self.start_lon = start_lon
+        self.end_lat = end_lat
+        self.end_lon = end_lon
+        # Parse the time string into a datetime object for easier comparison
+        self.departure_time = datetime.datetime.strptime(departure_time_str, "%Y-%m-%d %H:%M")
+
+    def __repr__(self):
+        return (
+            f"UserRequest(ID='{self.id}', "
+            f"Start=({self.start_lat:.4f},{self.start_lon:.4f}), "
+            f"End=({self.end_lat:.4f},{self.end_lon:.4f}), "
+            f"Departure='{self.departure_time.strftime('%Y-%m-%d %H:%M')}')"
+        )
+
+
+_EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+# CSV/JSON field names, matching the UserRequest constructor arguments
+REQUEST_FIELDS = ("user_id", "start_lat", "start_lon", "end_lat", "end_lon", "departure_time")
+
+
+def parse_departure_minutes(text: str, day_cache: dict = None) -> int:
+    """
+    Parses "YYYY-MM-DD HH:MM" into minutes since 1970-01-01 without strptime.
+    `day_cache` memoizes the date part, which repeats heavily in real batches.
+    """
+    if len(text) != 16 or text[4] != "-" or text[7] != "-" or text[10] != " " or text[13] != ":":
+        raise ValueError(f"time data '{text}' does not match format '%Y-%m-%d %H:%M'")
+    date_part = text[:10]
+    days = day_cache.get(date_part) if day_cache is not None else None
+    if days is None:
+        days = datetime.date(int(text[0:4]), int(text[5:7]), int(text[8:10])).toordinal() - _EPOCH_ORDINAL
+        if day_cache is not None:
+            day_cache[date_part] = days
+    hour = int(text[11:13])
+    minute = int(text[14:16])
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise ValueError(f"time data '{text}' does not match format '%Y-%m-%d %H:%M'")
+    return days * 1440 + hour * 60 + minute
+
+
+class UserRequestBatch:
+    """
+    Column-oriented store of many ride requests: parallel arrays of ids,
+    start/end coordinates (float64) and departure times (epoch minutes, int64).
+
+    Holds the same data as a list of UserRequest objects in a fraction of the
+    memory. MatchingEngine accepts it in place of such a list and then reads
+    the columns directly, returning request ids instead of UserRequest objects.
+    """
+    def __init__(self):
+        self.ids = []
+        self.start_lat = array("d")
+        self.start_lon = array("d")
+        self.end_lat = array("d")
+        self.end_lon = array("d")
+        self.departure_minutes = array("q")
+        self._day_cache = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append(self, user_id: str, start_lat: float, start_lon: float,
+               end_lat: float, end_lon: float, departure_time_str: str):
+        # Parse first so a bad row leaves the columns untouched
+        minutes = parse_departure_minutes(departure_time_str, self._day_cache)
+        start_lat, start_lon = float(start_lat), float(start_lon)
+        end_lat, end_lon = float(end_lat), float(end_lon)
+        self.ids.append(user_id)
+        self.start_lat.append(start_lat)
+        self.start_lon.append(start_lon)
+        self.end_lat.append(end_lat)
+        self.end_lon.append(end_lon)
+        self.departure_minutes.append(minutes)
+
+    def departure_time(self, index: int) -> datetime.datetime:
+        return EPOCH + datetime.timedelta(minutes=self.departure_minutes[index])
+
+    def get(self, index: int) -> UserRequest:
+        """Materializes one row as a UserRequest."""
+        return UserRequest(
+            self.ids[index],
+            self.start_lat[index], self.start_lon[index],
+            self.end_lat[index], self.end_lon[index],
+            self.departure_time(index).strftime("%Y-%m-%d %H:%M"),
+        )
+
+    @classmethod
+    def from_requests(cls, requests: Iterable[UserRequest]) -> "UserRequestBatch":
+        batch = cls()
+        for request in requests:
+            batch.ids.append(request.id)
+            batch.start_lat.append(request.start_lat)
+            batch.start_lon.append(request.start_lon)
+            batch.end_lat.append(request.end_lat)
+            batch.end_lon.append(request.end_lon)
+            delta = request.departure_time - EPOCH
+            batch.departure_minutes.append(delta.days * 1440 + delta.seconds // 60)
+        return batch
+
+    @classmethod
+    def from_records(cls, records: Iterable[Mapping]) -> "UserRequestBatch":
+        """Builds a batch from mappings keyed by REQUEST_FIELDS."""
+        batch = cls()
+        for record in records:
+            batch.append(*(record[field] for field in REQUEST_FIELDS))
+        return batch
+
+    @classmethod
+    def from_csv(cls, path: str) -> "UserRequestBatch":
+        """Loads a CSV file with a header row containing REQUEST_FIELDS."""
+        with open(path, newline="", encoding="utf-8") as handle:
+            reader = csv.reader(handle)
+            header = next(reader, None)
+            if header is None:
+                return cls()
+            try:
+                columns = [header.index(field) for field in REQUEST_FIELDS]
+            except ValueError:
+                raise ValueError(f"CSV header must contain the columns {', '.join(REQUEST_FIELDS)}")
+            batch = cls()
+            for row in reader:
+                if row:
+                    batch.append(*(row[column] for column in columns))
+        return batch
+
+    @classmethod
+    def from_json(cls, path: str) -> "UserRequestBatch":
+        """Loads a JSON array of objects keyed by REQUEST_FIELDS."""
+        with open(path, encoding="utf-8") as handle:
+            return cls.from_records(json.load(handle))
@@ -1 +1,32 @@
-import math\nimport datetime\n\n# Earth's mean radius in kilometers (used for Haversine formula)\nEARTH_RADIUS_KM = 6371\n\ndef haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:\n    """\n    Calculates the Haversine (great-circle) distance between two points on Earth\n    given their latitudes and longitudes. Returns distance in kilometers.\n    """\n    lat1_rad = math.radians(lat1)\n    lon1_rad = math.radians(lon1)\n    lat2_rad = math.radians(lat2)\n    lon2_rad = math.radians(lon2)\n\n    dlon = lon2_rad - lon1_rad\n    dlat = lat2_rad - lat1_rad\n\n    a = math.sin(dlat / 2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2)**2\n    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))\n\n    distance = EARTH_RADIUS_KM * c\n    return distance\n\ndef time_difference_minutes(dt1: datetime.datetime, dt2: datetime.datetime) -> float:\n    """\n    Calculates the difference in minutes between two datetime objects.\n    The result can be positive or negative depending on the order of arguments.\n    """\n    delta = dt1 - dt2\n    return delta.total_seconds() / 60\n
\ No newline at end of file
+import math
+import datetime
+
+# Earth's mean radius in kilometers (used for Haversine formula)
+EARTH_RADIUS_KM = 6371
+
+def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """
+    Calculates the Haversine (great-circle) distance between two points on Earth
+    given their latitudes and longitudes. Returns distance in kilometers.
+    """
+    lat1_rad = math.radians(lat1)
+    lon1_rad = math.radians(lon1)
+    lat2_rad = math.radians(lat2)
+    lon2_rad = math.radians(lon2)
+
+    dlon = lon2_rad - lon1_rad
+    dlat = lat2_rad - lat1_rad
+
+    a = math.sin(dlat / 2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2)**2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+    distance = EARTH_RADIUS_KM * c
+    return distance
+
+def time_difference_minutes(dt1: datetime.datetime, dt2: datetime.datetime) -> float:
+    """
+    Calculates the difference in minutes between two datetime objects.
+    The result can be positive or negative depending on the order of arguments.
+    """
+    delta = dt1 - dt2
+    return delta.total_seconds() / 60
@@ -206,18 +206,39 @@ console.log('SCRIPT v361 - Loading fixed notification system');
 // Track shown notifications
 let shownNotifications = new Set();
 let notificationInterval = null;
+let notificationStream = null;
 
 function startNotificationCheck() {
   console.log('NOTIF v361 - Starting notification check');
-  if (notificationInterval) {
-    clearInterval(notificationInterval);
+  stopNotificationCheck();
+  
+  // Server-Sent Events: server pushes new messages, no polling needed
+  const currentUser = localStorage.getItem('currentUser');
+  if (window.EventSource && currentUser) {
+    const user = JSON.parse(currentUser);
+    const params = user.id ? `user_id=${encodeURIComponent(user.id)}` : `user_name=${encodeURIComponent(user.name)}`;
+    notificationStream = new EventSource(`/api/notifications/stream?${params}`);
+    notificationStream.addEventListener('notification', event => {
+      const notification = JSON.parse(event.data);
+      const notifId = `${notification.ride_id}-${notification.sender_name}-${notification.created_at}`;
+      if (!shownNotifications.has(notifId)) {
+        showFloatingNotification(notification.sender_name, notification.message, notification.ride_id);
+        shownNotifications.add(notifId);
+      }
+    });
+    return;
   }
+  
   checkForNotifications();
   notificationInterval = setInterval(checkForNotifications, 10000);
 }
 
 function stopNotificationCheck() {
   console.log('NOTIF v361 - Stopping notification check');
+  if (notificationStream) {
+    notificationStream.close();
+    notificationStream = null;
+  }
   if (notificationInterval) {
     clearInterval(notificationInterval);
     notificationInterval = null;
@@ -233,7 +254,7 @@ async function checkForNotifications() {
   
   try {
     const user = JSON.parse(currentUser);
-    const url = `/api/notifications/v361/${encodeURIComponent(user.name)}`;
+    const url = `/api/notifications/v361/${encodeURIComponent(user.name)}` + (user.id ? `?user_id=${encodeURIComponent(user.id)}` : '');
     console.log('NOTIF v361 - Checking notifications for:', user.name, 'URL:', url);
     
     const response = await fetch(url);
@@ -314,7 +335,7 @@ function clearRideMarkers() { console.log('clearRideMarkers called'); }
 function stopVoiceGuidance() { console.log('stopVoiceGuidance called'); }
 
 // Chat funkce
-function openChat(rideId, driverName) {
+async function openChat(rideId, driverName) {
   try {
     console.log('CHAT v390 - Opening chat with:', driverName, 'for ride:', rideId);
     
@@ -354,13 +375,31 @@ function openChat(rideId, driverName) {
     // Načteme zprávy
     loadChatMessages(rideId);
     
-    // Automatické obnovování
-    const interval = setInterval(() => loadChatMessages(rideId), 3000);
+    // Automatické obnovování - přes chat gateway (SSE) pokud běží, jinak polling
+    let interval = null;
+    let chatStream = null;
+    const gatewayUrl = await getChatGatewayUrl();
+    if (window.EventSource && gatewayUrl) {
+      const user = JSON.parse(localStorage.getItem('currentUser') || '{}');
+      const params = user.id ? `?user_id=${encodeURIComponent(user.id)}` : '';
+      chatStream = new EventSource(`${gatewayUrl}/rides/${parseInt(rideId, 10)}/events${params}`);
+      chatStream.addEventListener('message', () => loadChatMessages(rideId));
+    } else {
+      interval = setInterval(() => loadChatMessages(rideId), 3000);
+    }
     
-    // Vyčistíme interval při zavření
+    // Vyčistíme interval/stream při zavření
+    const stopChatUpdates = () => {
+      if (interval) clearInterval(interval);
+      if (chatStream) chatStream.close();
+    };
+    closeBtn.onclick = () => {
+      stopChatUpdates();
+      modal.remove();
+    };
     modal.addEventListener('click', (e) => {
       if (e.target === modal) {
-        clearInterval(interval);
+        stopChatUpdates();
         modal.remove();
       }
     });
@@ -378,11 +417,13 @@ async function sendChatMessage(rideId) {
   
   // Získej jméno uživatele z localStorage
   let userName = 'Anonym';
+  let userId = null;
   const currentUser = localStorage.getItem('currentUser');
   if (currentUser) {
     try {
       const user = JSON.parse(currentUser);
       userName = user.name || 'Anonym';
+      userId = user.id || null;
     } catch (e) {
       console.error('Error parsing currentUser:', e);
     }
@@ -395,6 +436,7 @@ async function sendChatMessage(rideId) {
       headers: { 'Content-Type': 'application/json' },
       body: JSON.stringify({
         ride_id: rideId,
+        sender_id: userId,
         sender_name: userName,
         message: message
       })
@@ -421,6 +463,25 @@ async function sendChatMessage(rideId) {
   }
 }
 
+// Adresa chat gateway (chat_gateway.py), null když neběží
+let chatGatewayUrl;
+
+async function getChatGatewayUrl() {
+  if (chatGatewayUrl === undefined) {
+    try {
+      const response = await fetch('/api/chat/gateway');
+      chatGatewayUrl = response.ok ? (await response.json()).url : null;
+    } catch (e) {
+      chatGatewayUrl = null;
+    }
+  }
+  return chatGatewayUrl;
+}
+
+// Poslední načtená zpráva chatu - při dalším dotazu se stahují jen novější (after_id).
+// Server k nim přidává i pozdě commitnuté zprávy s nižším id, zobrazené zprávy se proto hlídají podle id.
+let chatCursor = { rideId: null, lastId: null, shownIds: new Set() };
+
 async function loadChatMessages(rideId) {
   try {
     const parsedRideId = parseInt(rideId, 10); // Ensure rideId is an integer
@@ -428,12 +489,16 @@ async function loadChatMessages(rideId) {
       console.error('Invalid rideId:', rideId);
       return;
     }
-    const response = await fetch('/api/chat/' + parsedRideId + '/messages');
-    const messages = await response.json();
-    
     const messagesDiv = document.getElementById('chatMessages');
     if (!messagesDiv) return;
     
+    const incremental = chatCursor.rideId === parsedRideId && chatCursor.lastId !== null && messagesDiv.childElementCount > 0;
+    const url = '/api/chat/' + parsedRideId + '/messages' + (incremental ? '?after_id=' + chatCursor.lastId : '');
+    const response = await fetch(url);
+    const messages = await response.json();
+    if (!Array.isArray(messages)) return;
+    if (incremental && messages.length === 0) return;
+    
     // Získej jméno uživatele z localStorage
     let userName = 'Anonym';
     const currentUser = localStorage.getItem('currentUser');
@@ -446,9 +511,16 @@ async function loadChatMessages(rideId) {
       }
     }
     
-    messagesDiv.innerHTML = '';
+    if (!incremental) {
+      messagesDiv.innerHTML = '';
+      chatCursor = { rideId: parsedRideId, lastId: null, shownIds: new Set() };
+    }
     
     messages.forEach(msg => {
+      // Souběžné dotazy (interval + po odeslání) můžou vrátit stejné zprávy
+      if (chatCursor.shownIds.has(msg.id)) return;
+      chatCursor.shownIds.add(msg.id);
+      chatCursor.lastId = chatCursor.lastId === null ? msg.id : Math.max(chatCursor.lastId, msg.id);
       const div = document.createElement('div');
       const isMyMessage = msg.sender_name === userName;
       div.style.cssText = `margin: 8px 0; padding: 8px; border-radius: 8px; ${isMyMessage ? 'background: #f5f5f5; text-align: left;' : 'background: #e3f2fd; text-align: left;'}`;
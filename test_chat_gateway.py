@@ -0,0 +1,166 @@
+import asyncio
+import datetime
+import json
+
+from chat_gateway import ChatGateway, Client, serve
+
+
+class FakeSource:
+    def __init__(self):
+        self.rows = []
+
+    def add(self, ride_id, sender_id, message, message_id=None):
+        """Commits a message; an explicit message_id below the latest one models a late commit."""
+        if message_id is None:
+            message_id = self.latest_id() + 1
+        row = (message_id, ride_id, sender_id, f'user{sender_id}', message, datetime.datetime(2026, 1, 1, 12, 0))
+        self.rows.append(row)
+        return row
+
+    def latest_id(self):
+        return max((row[0] for row in self.rows), default=0)
+
+    def messages_after(self, after_id, limit, ride_id=None):
+        return sorted(row for row in self.rows if row[0] > after_id and (ride_id is None or row[1] == ride_id))[:limit]
+
+
+async def read_event(reader):
+    fields = {}
+    while True:
+        line = (await asyncio.wait_for(reader.readline(), 2)).decode().rstrip('\n')
+        if not line:
+            if fields.get('event'):
+                return fields['event'], json.loads(fields['data'])
+            fields = {}
+            continue
+        name, _, value = line.partition(': ')
+        fields[name] = value
+
+
+async def connect(port, path, last_event_id=None):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    extra = f'Last-Event-ID: {last_event_id}\r\n' if last_event_id is not None else ''
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: x\r\n{extra}\r\n'.encode())
+    await reader.readuntil(b'\r\n\r\n')
+    return reader, writer
+
+
+def test_rooms_presence_and_backfill():
+    async def scenario():
+        source = FakeSource()
+        source.add(1, 10, 'before')
+        gateway = ChatGateway(source, poll_interval=0.01)
+        server = await serve(gateway, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+
+        driver, driver_writer = await connect(port, '/rides/1/events?user_id=10')
+        assert await read_event(driver) == ('presence', {'ride_id': 1, 'user_ids': [10]})
+        other, other_writer = await connect(port, '/rides/2/events?user_id=30')
+        await read_event(other)
+
+        passenger, passenger_writer = await connect(port, '/rides/1/events?user_id=20', last_event_id=0)
+        assert (await read_event(passenger))[1]['message'] == 'before'
+        assert await read_event(passenger) == ('presence', {'ride_id': 1, 'user_ids': [10, 20]})
+        assert await read_event(driver) == ('presence', {'ride_id': 1, 'user_ids': [10, 20]})
+
+        source.add(1, 20, 'ahoj')
+        event, data = await read_event(driver)
+        assert (event, data['message'], data['sender_name']) == ('message', 'ahoj', 'user20')
+        assert (await read_event(passenger))[1]['message'] == 'ahoj'
+
+        passenger_writer.close()
+        assert await read_event(driver) == ('presence', {'ride_id': 1, 'user_ids': [10]})
+        assert gateway.presence(2) == [30]
+
+        for writer in (driver_writer, other_writer):
+            writer.close()
+        await gateway.stop()
+        server.close()
+
+    asyncio.run(scenario())
+
+
+def test_slow_client_is_dropped():
+    async def scenario():
+        gateway = ChatGateway(FakeSource(), queue_size=2)
+        fast, slow = Client(1, 1, 100), Client(1, 2, 2)
+        gateway.join(fast)
+        gateway.join(slow)
+        for i in range(3):
+            gateway.broadcast(1, b'id: %d\n\n' % i)
+        assert gateway.stats['dropped_slow'] == 1
+        assert gateway.presence(1) == [1]
+        assert fast.queue.qsize() == 5  # user 2 joining, 3 messages, user 2 dropped
+
+    asyncio.run(scenario())
+
+
+def test_slow_clients_are_dropped_with_one_presence_update():
+    async def scenario():
+        gateway = ChatGateway(FakeSource())
+        fast, slow, slower = Client(1, 1, 100), Client(1, 2, 1), Client(1, 3, 1)
+        for client in (fast, slow, slower):
+            gateway.join(client)
+        for client in (slow, slower):
+            while not client.queue.full():
+                client.queue.put_nowait(b'')
+        while not fast.queue.empty():
+            fast.queue.get_nowait()
+
+        assert gateway.broadcast(1, b'id: 1\n\n') == 1
+        assert gateway.stats['dropped_slow'] == 2
+        assert gateway.stats['connections'] == 1
+        assert [fast.queue.get_nowait() for _ in range(fast.queue.qsize())] == [
+            b'id: 1\n\n', b'event: presence\ndata: {"ride_id": 1, "user_ids": [1]}\n\n']
+
+    asyncio.run(scenario())
+
+
+def test_late_commit_of_lower_id_is_delivered():
+    async def scenario():
+        now = [0.0]
+        source = FakeSource()
+        gateway = ChatGateway(source, poll_interval=60, settle_seconds=10, clock=lambda: now[0])
+        server = await serve(gateway, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        await asyncio.sleep(0.05)  # let the tail finish its first (empty) poll
+        client = Client(1, None, 100)
+        gateway.join(client)
+
+        # Message 2 commits first; message 1 was inserted earlier but its transaction commits later
+        source.add(1, 20, 'second', message_id=2)
+        assert await gateway.poll_once() == 1
+        now[0] = 5.0
+        source.add(1, 10, 'first', message_id=1)
+        assert await gateway.poll_once() == 1
+        assert await gateway.poll_once() == 0
+        ids = [json.loads(client.queue.get_nowait().split(b'data: ')[1])['id'] for _ in range(2)]
+        assert ids == [2, 1]
+
+        # Resuming after event 2 replays message 1, which was delivered after it; after event 1 nothing is missing
+        reader, writer = await connect(port, '/rides/1/events', last_event_id=2)
+        event, data = await read_event(reader)
+        assert (event, data['id']) == ('message', 1)
+        assert (await read_event(reader))[0] == 'presence'
+        writer.close()
+        reader, writer = await connect(port, '/rides/1/events', last_event_id=1)
+        assert (await read_event(reader))[0] == 'presence'
+        writer.close()
+
+        # Once the delivered ids are settled the tail reads from above them again
+        now[0] = 20.0
+        await gateway.poll_once()
+        assert gateway.floor_id == 2
+
+        await gateway.stop()
+        server.close()
+
+    asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    test_rooms_presence_and_backfill()
+    test_slow_client_is_dropped()
+    test_slow_clients_are_dropped_with_one_presence_update()
+    test_late_commit_of_lower_id_is_delivered()
+    print("OK")
@@ -0,0 +1,104 @@
+import math
+import random
+
+import numpy as np
+
+from distance_kernel import CoordinateArray, haversine_km
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    dlat = math.radians(lat2 - lat1)
+    dlng = math.radians(lng2 - lng1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlng / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(a))
+
+
+def random_rows(seed, size):
+    rng = random.Random(seed)
+    return [(i, rng.uniform(48.5, 51.1), rng.uniform(12.0, 18.9)) for i in range(size)]
+
+
+def brute_force(rows, lat, lng, k=None, max_distance_km=None):
+    hits = [(key, haversine(lat, lng, rlat, rlng)) for key, rlat, rlng in rows]
+    if max_distance_km is not None:
+        hits = [hit for hit in hits if hit[1] <= max_distance_km]
+    hits.sort(key=lambda hit: hit[1])
+    return hits if k is None else hits[:max(k, 0)]
+
+
+def assert_same(actual, expected):
+    assert [key for key, _ in actual] == [key for key, _ in expected]
+    for (_, got), (_, want) in zip(actual, expected):
+        assert abs(got - want) < 1e-6
+
+
+def test_haversine_km_matches_scalar():
+    rows = random_rows(1, 500) + [(-1, 50.0755, 14.4378), (-2, -33.86, 151.21), (-3, 89.99, -179.9)]
+    lats = [lat for _, lat, _ in rows]
+    lngs = [lng for _, _, lng in rows]
+    for lat, lng in [(50.0755, 14.4378), (49.1951, 16.6068), (0.0, 0.0), (-45.0, 170.0)]:
+        distances = haversine_km(lat, lng, lats, lngs)
+        assert distances.shape == (len(rows),)
+        for distance, rlat, rlng in zip(distances, lats, lngs):
+            assert abs(distance - haversine(lat, lng, rlat, rlng)) < 1e-6
+    # Same point and antipode
+    assert haversine_km(50.0, 14.0, np.array([50.0]), np.array([14.0]))[0] == 0.0
+    assert abs(haversine_km(0.0, 0.0, np.array([0.0]), np.array([180.0]))[0] - math.pi * 6371.0) < 1e-6
+
+
+def test_nearest_matches_brute_force():
+    rows = random_rows(2, 3000)
+    coords = CoordinateArray.from_rows(rows)
+    rng = random.Random(3)
+    for _ in range(30):
+        lat, lng = rng.uniform(48.5, 51.1), rng.uniform(12.0, 18.9)
+        assert_same(coords.nearest(lat, lng), brute_force(rows, lat, lng))
+        for k in (0, 1, 7, 50, 2999, 3000, 5000):
+            assert_same(coords.nearest(lat, lng, k=k), brute_force(rows, lat, lng, k=k))
+        for radius in (0.5, 10, 50):
+            assert_same(coords.nearest(lat, lng, max_distance_km=radius),
+                        brute_force(rows, lat, lng, max_distance_km=radius))
+            assert_same(coords.nearest(lat, lng, k=5, max_distance_km=radius),
+                        brute_force(rows, lat, lng, k=5, max_distance_km=radius))
+
+
+def test_max_distance_is_inclusive_and_k_larger_than_hits():
+    rows = [('here', 50.0, 14.0), ('near', 50.05, 14.0), ('far', 51.0, 14.0)]
+    coords = CoordinateArray.from_rows(rows)
+    near_km = haversine(50.0, 14.0, 50.05, 14.0)
+    assert [key for key, _ in coords.nearest(50.0, 14.0, max_distance_km=near_km + 1e-9)] == ['here', 'near']
+    assert [key for key, _ in coords.nearest(50.0, 14.0, k=10, max_distance_km=20)] == ['here', 'near']
+    assert coords.nearest(50.0, 14.0, k=10, max_distance_km=0) == [('here', 0.0)]
+    assert coords.nearest(40.0, 14.0, k=3, max_distance_km=100) == []
+
+
+def test_nearest_many_matches_nearest():
+    rows = random_rows(4, 800)
+    coords = CoordinateArray.from_rows(rows)
+    points = [(49.1951, 16.6068), (50.0755, 14.4378), (49.8209, 18.2625)]
+    results = coords.nearest_many(points, k=20, max_distance_km=40)
+    assert len(results) == len(points)
+    for (lat, lng), result in zip(points, results):
+        assert_same(result, brute_force(rows, lat, lng, k=20, max_distance_km=40))
+
+
+def test_empty_and_mismatched_arrays():
+    empty = CoordinateArray.from_rows([])
+    assert len(empty) == 0
+    assert empty.nearest(50.0, 14.0, k=3) == []
+    assert empty.nearest_many([(50.0, 14.0), (49.0, 16.0)]) == [[], []]
+    try:
+        CoordinateArray([1, 2], [50.0], [14.0])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('mismatched lengths must be rejected')
+
+
+if __name__ == "__main__":
+    test_haversine_km_matches_scalar()
+    test_nearest_matches_brute_force()
+    test_max_distance_is_inclusive_and_k_larger_than_hits()
+    test_nearest_many_matches_nearest()
+    test_empty_and_mismatched_arrays()
+    print("OK")
@@ -0,0 +1,97 @@
+import math
+import random
+
+from geo_index import GridIndex
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    dlat = math.radians(lat2 - lat1)
+    dlng = math.radians(lng2 - lng1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlng / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(a))
+
+
+def brute_force(points, lat, lng, radius_km):
+    return {key for key, (plat, plng) in points.items() if haversine(lat, lng, plat, plng) <= radius_km}
+
+
+def build(points, cell_size=0.1):
+    index = GridIndex(cell_size)
+    for key, (lat, lng) in points.items():
+        index.insert(key, lat, lng)
+    return index
+
+
+def assert_matches_brute_force(index, points, lat, lng, radius_km):
+    hits = index.query_radius(lat, lng, radius_km)
+    assert {key for key, _ in hits} == brute_force(points, lat, lng, radius_km)
+    distances = [distance for _, distance in hits]
+    assert distances == sorted(distances)
+    for key, distance in hits:
+        assert abs(distance - haversine(lat, lng, *points[key])) < 1e-6
+
+
+def test_random_points_match_brute_force():
+    rng = random.Random(1)
+    points = {i: (rng.uniform(48.5, 51.1), rng.uniform(12.0, 18.9)) for i in range(2000)}
+    index = build(points)
+    for _ in range(50):
+        lat, lng = rng.uniform(48.5, 51.1), rng.uniform(12.0, 18.9)
+        assert_matches_brute_force(index, points, lat, lng, rng.choice([1, 5, 10, 25, 50]))
+
+
+def test_points_just_across_cell_edges():
+    # Query sits exactly on a cell corner; neighbours straddle it in every direction
+    points = {}
+    for i, (dlat, dlng) in enumerate([(1e-6, 1e-6), (-1e-6, 1e-6), (1e-6, -1e-6), (-1e-6, -1e-6),
+                                      (0.0899, 0), (-0.0899, 0), (0, 0.14), (0, -0.14), (0.09, 0.14)]):
+        points[i] = (50.0 + dlat, 14.0 + dlng)
+    index = build(points)
+    for radius_km in (0.001, 5, 9.99, 10, 10.01, 15):
+        assert_matches_brute_force(index, points, 50.0, 14.0, radius_km)
+        assert_matches_brute_force(index, points, 50.05, 14.05, radius_km)
+
+
+def test_high_latitude_radius_spans_many_longitude_cells():
+    # At 80° a 20 km circle covers ~1° of longitude, i.e. ten 0.1° cells
+    rng = random.Random(2)
+    points = {i: (rng.uniform(79.5, 80.5), rng.uniform(18.0, 22.0)) for i in range(1000)}
+    points['east'] = (80.0, 20.0 + 0.99)
+    points['west'] = (80.0, 20.0 - 0.99)
+    index = build(points)
+    assert {'east', 'west'} <= {key for key, _ in index.query_radius(80.0, 20.0, 20.0)}
+    for _ in range(30):
+        lat, lng = rng.uniform(79.6, 80.4), rng.uniform(18.5, 21.5)
+        assert_matches_brute_force(index, points, lat, lng, rng.choice([5, 20, 40]))
+    # Near the pole the longitude span is clamped, not blown up
+    points[0] = (89.95, 0.0)
+    index.insert(0, 89.95, 0.0)
+    assert_matches_brute_force(index, points, 89.9, 170.0, 50)
+
+
+def test_large_radius_walks_occupied_cells():
+    rng = random.Random(3)
+    points = {i: (rng.uniform(48.5, 51.1), rng.uniform(12.0, 18.9)) for i in range(300)}
+    index = build(points, cell_size=0.05)
+    assert_matches_brute_force(index, points, 49.8, 15.5, 400)
+
+
+def test_insert_replaces_and_remove_forgets():
+    index = GridIndex()
+    index.insert('a', 50.0, 14.0)
+    index.insert('a', 49.0, 16.0)
+    assert len(index) == 1
+    assert index.query_radius(50.0, 14.0, 5) == []
+    assert [key for key, _ in index.query_radius(49.0, 16.0, 1)] == ['a']
+    index.remove('a')
+    assert 'a' not in index
+    assert index.query_radius(49.0, 16.0, 1) == []
+
+
+if __name__ == "__main__":
+    test_random_points_match_brute_force()
+    test_points_just_across_cell_edges()
+    test_high_latitude_radius_spans_many_longitude_cells()
+    test_large_radius_walks_occupied_cells()
+    test_insert_replaces_and_remove_forgets()
+    print("OK")
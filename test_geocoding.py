@@ -0,0 +1,94 @@
+import os
+import tempfile
+
+from geocoding import Gazetteer, Geocoder, fold_text, geocode
+
+PLACES = {
+    'Praha': (50.0755, 14.4378),
+    'Plzeň': (49.7384, 13.3736),
+    'Ústí nad Labem': (50.6607, 14.0323),
+    'České Budějovice': (48.9745, 14.4743),
+    'Frýdek-Místek': (49.6881, 18.3536),
+}
+
+
+def test_fold_text():
+    assert fold_text('  ČESKÉ  Budějovice ') == 'ceske budejovice'
+    assert fold_text('Frýdek-Místek') == 'frydek mistek'
+    assert fold_text('Ústí_nad.Labem') == 'usti nad labem'
+
+
+def test_lookup_ignores_diacritics_and_case():
+    gazetteer = Gazetteer(PLACES)
+    assert gazetteer.lookup('plzen') == PLACES['Plzeň']
+    assert gazetteer.lookup('PLZEŇ') == PLACES['Plzeň']
+    assert gazetteer.lookup('usti nad labem') == PLACES['Ústí nad Labem']
+    assert gazetteer.lookup('ceske budejovice') == PLACES['České Budějovice']
+    assert gazetteer.lookup('Frydek Mistek') == PLACES['Frýdek-Místek']
+    assert gazetteer.lookup('Plzeňsko') is None
+
+
+def test_resolve_tries_comma_separated_parts():
+    geocoder = Geocoder(Gazetteer(PLACES))
+    assert geocoder.resolve('Praha') == PLACES['Praha']
+    assert geocoder.resolve('Náměstí Republiky 1, Plzeň') == PLACES['Plzeň']
+    assert geocoder.resolve('české budějovice, Jihočeský kraj') == PLACES['České Budějovice']
+
+
+def test_unknown_and_empty_locations():
+    geocoder = Geocoder(Gazetteer(PLACES))
+    assert geocoder.resolve('Atlantida') is None
+    assert geocoder.resolve('Ulice 5, Atlantida') is None
+    assert geocoder.resolve('') is None
+    assert geocoder.resolve('   ') is None
+    assert geocoder.resolve(None) is None
+
+
+def test_results_are_cached_including_misses():
+    calls = []
+
+    class CountingGazetteer(Gazetteer):
+        def lookup(self, name):
+            calls.append(name)
+            return super().lookup(name)
+
+    geocoder = Geocoder(CountingGazetteer(PLACES), cache_size=2)
+    assert geocoder.resolve('Praha') == PLACES['Praha']
+    assert geocoder.resolve('Atlantida') is None
+    assert geocoder.resolve('Praha') == PLACES['Praha']
+    assert geocoder.resolve('Atlantida') is None
+    assert calls == ['Praha', 'Atlantida', 'Atlantida']
+
+    # Oldest entry is evicted once the cache is full
+    geocoder.resolve('Plzeň')
+    geocoder.resolve('Atlantida')
+    geocoder.resolve('Praha')
+    assert calls[-1] == 'Praha'
+
+
+def test_load_skips_malformed_rows():
+    with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as handle:
+        handle.write('name,lat,lng\nBrno,49.1951,16.6068\nNikde,,\nŽďár nad Sázavou,49.5626,15.9392\n')
+    try:
+        gazetteer = Gazetteer.load(handle.name)
+    finally:
+        os.unlink(handle.name)
+    assert len(gazetteer) == 2
+    assert gazetteer.lookup('zdar nad sazavou') == (49.5626, 15.9392)
+
+
+def test_default_gazetteer():
+    assert geocode('BRNO') == geocode('Brno') is not None
+    assert geocode('Plzen, Česko') == geocode('Plzeň')
+    assert geocode('Atlantida') is None
+
+
+if __name__ == "__main__":
+    test_fold_text()
+    test_lookup_ignores_diacritics_and_case()
+    test_resolve_tries_comma_separated_parts()
+    test_unknown_and_empty_locations()
+    test_results_are_cached_including_misses()
+    test_load_skips_malformed_rows()
+    test_default_gazetteer()
+    print("OK")
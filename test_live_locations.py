@@ -0,0 +1,78 @@
+import multiprocessing
+import os
+import tempfile
+
+from live_locations import LiveLocationStore
+
+PRAHA = (50.0755, 14.4378)
+KLADNO = (50.1473, 14.1029)
+BRNO = (49.1951, 16.6068)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _write_from_other_process(path):
+    store = LiveLocationStore(path)
+    store.update(42, *BRNO)
+    store.close()
+
+
+def test_update_expire_and_prune():
+    with tempfile.TemporaryDirectory() as tmp:
+        clock = Clock()
+        store = LiveLocationStore(os.path.join(tmp, 'live.db'), ttl=60, prune_interval=1000, clock=clock)
+        store.update(1, *PRAHA)
+        clock.now += 30
+        store.update(2, *BRNO)
+        store.update(1, *KLADNO)
+        assert [location.user_id for location in store.active()] == [2, 1]
+        assert store.get(1).lat == KLADNO[0]
+
+        clock.now += 61
+        store.update(3, *PRAHA)
+        assert [location.user_id for location in store.active()] == [3]
+        assert store.get(2) is None
+        assert store.stats() == {'stored': 3, 'active': 1}
+        assert store.prune() == 2
+        assert store.stats() == {'stored': 1, 'active': 1}
+        store.close()
+
+
+def test_near_uses_distance():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = LiveLocationStore(os.path.join(tmp, 'live.db'))
+        store.update(1, *PRAHA)
+        store.update(2, *KLADNO)
+        store.update(3, *BRNO)
+        store.update(4, PRAHA[0] + 0.01, PRAHA[1])
+        assert [location.user_id for location in store.near(*PRAHA, radius_km=5)] == [1, 4]
+        assert [location.user_id for location in store.near(*PRAHA, radius_km=40)] == [1, 4, 2]
+        assert [location.user_id for location in store.near(*PRAHA, radius_km=40, limit=1)] == [1]
+        assert store.near(0.0, 0.0, radius_km=100) == []
+        store.close()
+
+
+def test_shared_between_processes():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'live.db')
+        store = LiveLocationStore(path)
+        store.update(1, *PRAHA)
+        process = multiprocessing.get_context('spawn').Process(target=_write_from_other_process, args=(path,))
+        process.start()
+        process.join(30)
+        assert process.exitcode == 0
+        assert {location.user_id for location in store.active()} == {1, 42}
+        store.close()
+
+
+if __name__ == "__main__":
+    test_update_expire_and_prune()
+    test_near_uses_distance()
+    test_shared_between_processes()
+    print("OK")
@@ -0,0 +1,91 @@
+import os
+import tempfile
+import time
+
+import pytest
+
+from live_locations import LiveLocationStore
+from location_ingest import Fix, LocationWriter, decode_fix, decode_fixes, encode_fixes
+
+TRACK = [Fix(50.07554, 14.43781, 1_760_000_000_000, 5.0, 13.9, 90.0),
+         Fix(50.07561, 14.43802, 1_760_000_001_000, 4.0, 14.2, None),
+         Fix(50.07570, 14.43830, 1_760_000_002_000)]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_roundtrip_is_compact():
+    rows = encode_fixes(TRACK)
+    assert rows[1] == [7, 21, 1000, 4.0, 14.2]
+    assert rows[2] == [9, 28, 1000]
+    decoded = decode_fixes(rows)
+    assert [fix.ts for fix in decoded] == [fix.ts for fix in TRACK]
+    assert all(abs(a.lat - b.lat) < 1e-9 and abs(a.lng - b.lng) < 1e-9 for a, b in zip(decoded, TRACK))
+    assert decoded[0].heading == 90.0 and decoded[1].heading is None
+
+
+@pytest.mark.parametrize('rows', [None, [], [[1, 2]], [[1.5, 2, 3]], [[True, 2, 3]], [[9_100_000, 0, 0]],
+                                  [[1, 2, 3, 'x']], [[0, 0, 0]] * 1001])
+def test_rejects_malformed(rows):
+    with pytest.raises(ValueError):
+        decode_fixes(rows)
+
+
+def test_decode_single_fix():
+    fix = decode_fix({'latitude': 50.08, 'longitude': '14.42', 'accuracy': 5, 'heading': 270.5}, 1000)
+    assert fix == Fix(50.08, 14.42, 1000, 5.0, None, 270.5)
+
+
+@pytest.mark.parametrize('data', [{}, {'latitude': 50}, {'latitude': 'x', 'longitude': 14}, {'latitude': 91, 'longitude': 14},
+                                  {'latitude': 50, 'longitude': 14, 'accuracy': 'x'},
+                                  {'latitude': 50, 'longitude': 14, 'speed': True},
+                                  {'latitude': 50, 'longitude': 14, 'heading': [90]}])
+def test_decode_single_fix_rejects_malformed(data):
+    with pytest.raises(ValueError):
+        decode_fix(data, 1000)
+
+
+def test_writer_keeps_newest_fix_and_ignores_client_clock():
+    with tempfile.TemporaryDirectory() as tmp:
+        clock = Clock()
+        store = LiveLocationStore(os.path.join(tmp, 'live.db'), clock=clock)
+        writer = LocationWriter(store, flush_interval=3600, clock=clock)
+        writer.add(1, TRACK)
+        writer.add(1, TRACK[:1])  # late, older batch
+        writer.add(2, [TRACK[0]._replace(ts=0)])  # client clock far off
+        assert writer.pending() == 2
+        assert writer.flush() == 2
+        assert writer.pending() == 0
+        latest = store.get(1)
+        assert (latest.lat, latest.lng, latest.updated_at) == (TRACK[2].lat, TRACK[2].lng, clock.now)
+        assert store.get(2).updated_at == clock.now
+        assert writer.stats == {'batches': 3, 'fixes': 5, 'flushes': 1, 'written': 2}
+        writer.stop()
+        store.close()
+
+
+def test_writer_flushes_periodically():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = LiveLocationStore(os.path.join(tmp, 'live.db'))
+        writer = LocationWriter(store, flush_interval=0.05)
+        writer.add(7, TRACK)
+        deadline = time.time() + 5
+        while writer.pending() and time.time() < deadline:
+            time.sleep(0.01)
+        writer.stop()
+        assert store.get(7).lat == TRACK[2].lat
+        store.close()
+
+
+if __name__ == "__main__":
+    test_roundtrip_is_compact()
+    test_decode_single_fix()
+    test_writer_keeps_newest_fix_and_ignores_client_clock()
+    test_writer_flushes_periodically()
+    print("OK")
@@ -0,0 +1,118 @@
+import csv
+import json
+import random
+import datetime
+
+import pytest
+
+from src.matching import MatchingEngine
+from src.models import UserRequest, UserRequestBatch
+
+
+def make_requests(count, seed=7, center=(49.1951, 16.6068), spread=0.3, lon_center=None):
+    rng = random.Random(seed)
+    base = datetime.datetime(2026, 3, 2, 6, 0)
+    lat0, lon0 = center
+    if lon_center is not None:
+        lon0 = lon_center
+    requests = []
+    for i in range(count):
+        departure = base + datetime.timedelta(minutes=rng.randrange(0, 240))
+        requests.append(UserRequest(
+            f"user{i}",
+            lat0 + rng.uniform(-spread, spread), lon0 + rng.uniform(-spread, spread),
+            lat0 + rng.uniform(-spread, spread), lon0 + rng.uniform(-spread, spread),
+            departure.strftime("%Y-%m-%d %H:%M"),
+        ))
+    return requests
+
+
+def assert_same_matches(requests, radius_km, tolerance):
+    reference = MatchingEngine(requests, radius_km, tolerance, strategy="brute_force").find_matches()
+    bucketed = MatchingEngine(requests, radius_km, tolerance).find_matches()
+    assert bucketed == reference
+    return reference
+
+
+def test_bucketed_matches_brute_force():
+    requests = make_requests(600)
+    matches = assert_same_matches(requests, 5.0, 15)
+    assert matches, "test data should produce some matches"
+
+
+def test_parallel_matches_brute_force():
+    requests = make_requests(400, seed=11)
+    reference = assert_same_matches(requests, 5.0, 15)
+    for workers in (2, 3):
+        parallel = MatchingEngine(requests, 5.0, 15, workers=workers).find_matches()
+        assert parallel == reference
+
+
+def test_bucketed_edge_parameters():
+    requests = make_requests(200, seed=3, spread=0.05)
+    assert_same_matches(requests, 0.0, 0)
+    assert_same_matches(requests, 500.0, 1000)
+    assert_same_matches(requests, 2.0, -1)
+
+
+def test_bucketed_across_antimeridian():
+    requests = make_requests(200, seed=5, center=(64.0, 0.0), spread=0.2, lon_center=179.9)
+    for request in requests:
+        if request.start_lon > 180:
+            request.start_lon -= 360
+        if request.end_lon > 180:
+            request.end_lon -= 360
+    assert_same_matches(requests, 10.0, 30)
+
+
+def as_id_matches(matches):
+    return [(user1.id, user2.id, ds, de, dt) for user1, user2, ds, de, dt in matches]
+
+
+def test_batch_matches_request_objects():
+    requests = make_requests(500, seed=13)
+    reference = as_id_matches(assert_same_matches(requests, 5.0, 15))
+    batch = UserRequestBatch.from_requests(requests)
+    assert len(batch) == len(requests)
+    assert MatchingEngine(batch, 5.0, 15).find_matches() == reference
+    assert MatchingEngine(batch, 5.0, 15, strategy="brute_force").find_matches() == reference
+    assert MatchingEngine(batch, 5.0, 15, workers=2).find_matches() == reference
+
+
+def test_batch_loaders(tmp_path):
+    requests = make_requests(300, seed=17)
+    rows = [
+        {
+            "user_id": request.id,
+            "start_lat": request.start_lat, "start_lon": request.start_lon,
+            "end_lat": request.end_lat, "end_lon": request.end_lon,
+            "departure_time": request.departure_time.strftime("%Y-%m-%d %H:%M"),
+        }
+        for request in requests
+    ]
+    csv_path = tmp_path / "requests.csv"
+    with open(csv_path, "w", newline="", encoding="utf-8") as handle:
+        writer = csv.DictWriter(handle, fieldnames=list(reversed(list(rows[0]))))
+        writer.writeheader()
+        writer.writerows(rows)
+    json_path = tmp_path / "requests.json"
+    json_path.write_text(json.dumps(rows), encoding="utf-8")
+
+    expected = UserRequestBatch.from_requests(requests)
+    for batch in (UserRequestBatch.from_csv(csv_path), UserRequestBatch.from_json(json_path)):
+        assert batch.ids == expected.ids
+        assert batch.departure_minutes == expected.departure_minutes
+        assert batch.start_lat == expected.start_lat and batch.end_lon == expected.end_lon
+    assert repr(expected.get(7)) == repr(requests[7])
+
+    with pytest.raises(ValueError):
+        UserRequestBatch().append("bad", 0, 0, 0, 0, "2026-03-02 6:00")
+
+
+if __name__ == "__main__":
+    test_bucketed_matches_brute_force()
+    test_parallel_matches_brute_force()
+    test_bucketed_edge_parameters()
+    test_bucketed_across_antimeridian()
+    test_batch_matches_request_objects()
+    print("OK")
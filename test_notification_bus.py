@@ -0,0 +1,77 @@
+import threading
+import time
+
+from notification_bus import InboxRelay, NotificationBus
+
+
+def test_publish_and_cursor():
+    bus = NotificationBus(history_size=3)
+    cursor = bus.latest(1)
+    first = bus.publish([1, 2, 2], {'message': 'a'})
+    second = bus.publish([1], {'message': 'b'})
+    assert first < second
+    assert bus.events_after(1, cursor) == [(first, {'message': 'a'}), (second, {'message': 'b'})]
+    assert bus.events_after(1, first) == [(second, {'message': 'b'})]
+    assert bus.events_after(2, cursor) == [(first, {'message': 'a'})]
+    assert bus.events_after(3, cursor) == []
+    for i in range(5):
+        bus.publish([1], {'message': i})
+    assert [event['message'] for _, event in bus.events_after(1, cursor)] == [2, 3, 4]
+
+
+def test_wait_blocks_until_publish():
+    bus = NotificationBus()
+    received = []
+    waiter = threading.Thread(target=lambda: received.extend(bus.wait(7, bus.latest(7), timeout=5)))
+    waiter.start()
+    time.sleep(0.1)
+    assert bus.subscriber_count(7) == 1
+    bus.publish([8], {'message': 'not for 7'})
+    bus.publish([7], {'message': 'hi'})
+    waiter.join(2)
+    assert [event for _, event in received] == [{'message': 'hi'}]
+    assert bus.subscriber_count() == 0
+
+
+def test_wait_times_out_without_events():
+    bus = NotificationBus()
+    started = time.monotonic()
+    assert bus.wait(1, bus.latest(1), timeout=0.05) == []
+    assert time.monotonic() - started < 1
+
+
+def test_relay_publishes_rows_from_other_processes():
+    now = [0.0]
+    rows = []  # (id, user_id, message_id, event), as in notification_inbox
+    bus = NotificationBus()
+    relay = InboxRelay(bus, lambda after_id, limit: sorted(row for row in rows if row[0] > after_id)[:limit],
+                       lambda: 0, settle_seconds=10, clock=lambda: now[0])
+    cursor = bus.latest(1)
+
+    # Message 7 was sent by this process and already published; message 8 came from another worker
+    relay.mark_published(7)
+    rows += [(1, 1, 7, {'message': 'local'}), (2, 2, 7, {'message': 'local'}),
+             (4, 1, 8, {'message': 'remote'}), (5, 2, 8, {'message': 'remote'})]
+    assert relay.poll_once() == 1
+    assert [event for _, event in bus.events_after(1, cursor)] == [{'message': 'remote'}]
+    assert [event for _, event in bus.events_after(2, cursor)] == [{'message': 'remote'}]
+
+    # Row 3 commits after rows 4 and 5: still relayed, and nothing is published twice
+    now[0] = 5.0
+    rows.append((3, 1, 9, {'message': 'late'}))
+    assert relay.poll_once() == 1
+    assert relay.poll_once() == 0
+    assert [event['message'] for _, event in bus.events_after(1, cursor)] == ['remote', 'late']
+    assert relay.stats == {'relayed': 3, 'skipped_local': 2}
+
+    now[0] = 20.0
+    relay.poll_once()
+    assert relay.floor_id == 5
+
+
+if __name__ == "__main__":
+    test_publish_and_cursor()
+    test_wait_blocks_until_publish()
+    test_wait_times_out_without_events()
+    test_relay_publishes_rows_from_other_processes()
+    print("OK")
@@ -0,0 +1,66 @@
+import hashlib
+import threading
+import time
+
+import bcrypt
+import pytest
+
+from password_hashing import HashingOverloaded, PasswordHasher, hash_cost
+
+
+def test_hash_and_verify():
+    hasher = PasswordHasher(rounds=4, threads=2)
+    stored = hasher.hash('heslo123')
+    assert hash_cost(stored) == 4
+    assert hasher.verify('heslo123', stored) == (True, None)
+    assert hasher.verify('spatne', stored) == (False, None)
+    assert hasher.verify('heslo123', None) == (False, None)
+    assert hasher.verify('heslo123', 'not a hash') == (False, None)
+    hasher.shutdown()
+
+
+def test_rehash_on_cost_change_and_legacy_sha256():
+    old = bcrypt.hashpw(b'heslo123', bcrypt.gensalt(5)).decode('utf-8')
+    hasher = PasswordHasher(rounds=4, threads=1)
+    matches, new_hash = hasher.verify('heslo123', old)
+    assert matches and hash_cost(new_hash) == 4
+    assert hasher.verify('heslo123', new_hash) == (True, None)
+    assert hasher.verify('spatne', old) == (False, None)
+
+    legacy = hashlib.sha256(b'heslo123').hexdigest()
+    matches, new_hash = hasher.verify('heslo123', legacy)
+    assert matches and bcrypt.checkpw(b'heslo123', new_hash.encode('utf-8'))
+    assert hasher.verify('spatne', legacy) == (False, None)
+    assert hasher.stats()['rehashed'] == 2
+    hasher.shutdown()
+
+
+def test_overload_is_rejected():
+    hasher = PasswordHasher(rounds=4, threads=1, max_pending=1)
+    release = threading.Event()
+    hasher._get_executor().submit(release.wait)  # occupy the only worker outside the slot accounting
+    results = []
+
+    def login():
+        results.append(hasher.verify('heslo123', hashlib.sha256(b'heslo123').hexdigest())[0])
+
+    waiting = [threading.Thread(target=login) for _ in range(2)]
+    for thread in waiting:
+        thread.start()
+    while hasher._slots._value:
+        time.sleep(0.001)
+    with pytest.raises(HashingOverloaded):
+        hasher.hash('heslo123')
+    assert hasher.stats()['rejected'] == 1
+    release.set()
+    for thread in waiting:
+        thread.join()
+    assert results == [True, True]
+    hasher.shutdown()
+
+
+if __name__ == "__main__":
+    test_hash_and_verify()
+    test_rehash_on_cost_change_and_legacy_sha256()
+    test_overload_is_rejected()
+    print("OK")
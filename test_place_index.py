@@ -0,0 +1,38 @@
+from place_index import PlaceIndex, get_place_index
+
+NAMES = ['Praha', 'Brno', 'Ostrava', 'Plzeň', 'Ústí nad Labem', 'Lysá nad Labem', 'Prachatice', 'Příbram']
+
+
+def test_prefix_search_is_diacritics_insensitive():
+    index = PlaceIndex(NAMES)
+    assert index.search('plzen')[0] == ('Plzeň', 1.0)
+    assert index.search('PŘÍB')[0][0] == 'Příbram'
+    assert [name for name, _ in index.search('pra', 2)] == ['Praha', 'Prachatice']
+
+
+def test_word_prefix_and_typos():
+    index = PlaceIndex(NAMES)
+    assert {name for name, _ in index.search('labem')} == {'Ústí nad Labem', 'Lysá nad Labem'}
+    assert index.search('prga')[0][0] == 'Praha'
+    assert index.search('xyzzy') == []
+    assert index.search('') == []
+
+
+def test_duplicates_are_folded_once():
+    index = PlaceIndex(['Plzeň', 'Plzen', 'PLZEŇ'])
+    assert len(index) == 1
+
+
+def test_default_index_loads_gazetteer():
+    index = get_place_index()
+    assert index is get_place_index()
+    assert len(index) > 100
+    assert index.search('hradec k')[0][0] == 'Hradec Králové'
+
+
+if __name__ == "__main__":
+    test_prefix_search_is_diacritics_insensitive()
+    test_word_prefix_and_typos()
+    test_duplicates_are_folded_once()
+    test_default_index_loads_gazetteer()
+    print("OK")
@@ -0,0 +1,120 @@
+import datetime
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sqlalchemy import create_engine, text
+
+from push_dispatcher import PushDispatcher, enqueue, http_sender
+
+SCHEMA = [
+    "CREATE TABLE push_subscription (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, endpoint VARCHAR(512) UNIQUE NOT NULL,"
+    " p256dh VARCHAR(256) NOT NULL, auth VARCHAR(128) NOT NULL, created_at DATETIME)",
+    "CREATE TABLE push_outbox (id INTEGER PRIMARY KEY, user_ids TEXT NOT NULL, endpoints TEXT, payload TEXT NOT NULL,"
+    " attempts INTEGER NOT NULL DEFAULT 0, available_at DATETIME NOT NULL, created_at DATETIME NOT NULL)",
+]
+
+
+class PushService(BaseHTTPRequestHandler):
+    """Stand-in push service: the path picks the status, /slow/ tracks concurrency."""
+    received = []
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        cls = type(self)
+        with cls.lock:
+            cls.received.append((self.path, json.loads(body)))
+            cls.active += 1
+            cls.peak = max(cls.peak, cls.active)
+        if self.path.startswith('/slow/'):
+            time.sleep(0.05)
+        with cls.lock:
+            cls.active -= 1
+        status = 410 if self.path.startswith('/gone/') else 500 if self.path.startswith('/error/') else 201
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def setup(tmp):
+    PushService.received = []
+    PushService.peak = 0
+    server = ThreadingHTTPServer(('127.0.0.1', 0), PushService)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    engine = create_engine('sqlite:///' + os.path.join(tmp, 'push.db'))
+    with engine.begin() as connection:
+        for sql in SCHEMA:
+            connection.execute(text(sql))
+    return server, engine, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def subscribe(engine, user_id, endpoint):
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO push_subscription (user_id, endpoint, p256dh, auth) VALUES (:u, :e, 'k', 'a')"),
+                           {'u': user_id, 'e': endpoint})
+
+
+def test_send_prune_and_retry():
+    with tempfile.TemporaryDirectory() as tmp:
+        server, engine, base = setup(tmp)
+        subscribe(engine, 1, base + '/ok/1')
+        subscribe(engine, 1, base + '/gone/1')
+        subscribe(engine, 2, base + '/error/2')
+        subscribe(engine, 2, base + '/ok/2')
+        with engine.begin() as connection:
+            enqueue(connection, [1, 2, 3], {'title': 'Ahoj'})
+
+        dispatcher = PushDispatcher(engine, http_sender(timeout=5), workers=4)
+        now = datetime.datetime.now()
+        assert dispatcher.drain_once(now) == 1
+        assert sorted(path for path, _ in PushService.received) == ['/error/2', '/gone/1', '/ok/1', '/ok/2']
+        assert dispatcher.stats == {'sent': 2, 'failed': 1, 'pruned': 1, 'dropped': 0}
+        with engine.begin() as connection:
+            endpoints = [row[0] for row in connection.execute(text("SELECT endpoint FROM push_subscription ORDER BY id"))]
+            retry = connection.execute(text("SELECT user_ids, endpoints, attempts FROM push_outbox")).fetchall()
+        assert base + '/gone/1' not in endpoints
+        assert retry == [('[2]', json.dumps([base + '/error/2']), 1)]
+
+        # Retry is not due yet; once it is, only the failed endpoint is tried again
+        assert dispatcher.drain_once(now) == 0
+        PushService.received = []
+        assert dispatcher.drain_once(now + datetime.timedelta(minutes=5)) == 1
+        assert [path for path, _ in PushService.received] == ['/error/2']
+        dispatcher.stop()
+        server.shutdown()
+
+
+def test_per_origin_limit_and_background_worker():
+    with tempfile.TemporaryDirectory() as tmp:
+        server, engine, base = setup(tmp)
+        for user_id in range(1, 21):
+            subscribe(engine, user_id, f'{base}/slow/{user_id}')
+        with engine.begin() as connection:
+            enqueue(connection, range(1, 21), {'title': 'Ahoj'})
+
+        dispatcher = PushDispatcher(engine, http_sender(timeout=5), workers=8, per_origin_limit=2, poll_interval=0.05)
+        dispatcher.wake()
+        deadline = time.monotonic() + 5
+        while dispatcher.stats['sent'] < 20 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        dispatcher.stop()
+        server.shutdown()
+        assert dispatcher.stats['sent'] == 20
+        assert PushService.peak <= 2
+        with engine.begin() as connection:
+            assert connection.execute(text("SELECT COUNT(*) FROM push_outbox")).scalar() == 0
+
+
+if __name__ == "__main__":
+    test_send_prune_and_retry()
+    test_per_origin_limit_and_background_worker()
+    print("OK")
@@ -0,0 +1,76 @@
+import os
+import tempfile
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from rating_aggregates import backfill, record_rating, score
+
+SCHEMA = [
+    "CREATE TABLE users (id INTEGER PRIMARY KEY, name VARCHAR(100), rating FLOAT)",
+    "CREATE TABLE ratings (id INTEGER PRIMARY KEY, ride_id INTEGER, rater_id INTEGER, rated_id INTEGER, rating INTEGER)",
+    "CREATE TABLE rating_aggregates (user_id INTEGER PRIMARY KEY, rating_sum INTEGER NOT NULL, rating_count INTEGER NOT NULL,"
+    " updated_at DATETIME)",
+]
+
+
+def make_engine(tmp):
+    engine = create_engine('sqlite:///' + os.path.join(tmp, 'ratings.db'))
+    with engine.begin() as connection:
+        for sql in SCHEMA:
+            connection.execute(text(sql))
+        for user_id in (1, 2, 3):
+            connection.execute(text("INSERT INTO users (id, name, rating) VALUES (:id, 'u', 5.0)"), {'id': user_id})
+    return engine
+
+
+def rate(connection, user_id, rating, **prior):
+    connection.execute(text("INSERT INTO ratings (ride_id, rater_id, rated_id, rating) VALUES (1, 9, :user_id, :rating)"),
+                       {'user_id': user_id, 'rating': rating})
+    record_rating(connection, user_id, rating, **prior)
+
+
+def ratings_by_user(connection):
+    return dict(connection.execute(text("SELECT id, rating FROM users")).fetchall())
+
+
+def test_score():
+    assert score(9, 2) == 4.5
+    assert score(0, 0) is None
+    assert score(1, 1, prior_weight=3, prior_mean=5.0) == 4.0
+
+
+def test_incremental_matches_average_and_backfill():
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(tmp)
+        with engine.begin() as connection:
+            for rating in (5, 4, 3):
+                rate(connection, 1, rating)
+            rate(connection, 2, 2)
+            incremental = ratings_by_user(connection)
+            assert incremental == {1: 4.0, 2: 2.0, 3: 5.0}
+            aggregates = connection.execute(text("SELECT user_id, rating_sum, rating_count FROM rating_aggregates ORDER BY user_id")).fetchall()
+            assert [tuple(row) for row in aggregates] == [(1, 12, 3), (2, 2, 1)]
+
+            connection.execute(text("UPDATE rating_aggregates SET rating_sum = 0"))
+            assert backfill(connection) == 2
+            assert ratings_by_user(connection) == incremental
+        engine.dispose()
+
+
+def test_bayesian_smoothing():
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(tmp)
+        with engine.begin() as connection:
+            rate(connection, 1, 1, prior_weight=3, prior_mean=5.0)
+            assert ratings_by_user(connection)[1] == 4.0
+            assert backfill(connection, prior_weight=1, prior_mean=5.0) == 1
+            assert ratings_by_user(connection)[1] == pytest.approx(3.0)
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    test_score()
+    test_incremental_matches_average_and_backfill()
+    test_bayesian_smoothing()
+    print("OK")
@@ -0,0 +1,90 @@
+import os
+import tempfile
+import threading
+
+from sqlalchemy import event
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmp.name, 'reservations.db')
+
+import main_app  # noqa: E402  (DATABASE_URL must be set first)
+from main_app import app, db  # noqa: E402
+
+SCHEMA = [
+    "CREATE TABLE users (id INTEGER PRIMARY KEY, name VARCHAR(100), phone VARCHAR(20), rating FLOAT)",
+    "CREATE TABLE rides (id INTEGER PRIMARY KEY, user_id INTEGER, from_location VARCHAR(100), to_location VARCHAR(100),"
+    " departure_time DATETIME, available_seats INTEGER, price_per_person INTEGER, created_at DATETIME)",
+    "CREATE TABLE reservations (id INTEGER PRIMARY KEY, ride_id INTEGER, passenger_id INTEGER, seats_reserved INTEGER,"
+    " status VARCHAR(20), created_at DATETIME)",
+    "CREATE TABLE payments (id INTEGER PRIMARY KEY, ride_id INTEGER, passenger_id INTEGER, status VARCHAR(20))",
+]
+
+PASSENGER = 1
+DRIVERS = range(2, 12)
+RESERVATIONS = 200
+
+
+def setup_module():
+    with app.app_context(), db.engine.begin() as connection:
+        for sql in SCHEMA:
+            connection.exec_driver_sql(sql)
+        connection.exec_driver_sql("INSERT INTO users (id, name, phone) VALUES (1, 'Pasažér', '+420100')")
+        for driver_id in DRIVERS:
+            connection.exec_driver_sql(f"INSERT INTO users (id, name, phone) VALUES ({driver_id}, 'Řidič {driver_id}', '+420{driver_id:03d}')")
+        for ride_id in range(1, RESERVATIONS + 1):
+            driver_id = DRIVERS[ride_id % len(DRIVERS)]
+            connection.exec_driver_sql(
+                "INSERT INTO rides (id, user_id, from_location, to_location, departure_time, available_seats, price_per_person)"
+                f" VALUES ({ride_id}, {driver_id}, 'Praha', 'Brno', '2026-11-{ride_id % 28 + 1:02d} 08:00:00', 3, 200)")
+            connection.exec_driver_sql(
+                "INSERT INTO reservations (ride_id, passenger_id, seats_reserved, status, created_at)"
+                f" VALUES ({ride_id}, {PASSENGER}, 1, 'confirmed', '2026-10-01 10:00:00')")
+            if ride_id % 3 == 0:
+                connection.exec_driver_sql(f"INSERT INTO payments (ride_id, passenger_id, status) VALUES ({ride_id}, {PASSENGER}, 'completed')")
+
+
+def count_queries(path):
+    statements = []
+
+    request_thread = threading.get_ident()
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        # Only the request's own queries; background workers (notification relay) share the engine
+        if threading.get_ident() == request_thread:
+            statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = app.test_client().get(path)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json(), statements
+
+
+def test_user_reservations_constant_queries():
+    reservations, statements = count_queries(f'/api/reservations/user/{PASSENGER}')
+    assert len(reservations) == RESERVATIONS
+    assert len(statements) <= 4, statements
+    paid = [r for r in reservations if r['is_paid']]
+    assert len(paid) == RESERVATIONS // 3
+    assert all(r['driver_phone'].startswith('+420') for r in paid)
+    assert all(r['driver_phone'] == "Skryto - zaplaťte nejdříve" for r in reservations if not r['is_paid'])
+    departures = [r['departure_time'] for r in reservations]
+    assert departures == sorted(departures)
+
+
+def test_driver_reservations_constant_queries():
+    reservations, statements = count_queries(f'/api/reservations/driver/{DRIVERS[0]}')
+    assert len(reservations) == RESERVATIONS // len(DRIVERS)
+    assert len(statements) <= 3, statements
+    assert {r['passenger_name'] for r in reservations} == {'Pasažér'}
+
+
+if __name__ == "__main__":
+    setup_module()
+    test_user_reservations_constant_queries()
+    test_driver_reservations_constant_queries()
+    print("OK")
@@ -0,0 +1,71 @@
+from ride_membership import RideMembershipCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_cache(rides, **kwargs):
+    calls = []
+
+    def load_ride(ride_id):
+        calls.append(('ride', ride_id))
+        return rides.get(ride_id)
+
+    return RideMembershipCache(load_ride, **kwargs), calls
+
+
+def test_hits_misses_and_updates():
+    rides = {1: (10, [11, 12]), 2: (11, [])}
+    cache, calls = make_cache(rides)
+    assert cache.participant_ids(1) == [10, 11, 12]
+    assert cache.participant_ids(1) == [10, 11, 12]
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+    rides[1][1].append(13)
+    cache.add_passenger(1, 13)
+    cache.add_ride(3, 11)
+    assert cache.participant_ids(1) == [10, 11, 12, 13]
+    assert cache.participant_ids(3) == [11]
+    assert calls == [('ride', 1)]
+
+    cache.remove_ride(1)
+    del rides[1]
+    assert cache.participant_ids(1) == []
+    assert calls == [('ride', 1), ('ride', 1)]
+
+    assert cache.participant_ids(99) == []
+
+
+def test_cancelled_reservation_reloads():
+    rides = {1: (10, [11])}
+    cache, calls = make_cache(rides)
+    cache.participants(1)
+    rides[1] = (10, [])
+    cache.invalidate_reservation(1, 11)
+    assert cache.participant_ids(1) == [10]
+    assert calls.count(('ride', 1)) == 2
+
+
+def test_ttl_and_bounded_size():
+    clock = FakeClock()
+    rides = {i: (i, []) for i in range(10)}
+    cache, calls = make_cache(rides, max_entries=3, ttl=60, clock=clock)
+    for ride_id in range(5):
+        cache.participants(ride_id)
+    assert cache.stats()['rides'] == 3 and cache.stats()['evictions'] == 2
+    cache.participants(4)
+    clock.now = 61
+    cache.participants(4)
+    assert calls.count(('ride', 4)) == 2
+
+
+if __name__ == "__main__":
+    test_hits_misses_and_updates()
+    test_cancelled_reservation_reloads()
+    test_ttl_and_bounded_size()
+    print("OK")
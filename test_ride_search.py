@@ -0,0 +1,57 @@
+import sqlite3
+
+from ride_search import FTS5, LIKE, TSVECTOR, detect_backend, fts5_query, ride_text_condition, tsquery
+
+
+def make_db(with_fts):
+    conn = sqlite3.connect(':memory:')
+    conn.execute("CREATE TABLE rides (id INTEGER PRIMARY KEY, from_location TEXT, to_location TEXT)")
+    conn.executemany("INSERT INTO rides (from_location, to_location) VALUES (?, ?)",
+                     [('Praha', 'Brno'), ('České Budějovice', 'Tábor'), ('Ústí nad Labem', 'Plzeň')])
+    if with_fts:
+        conn.execute("CREATE VIRTUAL TABLE rides_fts USING fts5(from_location, to_location, content='rides', "
+                     "content_rowid='id', tokenize='unicode61 remove_diacritics 2')")
+        conn.execute("INSERT INTO rides_fts(rides_fts) VALUES ('rebuild')")
+    return conn
+
+
+def search(conn, terms):
+    backend = detect_backend('sqlite', lambda sql: conn.execute(sql).fetchone())
+    params = []
+    condition = ride_text_condition(backend, terms, params, placeholder=lambda name: '?')
+    rows = conn.execute(f"SELECT r.id FROM rides r WHERE {condition} ORDER BY r.id", params).fetchall()
+    return backend, [row[0] for row in rows]
+
+
+def test_query_builders():
+    assert fts5_query({'from_location': 'České Bud', 'to_location': ''}) == 'from_location : ("ceske"* "bud"*)'
+    assert fts5_query({None: 'a"b'}) == '("a"* "b"*)'
+    assert fts5_query({'to_location': '  '}) is None
+    assert tsquery({'from_location': 'Ústí', 'to_location': 'plz'}) == 'usti:*A & plz:*B'
+    assert tsquery({None: 'brno'}) == 'brno:*'
+    params = {}
+    assert ride_text_condition(TSVECTOR, {None: 'brno'}, params) == "r.search_vector @@ to_tsquery('simple', :fts_query)"
+    assert params == {'fts_query': 'brno:*'}
+    assert ride_text_condition(FTS5, {'from_location': ''}, {}) is None
+
+
+def test_fts5_is_accent_insensitive():
+    conn = make_db(with_fts=True)
+    assert search(conn, {'from_location': 'ceske bud'}) == (FTS5, [2])
+    assert search(conn, {'to_location': 'PLZEN'}) == (FTS5, [3])
+    assert search(conn, {None: 'labem'}) == (FTS5, [3])
+    assert search(conn, {'from_location': 'brno'}) == (FTS5, [])
+
+
+def test_like_fallback_without_index():
+    conn = make_db(with_fts=False)
+    assert search(conn, {'from_location': 'Praha', 'to_location': 'rn'}) == (LIKE, [1])
+    assert search(conn, {None: 'Plzeň'}) == (LIKE, [3])
+    assert detect_backend('mysql', lambda sql: None) == LIKE
+
+
+if __name__ == "__main__":
+    test_query_builders()
+    test_fts5_is_accent_insensitive()
+    test_like_fallback_without_index()
+    print("OK")
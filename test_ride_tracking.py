@@ -0,0 +1,77 @@
+from location_ingest import Fix
+from ride_tracking import RideTracker, downsample
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def fixes(start, count, lat=50.0, lng=14.0):
+    return [Fix(lat + i * 1e-4, lng + i * 1e-4, (start + i) * 1000) for i in range(count)]
+
+
+def test_ring_buffer_and_cursor():
+    tracker = RideTracker(buffer_length=5)
+    assert tracker.record(1, 10, fixes(0, 3))
+    assert tracker.record(1, 20, fixes(0, 2, lat=49.0))
+    first = tracker.snapshot(1)
+    assert first['cursor'] == 5 and not first['reset']
+    assert [point.ts for point in first['participants'][10]] == [0, 1000, 2000]
+
+    tracker.record(1, 10, fixes(3, 4) + fixes(1, 1))  # the old fix is dropped
+    update = tracker.snapshot(1, since=first['cursor'])
+    assert list(update['participants']) == [10]
+    assert [point.ts for point in update['participants'][10]] == [3000, 4000, 5000, 6000]
+    assert [point.ts for point in tracker.snapshot(1)['participants'][10]] == [2000, 3000, 4000, 5000, 6000]
+    assert tracker.snapshot(1, since=update['cursor'])['participants'] == {}
+    assert list(tracker.snapshot(1, participant_ids=[20])['participants']) == [20]
+
+
+def test_reset_when_cursor_is_ahead():
+    tracker = RideTracker()
+    tracker.record(1, 10, fixes(0, 2))
+    snapshot = tracker.snapshot(1, since=99)
+    assert snapshot['reset'] and snapshot['cursor'] == 2 and len(snapshot['participants'][10]) == 2
+    assert tracker.snapshot(2, since=5) == {'cursor': 0, 'reset': True, 'participants': {}}
+
+
+def test_participant_and_ride_caps():
+    clock = Clock()
+    tracker = RideTracker(max_rides=2, max_participants=2, idle_ttl=100, clock=clock)
+    assert tracker.record(1, 10, fixes(0, 1))
+    assert tracker.record(1, 11, fixes(0, 1))
+    assert not tracker.record(1, 12, fixes(0, 1))
+    tracker.record(2, 10, fixes(0, 1))
+    tracker.record(1, 10, fixes(1, 1))
+    tracker.record(3, 10, fixes(0, 1))  # evicts ride 2, the least recently updated
+    assert tracker.snapshot(2)['participants'] == {}
+    assert tracker.snapshot(1)['participants']
+    clock.now = 150
+    tracker.record(4, 10, fixes(0, 1))  # rides 1 and 3 are idle
+    assert tracker.stats() == {'rides': 1, 'points': 1, 'evictions': 3}
+
+
+def test_downsample_keeps_shape_and_ends():
+    tracker = RideTracker(buffer_length=2000)
+    # Straight line east, then north: the corner must survive simplification
+    track = [Fix(50.0, 14.0 + i * 1e-4, i * 1000) for i in range(500)]
+    track += [Fix(50.0 + i * 1e-4, 14.0 + 499e-4, (500 + i) * 1000) for i in range(1, 500)]
+    tracker.record(1, 10, track)
+    points = tracker.snapshot(1, max_points=50)['participants'][10]
+    assert [point.ts for point in points] == [0, 499000, 999000]
+    full = tracker.snapshot(1)['participants'][10]
+    assert len(downsample(full, 10, tolerance_km=0)) == 10
+    assert downsample(full, 10, tolerance_km=0)[-1] == full[-1]
+    assert downsample(full[:5], 10) == full[:5]
+
+
+if __name__ == "__main__":
+    test_ring_buffer_and_cursor()
+    test_reset_when_cursor_is_ahead()
+    test_participant_and_ride_caps()
+    test_downsample_keeps_shape_and_ends()
+    print("OK")
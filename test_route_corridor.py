@@ -0,0 +1,75 @@
+import math
+import random
+
+from route_corridor import CorridorIndex, build_route, parse_waypoints, simplify
+
+PRAHA = (50.0755, 14.4378)
+JIHLAVA = (49.3961, 15.5912)
+BRNO = (49.1951, 16.6068)
+
+
+def straight(a, b, steps):
+    return [(a[0] + (b[0] - a[0]) * i / steps, a[1] + (b[1] - a[1]) * i / steps) for i in range(steps + 1)]
+
+
+def test_parse_waypoints_formats():
+    raw = '[{"lat": 49.5, "lng": 15.0}, {"latitude": 49.6, "longitude": 15.1}, [49.7, 15.2], {"lat": null}]'
+    assert parse_waypoints(raw) == [(49.5, 15.0), (49.6, 15.1), (49.7, 15.2)]
+    assert parse_waypoints('') == [] and parse_waypoints('not json') == []
+    assert build_route(PRAHA, [JIHLAVA], BRNO) == [PRAHA, JIHLAVA, BRNO]
+
+
+def test_simplify_drops_collinear_points():
+    line = straight(PRAHA, JIHLAVA, 50)
+    assert simplify(line, 0.5) == [line[0], line[-1]]
+    bent = line + straight(JIHLAVA, BRNO, 50)[1:]
+    assert JIHLAVA in simplify(bent, 0.5)
+
+
+def test_pickup_and_dropoff_must_follow_route_order():
+    index = CorridorIndex()
+    assert index.insert('praha-brno', build_route(PRAHA, [JIHLAVA], BRNO))
+    assert index.insert('brno-praha', build_route(BRNO, [JIHLAVA], PRAHA))
+    assert not index.insert('empty', [PRAHA])
+
+    # Humpolec -> near Brno lies along the Praha-Brno route only
+    matches = index.query((49.5415, 15.3594), (49.23, 16.50))
+    assert [match[0] for match in matches] == ['praha-brno']
+    key, pickup_km, dropoff_km, detour_km = matches[0]
+    assert 0 < pickup_km < dropoff_km and detour_km < 2 * index.corridor_km
+
+    assert [match[0] for match in index.query((49.23, 16.50), (49.5415, 15.3594))] == ['brno-praha']
+    # Far away from both corridors
+    assert index.query((49.8209, 18.2625), BRNO) == []
+
+    index.remove('praha-brno')
+    assert 'praha-brno' not in index
+    assert index.query((49.5415, 15.3594), (49.23, 16.50)) == []
+
+
+def test_index_matches_full_scan():
+    rng = random.Random(3)
+    index = CorridorIndex()
+    routes = []
+    for ride_id in range(300):
+        a = (rng.uniform(48.8, 50.8), rng.uniform(12.5, 18.5))
+        b = (rng.uniform(48.8, 50.8), rng.uniform(12.5, 18.5))
+        bend = rng.uniform(-0.3, 0.3)
+        route = [(lat + bend * math.sin(math.pi * i / 20), lng) for i, (lat, lng) in enumerate(straight(a, b, 20))]
+        routes.append(route)
+        index.insert(ride_id, route)
+    for _ in range(200):
+        route = rng.choice(routes)
+        i, j = sorted(rng.sample(range(len(route)), 2))
+        jitter = lambda p: (p[0] + rng.uniform(-0.04, 0.04), p[1] + rng.uniform(-0.04, 0.04))
+        pickup, dropoff = jitter(route[i]), jitter(route[j])
+        assert index.query(pickup, dropoff) == index.scan(pickup, dropoff)
+        assert index.query(pickup, dropoff, corridor_km=1.0) == index.scan(pickup, dropoff, corridor_km=1.0)
+
+
+if __name__ == "__main__":
+    test_parse_waypoints_formats()
+    test_simplify_drops_collinear_points()
+    test_pickup_and_dropoff_must_follow_route_order()
+    test_index_matches_full_scan()
+    print("OK")
@@ -0,0 +1,98 @@
+import os
+import tempfile
+import threading
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from seat_inventory import SeatsUnavailable, cancel_reservation, reserve_seats, run_with_retry
+
+SCHEMA = [
+    "CREATE TABLE rides (id INTEGER PRIMARY KEY, available_seats INTEGER NOT NULL)",
+    "CREATE TABLE reservations (id INTEGER PRIMARY KEY, ride_id INTEGER, passenger_id INTEGER, seats_reserved INTEGER,"
+    " status VARCHAR(20))",
+]
+
+
+def make_engine(tmp, seats):
+    # Short busy timeout so contention surfaces as lock errors the retry has to handle
+    engine = create_engine('sqlite:///' + os.path.join(tmp, 'seats.db'), connect_args={'timeout': 0.01})
+    with engine.begin() as connection:
+        for sql in SCHEMA:
+            connection.execute(text(sql))
+        connection.execute(text("INSERT INTO rides (id, available_seats) VALUES (1, :seats)"), {'seats': seats})
+    return engine
+
+
+def test_reserve_and_cancel():
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(tmp, 3)
+        with engine.begin() as connection:
+            reservation_id = reserve_seats(connection, 1, 7, 2)
+        with pytest.raises(SeatsUnavailable), engine.begin() as connection:
+            reserve_seats(connection, 1, 8, 2)
+        with pytest.raises(SeatsUnavailable), engine.begin() as connection:
+            reserve_seats(connection, 99, 8, 1)
+        with engine.begin() as connection:
+            assert cancel_reservation(connection, reservation_id) == (1, 2, 7)
+            assert cancel_reservation(connection, reservation_id) is None
+            assert cancel_reservation(connection, 12345) is None
+            assert connection.execute(text("SELECT available_seats FROM rides")).scalar() == 3
+        engine.dispose()
+
+
+def test_concurrent_bookings_never_oversell():
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(tmp, 10)
+        outcomes = []
+
+        def passenger(passenger_id):
+            def book():
+                with engine.begin() as connection:
+                    return reserve_seats(connection, 1, passenger_id, 1)
+            try:
+                run_with_retry(book, attempts=50, base_delay=0.005)
+                outcomes.append('booked')
+            except SeatsUnavailable:
+                outcomes.append('full')
+
+        threads = [threading.Thread(target=passenger, args=(i,)) for i in range(40)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        with engine.begin() as connection:
+            booked = connection.execute(text("SELECT COALESCE(SUM(seats_reserved), 0) FROM reservations")).scalar()
+            left = connection.execute(text("SELECT available_seats FROM rides")).scalar()
+        assert outcomes.count('booked') == booked == 10
+        assert outcomes.count('full') == 30
+        assert left == 0
+        engine.dispose()
+
+
+def test_retry_only_lock_errors():
+    calls = []
+
+    def locked():
+        calls.append(1)
+        if len(calls) < 3:
+            raise OperationalError('UPDATE rides', {}, Exception('database is locked'))
+        return 'ok'
+
+    assert run_with_retry(locked, sleep=lambda delay: None) == 'ok'
+    assert len(calls) == 3
+
+    def broken():
+        raise OperationalError('UPDATE rides', {}, Exception('no such table: rides'))
+
+    with pytest.raises(OperationalError):
+        run_with_retry(broken, sleep=lambda delay: None)
+
+
+if __name__ == "__main__":
+    test_reserve_and_cancel()
+    test_concurrent_bookings_never_oversell()
+    test_retry_only_lock_errors()
+    print("OK")
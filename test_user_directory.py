@@ -0,0 +1,50 @@
+from user_directory import UserDirectory, normalize_name
+
+
+def make_directory(users):
+    calls = []
+
+    def load(name_normalized, name):
+        calls.append(name_normalized)
+        return [(user_id, stored) for user_id, stored in users.items() if normalize_name(stored) == name_normalized]
+
+    return UserDirectory(load), calls
+
+
+def test_normalize_name():
+    assert normalize_name('  Jan   NOVÁK ') == 'jan novák'
+    assert normalize_name(None) == ''
+
+
+def test_resolve_caches_and_prefers_exact_match():
+    users = {3: 'jan novák', 5: 'Jan Novák'}
+    directory, calls = make_directory(users)
+    assert directory.resolve('Jan Novák') == 5
+    assert directory.resolve('jan novák') == 3
+    assert directory.resolve('JAN  NOVÁK') == 3
+    assert calls == ['jan novák']
+    assert directory.stats()['hits'] == 2
+    assert directory.resolve('') is None
+
+
+def test_invalidation_on_register_and_rename():
+    users = {1: 'Petr'}
+    directory, calls = make_directory(users)
+    assert directory.resolve('Eva') is None
+    users[2] = 'Eva'
+    assert directory.resolve('Eva') is None  # negative result is cached
+    directory.invalidate('Eva')
+    assert directory.resolve('Eva') == 2
+
+    assert directory.resolve('Petr') == 1
+    users[1] = 'Pavel'
+    directory.invalidate('Petr', 'Pavel')
+    assert directory.resolve('Petr') is None
+    assert directory.resolve('Pavel') == 1
+
+
+if __name__ == "__main__":
+    test_normalize_name()
+    test_resolve_caches_and_prefers_exact_match()
+    test_invalidation_on_register_and_rename()
+    print("OK")
@@ -0,0 +1,93 @@
+import os
+import tempfile
+
+import pytest
+from sqlalchemy import create_engine, text
+
+import user_stats
+from seat_inventory import cancel_reservation, reserve_seats
+
+SCHEMA = [
+    "CREATE TABLE users (id INTEGER PRIMARY KEY, name VARCHAR(100))",
+    "CREATE TABLE rides (id INTEGER PRIMARY KEY, user_id INTEGER, available_seats INTEGER, from_lat FLOAT, from_lng FLOAT,"
+    " to_lat FLOAT, to_lng FLOAT)",
+    "CREATE TABLE reservations (id INTEGER PRIMARY KEY, ride_id INTEGER, passenger_id INTEGER, seats_reserved INTEGER,"
+    " status VARCHAR(20))",
+    "CREATE TABLE user_stats (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL UNIQUE, total_rides INTEGER,"
+    " total_distance FLOAT, co2_saved FLOAT, money_saved FLOAT, rides_as_driver INTEGER NOT NULL DEFAULT 0,"
+    " rides_as_passenger INTEGER NOT NULL DEFAULT 0)",
+]
+PRAHA = (50.0755, 14.4378)
+BRNO = (49.1951, 16.6068)
+
+
+def offer(connection, ride_id, driver_id, coords):
+    connection.execute(text("INSERT INTO rides (id, user_id, available_seats, from_lat, from_lng, to_lat, to_lng)"
+                            " VALUES (:id, :driver_id, 4, :a, :b, :c, :d)"),
+                       {'id': ride_id, 'driver_id': driver_id, 'a': coords[0], 'b': coords[1], 'c': coords[2], 'd': coords[3]})
+    user_stats.ride_offered(connection, driver_id, user_stats.ride_distance_km(*coords))
+
+
+def book(connection, ride_id, passenger_id):
+    reservation_id = reserve_seats(connection, ride_id, passenger_id, 1)
+    user_stats.passenger_joined(connection, ride_id, passenger_id)
+    return reservation_id
+
+
+def cancel(connection, reservation_id):
+    ride_id, _, passenger_id = cancel_reservation(connection, reservation_id)
+    user_stats.passenger_left(connection, ride_id, passenger_id)
+
+
+def cancel_ride(connection, ride_id):
+    user_stats.ride_cancelled(connection, ride_id)
+    connection.execute(text("UPDATE reservations SET status = 'cancelled' WHERE ride_id = :ride_id"), {'ride_id': ride_id})
+    connection.execute(text("DELETE FROM rides WHERE id = :ride_id"), {'ride_id': ride_id})
+
+
+def stats(connection):
+    rows = connection.execute(text("SELECT user_id, total_rides, rides_as_driver, rides_as_passenger, total_distance"
+                                   " FROM user_stats WHERE total_rides > 0 ORDER BY user_id")).fetchall()
+    return [(row[0], row[1], row[2], row[3], round(row[4], 3)) for row in rows]
+
+
+def test_ride_distance():
+    assert user_stats.ride_distance_km(*PRAHA, *BRNO) == pytest.approx(185, abs=2)
+    assert user_stats.ride_distance_km(None, None, *BRNO) == 0.0
+
+
+def test_handlers_match_reconcile():
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine('sqlite:///' + os.path.join(tmp, 'stats.db'))
+        with engine.begin() as connection:
+            for sql in SCHEMA:
+                connection.execute(text(sql))
+            for user_id in (1, 2, 3):
+                connection.execute(text("INSERT INTO users (id, name) VALUES (:id, 'u')"), {'id': user_id})
+
+            offer(connection, 10, 1, PRAHA + BRNO)
+            offer(connection, 11, 1, (None, None, None, None))
+            offer(connection, 12, 2, BRNO + PRAHA)
+            first = book(connection, 10, 2)
+            book(connection, 10, 2)  # second reservation on the same ride counts once
+            book(connection, 10, 3)
+            book(connection, 12, 3)
+            cancel(connection, first)
+            leg = user_stats.ride_distance_km(*PRAHA, *BRNO)
+            assert stats(connection) == [(1, 2, 2, 0, round(leg, 3)), (2, 2, 1, 1, round(2 * leg, 3)),
+                                         (3, 2, 0, 2, round(2 * leg, 3))]
+
+            cancel_ride(connection, 10)
+            incremental = stats(connection)
+            assert incremental == [(1, 1, 1, 0, 0.0), (2, 1, 1, 0, round(leg, 3)), (3, 1, 0, 1, round(leg, 3))]
+
+            connection.execute(text("UPDATE user_stats SET rides_as_driver = 7, total_distance = 0"))
+            assert user_stats.reconcile(connection) == 3
+            assert stats(connection) == incremental
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    test_ride_distance()
+    test_handlers_match_reconcile()
+    print("OK")
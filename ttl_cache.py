@@ -0,0 +1,51 @@
+"""
+Small OrderedDict-based LRU with per-entry expiry, shared by the in-process
+caches (ride_membership, user_directory). Not locked on its own; callers
+hold their own lock around it.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Hashable, Tuple
+
+
+class TTLCache:
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.data: "OrderedDict[Hashable, Tuple[float, object]]" = OrderedDict()
+        self.evictions = 0
+
+    def get(self, key, now: float):
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            del self.data[key]
+            return None
+        self.data.move_to_end(key)
+        return entry[1]
+
+    def peek(self, key):
+        entry = self.data.get(key)
+        return entry[1] if entry else None
+
+    def put(self, key, value, now: float) -> None:
+        self.data[key] = (now + self.ttl, value)
+        self.data.move_to_end(key)
+        while len(self.data) > self.max_entries:
+            self.data.popitem(last=False)
+            self.evictions += 1
+
+    def replace(self, key, value) -> None:
+        """Updates a cached value keeping its expiry and LRU position."""
+        entry = self.data.get(key)
+        if entry is not None:
+            self.data[key] = (entry[0], value)
+
+    def pop(self, key) -> None:
+        self.data.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self.data)
@@ -0,0 +1,77 @@
+"""
+Name -> user id resolution for endpoints that still identify users by name
+(chat sender, legacy notification polling, ratings by driver name).
+
+Names are matched on `users.name_normalized` (whitespace collapsed,
+casefolded; see normalize_name), which is indexed, and results are kept in a
+bounded LRU with a TTL. Registration and profile updates invalidate the
+affected names. When several users share a normalized name, an exact match of
+the stored name wins, then the oldest account, which is what the previous
+`WHERE name = :name` lookup returned for exact names.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from ttl_cache import TTLCache
+
+# (user id, stored name), ordered by id
+Candidates = Tuple[Tuple[int, str], ...]
+
+DEFAULT_MAX_ENTRIES = 10_000
+DEFAULT_TTL_SECONDS = 600.0
+
+
+def normalize_name(name: Optional[str]) -> str:
+    return ' '.join((name or '').split()).casefold()
+
+
+class UserDirectory:
+    """`load(normalized_name, name)` returns the matching (id, name) rows."""
+
+    def __init__(self, load: Callable[[str, str], Sequence[Tuple[int, str]]],
+                 max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self._load = load
+        self._clock = clock
+        self._cache = TTLCache(max_entries, ttl)
+        self._lock = threading.Lock()
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, name: Optional[str]) -> Optional[int]:
+        key = normalize_name(name)
+        if not key:
+            return None
+        with self._lock:
+            candidates = self._cache.get(key, self._clock())
+            if candidates is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+                version = self._version
+        if candidates is None:
+            candidates = tuple(sorted((int(row[0]), row[1]) for row in self._load(key, name)))
+            with self._lock:
+                # Negative results are cached too; registration invalidates them
+                if version == self._version:
+                    self._cache.put(key, candidates, self._clock())
+        for user_id, stored_name in candidates:
+            if stored_name == name:
+                return user_id
+        return candidates[0][0] if candidates else None
+
+    def invalidate(self, *names: Optional[str]) -> None:
+        with self._lock:
+            self._version += 1
+            for name in names:
+                self._cache.pop(normalize_name(name))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'names': len(self._cache),
+                    'evictions': self._cache.evictions}
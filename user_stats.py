@@ -0,0 +1,112 @@
+"""
+Maintained per-user ride counters in `user_stats`.
+
+The profile endpoint used to COUNT the user's rides and distinct confirmed
+reservations on every view. The counts now live in `user_stats` and are
+adjusted by the handlers that change them, inside the same transaction:
+
+    offer_ride           driver +1
+    create_reservation   passenger +1 (first confirmed reservation on the ride)
+    cancel_reservation   passenger -1 (last confirmed reservation on the ride)
+    cancel_ride          driver -1, each confirmed passenger -1
+
+`total_distance` accumulates the straight-line length (km) of those rides
+for drivers and passengers alike; rides without coordinates count as 0 km.
+`reconcile` recomputes everything from rides/reservations in bulk and is
+the fix-up if counters ever drift.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+from distance_kernel import haversine_km
+
+# ON CONFLICT upsert: SQLite >= 3.24, PostgreSQL >= 9.5
+_APPLY = text("INSERT INTO user_stats (user_id, total_rides, rides_as_driver, rides_as_passenger, total_distance) "
+              "VALUES (:user_id, :driver + :passenger, :driver, :passenger, :distance) "
+              "ON CONFLICT (user_id) DO UPDATE SET "
+              "total_rides = COALESCE(user_stats.total_rides, 0) + excluded.total_rides, "
+              "rides_as_driver = user_stats.rides_as_driver + excluded.rides_as_driver, "
+              "rides_as_passenger = user_stats.rides_as_passenger + excluded.rides_as_passenger, "
+              "total_distance = COALESCE(user_stats.total_distance, 0) + excluded.total_distance")
+_RIDE = text("SELECT user_id, from_lat, from_lng, to_lat, to_lng FROM rides WHERE id = :ride_id")
+_CONFIRMED = text("SELECT COUNT(*) FROM reservations WHERE ride_id = :ride_id AND passenger_id = :passenger_id "
+                  "AND status = 'confirmed'")
+_RIDE_PASSENGERS = text("SELECT DISTINCT passenger_id FROM reservations WHERE ride_id = :ride_id AND status = 'confirmed'")
+
+_RESET = text("UPDATE user_stats SET total_rides = 0, rides_as_driver = 0, rides_as_passenger = 0, total_distance = 0")
+_ALL_RIDES = text("SELECT id, user_id, from_lat, from_lng, to_lat, to_lng FROM rides")
+_ALL_PASSENGERS = text("SELECT DISTINCT ride_id, passenger_id FROM reservations WHERE status = 'confirmed'")
+_SET = text("INSERT INTO user_stats (user_id, total_rides, rides_as_driver, rides_as_passenger, total_distance) "
+            "VALUES (:user_id, :driver + :passenger, :driver, :passenger, :distance) "
+            "ON CONFLICT (user_id) DO UPDATE SET total_rides = excluded.total_rides, "
+            "rides_as_driver = excluded.rides_as_driver, rides_as_passenger = excluded.rides_as_passenger, "
+            "total_distance = excluded.total_distance")
+_USER_IDS = text("SELECT id FROM users")
+
+
+def ride_distance_km(from_lat: Optional[float], from_lng: Optional[float],
+                     to_lat: Optional[float], to_lng: Optional[float]) -> float:
+    if None in (from_lat, from_lng, to_lat, to_lng):
+        return 0.0
+    return float(haversine_km(from_lat, from_lng, [to_lat], [to_lng])[0])
+
+
+def apply(session, user_id: int, driver: int = 0, passenger: int = 0, distance_km: float = 0.0) -> None:
+    session.execute(_APPLY, {'user_id': user_id, 'driver': driver, 'passenger': passenger, 'distance': distance_km})
+
+
+def ride_offered(session, driver_id: int, distance_km: float) -> None:
+    apply(session, driver_id, driver=1, distance_km=distance_km)
+
+
+def passenger_joined(session, ride_id: int, passenger_id: int) -> None:
+    """Call after the confirmed reservation was inserted."""
+    if session.execute(_CONFIRMED, {'ride_id': ride_id, 'passenger_id': passenger_id}).scalar() == 1:
+        apply(session, passenger_id, passenger=1, distance_km=_distance(session, ride_id))
+
+
+def passenger_left(session, ride_id: int, passenger_id: int) -> None:
+    """Call after the reservation was cancelled."""
+    if session.execute(_CONFIRMED, {'ride_id': ride_id, 'passenger_id': passenger_id}).scalar() == 0:
+        apply(session, passenger_id, passenger=-1, distance_km=-_distance(session, ride_id))
+
+
+def ride_cancelled(session, ride_id: int) -> None:
+    """Call before the ride's reservations are cancelled and the ride deleted."""
+    ride = session.execute(_RIDE, {'ride_id': ride_id}).fetchone()
+    if not ride:
+        return
+    distance = ride_distance_km(*ride[1:])
+    apply(session, ride[0], driver=-1, distance_km=-distance)
+    for (passenger_id,) in session.execute(_RIDE_PASSENGERS, {'ride_id': ride_id}).fetchall():
+        apply(session, passenger_id, passenger=-1, distance_km=-distance)
+
+
+def reconcile(session) -> int:
+    """Rebuilds every user's counters from rides and reservations; returns the number of users with rides."""
+    rides = {row[0]: (row[1], ride_distance_km(*row[2:])) for row in session.execute(_ALL_RIDES).fetchall()}
+    totals: Dict[int, List[float]] = defaultdict(lambda: [0, 0, 0.0])
+    for driver_id, distance in rides.values():
+        totals[driver_id][0] += 1
+        totals[driver_id][2] += distance
+    for ride_id, passenger_id in session.execute(_ALL_PASSENGERS).fetchall():
+        totals[passenger_id][1] += 1
+        totals[passenger_id][2] += rides.get(ride_id, (None, 0.0))[1]
+
+    user_ids = {row[0] for row in session.execute(_USER_IDS).fetchall()}
+    session.execute(_RESET)
+    rows = [{'user_id': user_id, 'driver': driver, 'passenger': passenger, 'distance': distance}
+            for user_id, (driver, passenger, distance) in totals.items() if user_id in user_ids]
+    if rows:
+        session.execute(_SET, rows)
+    return len(rows)
+
+
+def _distance(session, ride_id: int) -> float:
+    ride = session.execute(_RIDE, {'ride_id': ride_id}).fetchone()
+    return ride_distance_km(*ride[1:]) if ride else 0.0